@@ -0,0 +1,93 @@
+"""
+Benchmark of the per request cost of checking tokens against the revoked token blocklist.
+Verifies a token the way @jwt_required() does, without a blocklist, with the in-memory
+blocklist of growing size and, for comparison, with a SQLite query per request.
+
+Run from the project root:
+    python -m benchmark.bench_blocklist --revoked 0 10000 100000 --requests 20000
+"""
+import argparse
+import os
+import tempfile
+import time
+import uuid
+
+from flask_jwt_extended import create_access_token, verify_jwt_in_request
+
+from src.app import app, jwt
+from src.libs.blocklist import TokenBlocklist
+
+
+def _verify_us(headers, requests, rounds=5):
+    # one request context for all, creating it would cost more than the verification,
+    # the best round is reported since the differences are small compared to the noise
+    best = None
+    with app.test_request_context(headers=headers):
+        for _ in range(rounds):
+            start = time.perf_counter()
+            for _ in range(requests):
+                verify_jwt_in_request()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+    return best / requests * 1000000
+
+
+def _check_us(check, requests):
+    payload = {"jti": str(uuid.uuid4())}
+    start = time.perf_counter()
+    for _ in range(requests):
+        check(None, payload)
+    return (time.perf_counter() - start) / requests * 1000000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--revoked", type=int, nargs="+", default=[0, 10000, 100000],
+                        help="numbers of revoked tokens")
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    app.config.update(JWT_SECRET_KEY="benchmark", TESTING=True, DEBUG=False)
+    db_fd, db_fname = tempfile.mkstemp()
+    try:
+        with app.app_context():
+            headers = {"Authorization": "Bearer " + create_access_token(identity="benchmark")}
+
+        jwt.token_in_blocklist_loader(lambda jwt_header, jwt_payload: False)
+        baseline = _verify_us(headers, args.requests)
+        print("{:<14} {:>9} {:>12} {:>10} {:>10}".format("blocklist", "revoked", "us/request", "overhead",
+                                                         "check us"))
+        print("{:<14} {:>9} {:>12.1f} {:>10} {:>10}".format("none", 0, baseline, "", ""))
+
+        for revoked in args.revoked:
+            os.truncate(db_fname, 0)
+            blocklist = TokenBlocklist(db_fname)
+            expires = time.time() + 3600
+            for _ in range(revoked):
+                blocklist._add(str(uuid.uuid4()), expires)
+            connection = blocklist._connect()
+            with connection:
+                connection.executemany("INSERT INTO revoked_token (jti, expires) VALUES (?, ?)",
+                                       ((jti, expires) for jti in blocklist._expires))
+            blocklist.sync()
+
+            cases = [("in memory", lambda jwt_header, jwt_payload: blocklist.is_revoked(jwt_payload["jti"]))]
+            query = "SELECT 1 FROM revoked_token WHERE jti = ?"
+            cases.append(("SQLite query", lambda jwt_header, jwt_payload:
+                          connection.execute(query, (jwt_payload["jti"],)).fetchone() is not None))
+            for name, check in cases:
+                jwt.token_in_blocklist_loader(check)
+                cost = _verify_us(headers, args.requests)
+                print("{:<14} {:>9} {:>12.1f} {:>+10.1f} {:>10.2f}".format(
+                    name, revoked, cost, cost - baseline, _check_us(check, args.requests * 10)))
+            connection.close()
+    finally:
+        os.close(db_fd)
+        os.unlink(db_fname)
+        for suffix in ("-wal", "-shm"):
+            if os.path.exists(db_fname + suffix):
+                os.unlink(db_fname + suffix)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark of importing wines with the bulk endpoint compared to one post per wine.
+Runs against a temporary SQLite database with the Flask test client.
+
+Run from the project root:
+    python -m benchmark.bench_bulk --wines 10000
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from src.app import app
+from src.database import db
+
+
+def _record(prefix, i):
+    return {"name": "{} wine {}".format(prefix, i), "year_produced": 2015, "alcohol_percentage": 13.5,
+            "description": "benchmark wine", "wine_type": {"type": "type {}".format(i % 5)},
+            "grape": {"name": "grape {}".format(i % 200)}, "producer": {"name": "producer {}".format(i % 500)}}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wines", type=int, default=10000)
+    parser.add_argument("--single", type=int, default=200, help="wines posted one at a time")
+    args = parser.parse_args()
+
+    db_fd, db_fname = tempfile.mkstemp()
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite:///" + db_fname, JWT_SECRET_KEY="benchmark",
+                      TESTING=True, DEBUG=False)
+    db.init_app(app)
+    try:
+        with app.app_context():
+            db.create_all()
+            client = app.test_client()
+            user = {"username": "benchmark", "password": "Bench-password1234"}
+            client.post("/api/register", json=user)
+            headers = {"Authorization": json.loads(client.post("/api/login", json=user).data)}
+
+            start = time.perf_counter()
+            for i in range(args.single):
+                client.post("/api/wines", data={"data": json.dumps(_record("single", i))}, headers=headers)
+            single = args.single / (time.perf_counter() - start)
+
+            body = "\n".join(json.dumps(_record("bulk", i)) for i in range(args.wines))
+            start = time.perf_counter()
+            response = client.post("/api/wines/bulk", data=body,
+                                   content_type="application/x-ndjson", headers=headers)
+            bulk = args.wines / (time.perf_counter() - start)
+            assert json.loads(response.data)["created"] == args.wines
+
+            print("{:>10} {:>10} {:>12}".format("path", "wines", "wines/s"))
+            print("{:>10} {:>10} {:>12.0f}".format("single", args.single, single))
+            print("{:>10} {:>10} {:>12.0f}".format("bulk", args.wines, bulk))
+            db.session.remove()
+    finally:
+        os.close(db_fd)
+        os.unlink(db_fname)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+"""
+Benchmark of the throughput, latency and SQL query count of every resource of the api.
+Each scale runs against a temporary SQLite database seeded with a catalog of that many wines,
+through the Flask test client with the response cache off. The results are saved as JSON
+baselines, one file per scale, and compared with the previous run before they are replaced.
+
+Run from the project root:
+    python -m benchmark.bench_endpoints --scales 1000 10000 100000 --requests 50
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from urllib.parse import quote
+
+from sqlalchemy import event
+from werkzeug.security import generate_password_hash
+
+from src.app import app
+from src.database import db
+from src.libs.cache import response_cache
+from src.models.country import Country
+from src.models.grape import Grape
+from src.models.producer import Producer
+from src.models.region import Region
+from src.models.user import User
+from src.models.wine import Wine
+from src.models.wine_type import Wine_type
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+USER = {"username": "benchmark", "password": "Bench-password1234"}
+
+
+def _fan_out(wines):
+    """
+    Row counts of the catalog tables for given number of wines
+    :param wines: int number of wines
+    :return: dict of table name and row count
+    """
+    return {"wine_type": 8, "country": 40, "region": max(40, wines // 200),
+            "grape": max(100, wines // 100), "producer": max(100, wines // 20)}
+
+
+def seed(wines):
+    """
+    Insert a catalog of given size. Every producer makes about 20 wines, every region
+    has about 10 producers and every country some regions, grapes are shared widely.
+    :param wines: int number of wines
+    """
+    counts = _fan_out(wines)
+    insert = db.session.execute
+    insert(Wine_type.__table__.insert(), [{"type": "type {}".format(i)} for i in range(counts["wine_type"])])
+    insert(Country.__table__.insert(), [{"name": "country {}".format(i)} for i in range(counts["country"])])
+    insert(Region.__table__.insert(), [{"name": "region {}".format(i), "country_id": i % counts["country"] + 1}
+                                       for i in range(counts["region"])])
+    insert(Grape.__table__.insert(), [{"name": "grape {}".format(i), "region_id": i % counts["region"] + 1,
+                                       "description": "grape with a description of some length " * 3}
+                                      for i in range(counts["grape"])])
+    insert(Producer.__table__.insert(), [{"name": "producer {}".format(i), "region_id": i % counts["region"] + 1,
+                                          "description": "producer with a description of some length " * 3}
+                                         for i in range(counts["producer"])])
+    batch = 10000
+    for start in range(0, wines, batch):
+        Wine.insert_rows([{
+            "name": "wine {}".format(i), "style": "style {}".format(i % 30), "year_produced": 1980 + i % 42,
+            "alcohol_percentage": 10 + i % 80 / 10, "volume": 750, "picture": None,
+            "description": "benchmark wine with a description of some length " * 3,
+            "wine_type_id": i % counts["wine_type"] + 1, "grape_id": i % counts["grape"] + 1,
+            "producer_id": i % counts["producer"] + 1,
+        } for i in range(start, min(start + batch, wines))])
+    insert(User.__table__.insert(), [{"username": USER["username"], "role": "developer",
+                                      "password": generate_password_hash(USER["password"])}])
+    db.session.commit()
+
+
+def cases(wines, headers):
+    """
+    Requests of the benchmark, the read requests first since the write requests change the catalog
+    :param wines: int number of wines
+    :param headers: dict with the Authorization header
+    :return: list of tuples of case name, number of requests relative to --requests and
+             function of client and iteration which makes one request
+    """
+    def get(url, **kwargs):
+        return lambda client, i: client.get(url, **kwargs)
+
+    def item(path, name, count):
+        return lambda client, i: client.get("{}/{}".format(path, quote("{} {}".format(name, i * 7919 % count))))
+
+    refresh_token = []
+
+    def refresh(client, i):
+        # every refresh rotates the token, the next request uses the new one
+        if not refresh_token:
+            refresh_token.append(client.post("/api/login", json=USER).headers["X-Refresh-Token"])
+        response = client.post("/api/refresh", headers={"Authorization": "Bearer " + refresh_token[0]})
+        refresh_token[0] = response.headers.get("X-Refresh-Token", refresh_token[0])
+        return response
+
+    def logout(client, i):
+        # logout revokes its access token, every logout logs in for a new one
+        token = json.loads(client.post("/api/login", json=USER).data)
+        return client.post("/api/logout", headers={"Authorization": token})
+
+    counts = _fan_out(wines)
+    return [
+        ("GET /api/wines", 1, get("/api/wines")),
+        ("GET /api/wines?limit=100", 1, get("/api/wines?limit=100")),
+        ("GET /api/wines filtered", 1, get("/api/wines?region=region%201&sort=-year_produced")),
+        ("GET /api/wines/<name>", 1, item("/api/wines", "wine", wines)),
+        ("GET /api/grapes", 1, get("/api/grapes")),
+        ("GET /api/grapes/<name>", 1, item("/api/grapes", "grape", counts["grape"])),
+        ("GET /api/producers", 1, get("/api/producers")),
+        ("GET /api/producers/<name>", 1, item("/api/producers", "producer", counts["producer"])),
+        ("GET /api/regions", 1, get("/api/regions")),
+        ("GET /api/regions/<name>", 1, item("/api/regions", "region", counts["region"])),
+        ("GET /api/countries", 1, get("/api/countries")),
+        ("GET /api/countries/<name>", 1, item("/api/countries", "country", counts["country"])),
+        ("GET /api/wine_types", 1, get("/api/wine_types")),
+        ("GET /api/wine_types/<name>", 1, item("/api/wine_types", "type", counts["wine_type"])),
+        ("GET /api/search", 1, get("/api/search?q=producer%201")),
+        ("GET /api/user/<username>", 1, get("/api/user/" + USER["username"])),
+        ("GET /api/export", 0.1, get("/api/export", headers=headers)),
+        ("POST /api/login", 0.1, lambda client, i: client.post("/api/login", json=USER)),
+        ("POST /api/refresh", 1, refresh),
+        ("POST /api/logout", 1, logout),
+        ("POST /api/register", 0.1, lambda client, i: client.post("/api/register", json={
+            "username": "registered {}".format(i), "password": USER["password"]})),
+        ("POST /api/wines", 1, lambda client, i: client.post("/api/wines", headers=headers, data={
+            "data": json.dumps({"name": "posted {}".format(i), "wine_type": {"type": "type 1"},
+                                "producer": {"name": "producer 1"}, "grape": {"name": "grape 1"},
+                                "year_produced": 2020, "alcohol_percentage": 12.5, "volume": 750,
+                                "style": "style 1", "description": "posted wine"})})),
+        ("PATCH /api/wines/<name>", 1, lambda client, i: client.patch(
+            "/api/wines/posted%20{}".format(i), headers=headers,
+            data={"data": json.dumps({"description": "patched {}".format(i)})})),
+        ("DELETE /api/wines/<name>", 1, lambda client, i: client.delete(
+            "/api/wines/posted%20{}".format(i), headers=headers)),
+        ("POST /api/wines/bulk", 0.2, lambda client, i: client.post("/api/wines/bulk", headers=headers, json=[{
+            "name": "bulk {} {}".format(i, j), "wine_type": {"type": "type {}".format(j % 8)},
+            "producer": {"name": "producer {}".format(j)}, "grape": {"name": "grape {}".format(j)},
+            "year_produced": 2020, "alcohol_percentage": 12.5, "volume": 750,
+            "style": "style 1"} for j in range(100)])),
+    ]
+
+
+def measure(client, make_request, requests, budget):
+    """
+    Make the requests of one case and measure them. The case is stopped early
+    when it takes longer than its time budget, after at least three requests.
+    :param client: Flask test client
+    :param make_request: function of client and iteration
+    :param requests: int number of requests
+    :param budget: float seconds
+    :return: dict of results
+    """
+    queries = [0]
+
+    def count(*args):
+        queries[0] += 1
+
+    latencies = []
+    event.listen(db.engine, "before_cursor_execute", count)
+    try:
+        start = time.perf_counter()
+        for i in range(requests):
+            request_start = time.perf_counter()
+            response = make_request(client, i)
+            response.get_data()
+            latencies.append(time.perf_counter() - request_start)
+            if response.status_code >= 400:
+                raise RuntimeError("{} {}".format(response.status_code, response.get_data(as_text=True)[:200]))
+            if len(latencies) >= 3 and time.perf_counter() - start > budget:
+                break
+        total = time.perf_counter() - start
+    finally:
+        event.remove(db.engine, "before_cursor_execute", count)
+
+    requests = len(latencies)
+    latencies.sort()
+    return {
+        "requests": requests,
+        "throughput_rps": round(requests / total, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "queries_per_request": round(queries[0] / requests, 2),
+    }
+
+
+def run(wines, requests, budget):
+    """
+    Seed a new database of given scale and run every case
+    :param wines: int number of wines
+    :param requests: int number of requests per case
+    :param budget: float seconds per case
+    :return: dict of case name and results
+    """
+    db_fd, db_fname = tempfile.mkstemp()
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite:///" + db_fname)
+    try:
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            seed(wines)
+            print("seeded {} wines in {:.1f} s".format(wines, time.perf_counter() - start))
+            client = app.test_client()
+            headers = {"Authorization": json.loads(client.post("/api/login", json=USER).data)}
+            results = {}
+            for name, share, make_request in cases(wines, headers):
+                make_request(client, requests)
+                results[name] = measure(client, make_request, max(1, int(requests * share)), budget)
+            db.session.remove()
+            db.engine.dispose()
+        return results
+    finally:
+        os.close(db_fd)
+        os.unlink(db_fname)
+
+
+def compare(results, previous, tolerance):
+    """
+    Print the results with their change from the previous run
+    :param results: dict of case name and results
+    :param previous: dict of case name and results of the previous run, or None
+    :param tolerance: float relative p50 latency change which is reported as a regression
+    :return: list of regressed case names
+    """
+    regressions = []
+    print("{:<28} {:>8} {:>9} {:>9} {:>9} {:>8} {:>10}".format(
+        "case", "req/s", "p50 ms", "p95 ms", "queries", "change", ""))
+    for name, result in results.items():
+        before = (previous or {}).get(name)
+        change, note = "", ""
+        if before is not None:
+            ratio = result["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0
+            change = "{:+.0%}".format(ratio)
+            if result["queries_per_request"] > before["queries_per_request"]:
+                note = "queries {:g}".format(before["queries_per_request"])
+            elif ratio > tolerance:
+                note = "slower"
+            if note:
+                regressions.append(name)
+        print("{:<28} {:>8.1f} {:>9.2f} {:>9.2f} {:>9.2f} {:>8} {:>10}".format(
+            name, result["throughput_rps"], result["p50_ms"], result["p95_ms"],
+            result["queries_per_request"], change, note))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="numbers of wines in the catalog")
+    parser.add_argument("--requests", type=int, default=50, help="requests per case")
+    parser.add_argument("--budget", type=float, default=10, help="seconds per case at most")
+    parser.add_argument("--baseline-dir", default=BASELINE_DIR)
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="relative p50 latency change reported as a regression")
+    parser.add_argument("--no-save", action="store_true", help="compare without replacing the baselines")
+    args = parser.parse_args()
+
+    app.config.update(JWT_SECRET_KEY="benchmark", TESTING=True, DEBUG=False, TIMING_ENABLED=False,
+                      TIMING_LOG=False, METRICS_ENABLED=False)
+    db.init_app(app)
+    response_cache.enabled = False
+
+    regressions = []
+    for wines in args.scales:
+        results = run(wines, args.requests, args.budget)
+        path = os.path.join(args.baseline_dir, "endpoints-{}.json".format(wines))
+        previous = None
+        if os.path.exists(path):
+            with open(path) as file:
+                previous = json.load(file)["results"]
+        print("\n{} wines".format(wines))
+        regressions += ["{} at {}".format(name, wines) for name in compare(results, previous, args.tolerance)]
+        if not args.no_save:
+            os.makedirs(args.baseline_dir, exist_ok=True)
+            with open(path, "w") as file:
+                json.dump({"wines": wines, "requests": args.requests, "python": platform.python_version(),
+                           "results": results}, file, indent=2)
+                file.write("\n")
+
+    if regressions:
+        print("\nregressions: " + ", ".join(regressions))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark of the CPU time of large list responses with orjson compared to the json module.
+Runs against a temporary SQLite database with the Flask test client and the response cache off.
+
+Run from the project root:
+    python -m benchmark.bench_json --wines 1000 --requests 50
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+from src.app import app
+from src.database import db
+from src.libs import codec
+from src.libs.cache import response_cache
+from src.models.grape import Grape
+from src.models.producer import Producer
+from src.models.wine import Wine
+from src.models.wine_type import Wine_type
+
+
+def _populate(wines):
+    Wine_type.insert_types({"type {}".format(i) for i in range(5)})
+    Grape.insert_names({"grape {}".format(i) for i in range(50)})
+    Producer.insert_names({"producer {}".format(i) for i in range(100)})
+    wine_types = Wine_type.find_ids_by_types({"type {}".format(i) for i in range(5)})
+    grapes = Grape.find_ids_by_names({"grape {}".format(i) for i in range(50)})
+    producers = Producer.find_ids_by_names({"producer {}".format(i) for i in range(100)})
+    Wine.insert_rows([{
+        "name": "wine {}".format(i), "style": "dry", "year_produced": 2000 + i % 20,
+        "alcohol_percentage": 12.5, "volume": 750, "picture": None,
+        "description": "benchmark wine with a description of some length " * 3,
+        "wine_type_id": wine_types["type {}".format(i % 5)], "grape_id": grapes["grape {}".format(i % 50)],
+        "producer_id": producers["producer {}".format(i % 100)],
+    } for i in range(wines)])
+    db.session.commit()
+
+
+def _cpu_per_request(client, url, requests):
+    start = time.process_time()
+    for _ in range(requests):
+        response = client.get(url)
+    assert response.status_code == 200
+    return (time.process_time() - start) / requests * 1000, response.data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wines", type=int, default=1000, help="wines on the listed page")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    if codec.orjson is None:
+        parser.error("orjson is not installed")
+
+    db_fd, db_fname = tempfile.mkstemp()
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite:///" + db_fname, JWT_SECRET_KEY="benchmark",
+                      TESTING=True, DEBUG=False)
+    db.init_app(app)
+    response_cache.enabled = False
+    orjson = codec.orjson
+    url = "/api/wines?limit={}".format(args.wines)
+    try:
+        with app.app_context():
+            db.create_all()
+            _populate(args.wines)
+            client = app.test_client()
+            client.get(url)
+
+            results = {}
+            for name, module in (("json", None), ("orjson", orjson)):
+                codec.orjson = module
+                request_ms, body = _cpu_per_request(client, url, args.requests)
+                data = json.loads(body)
+                start = time.process_time()
+                for _ in range(args.requests):
+                    codec.loads(codec.dumps(data))
+                results[name] = (request_ms, (time.process_time() - start) / args.requests * 1000, len(body))
+            codec.orjson = orjson
+
+            print("{:>8} {:>8} {:>14} {:>16} {:>10}".format("codec", "wines", "request cpu ms",
+                                                           "encode+decode ms", "bytes"))
+            for name, (request_ms, codec_ms, size) in results.items():
+                print("{:>8} {:>8} {:>14.2f} {:>16.2f} {:>10}".format(name, args.wines, request_ms,
+                                                                      codec_ms, size))
+            saved = results["json"][0] - results["orjson"][0]
+            print("saved {:.2f} ms cpu per request ({:.0%})".format(saved, saved / results["json"][0]))
+            db.session.remove()
+    finally:
+        os.close(db_fd)
+        os.unlink(db_fname)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Benchmark of listing and signing all pictures of a bucket against a local S3 stand-in.
+Compares listing and signing in one thread to signing in parallel batches while
+the next page is listed, and reports the peak memory held while streaming the urls.
+The previous implementation listed one page only and returned after the first url,
+so it has no comparable numbers.
+
+Run from the project root:
+    python -m benchmark.bench_listing --objects 100000
+"""
+import argparse
+import logging
+import time
+import tracemalloc
+
+from benchmark.s3_stand_in import S3StandIn
+from config import Config
+
+
+def run(bucket, workers):
+    start = time.perf_counter()
+    count = sum(1 for _ in bucket.iter_file_urls(workers=workers))
+    elapsed = time.perf_counter() - start
+
+    # memory is traced in a separate pass, tracing slows the signing down several times
+    tracemalloc.start()
+    for _ in bucket.iter_file_urls(workers=workers):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--objects", type=int, default=100000)
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="seconds the stand-in waits per listing page")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    with S3StandIn(latency=args.latency) as stand_in:
+        stand_in.objects.update(("picture-{:07d}.png".format(i), 0) for i in range(args.objects))
+        Config.AWS_ENDPOINT_URL = stand_in.url
+        from src.libs.aws import AwsBucket
+        bucket = AwsBucket()
+
+        print("{:>10} {:>10} {:>10} {:>12} {:>12}".format("workers", "urls", "seconds", "urls/s", "peak KiB"))
+        for workers in (1, 8):
+            count, elapsed, peak = run(bucket, workers)
+            print("{:>10} {:>10} {:>10.2f} {:>12.0f} {:>12.0f}".format(
+                workers, count, elapsed, count / elapsed, peak / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark of dumping list pages with the compiled dump functions compared to schema.dump.
+Runs against a temporary SQLite database, the pages are loaded once and dumped repeatedly.
+
+Run from the project root:
+    python -m benchmark.bench_serializer --wines 1000 --rounds 20
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmark.bench_json import _populate
+from src.app import app
+from src.database import db
+from src.libs.serializer import dumper
+from src.models.producer import Producer
+from src.models.region import Region
+from src.models.wine import Wine
+from src.schemas.schemas import ProducerSchema, RegionSchema, WineSchema
+
+
+def _dump_ms(dump, items, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        dump(items)
+    return (time.perf_counter() - start) / rounds * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--wines", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    db_fd, db_fname = tempfile.mkstemp()
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite:///" + db_fname, TESTING=True, DEBUG=False)
+    db.init_app(app)
+    try:
+        with app.app_context():
+            db.create_all()
+            _populate(args.wines)
+            regions = [Region(name="region {}".format(i)) for i in range(10)]
+            for producer in Producer.query:
+                producer.region = regions[producer.id % 10]
+            db.session.commit()
+
+            print("{:>16} {:>8} {:>14} {:>14} {:>8}".format("schema", "items", "schema.dump ms",
+                                                           "compiled ms", "speedup"))
+            for schema_class, model in ((WineSchema, Wine), (ProducerSchema, Producer), (RegionSchema, Region)):
+                items = model.query.options(*model.load_options()).all()
+                schema_ms = _dump_ms(schema_class(many=True).dump, items, args.rounds)
+                compiled_ms = _dump_ms(dumper(schema_class, many=True), items, args.rounds)
+                print("{:>16} {:>8} {:>14.2f} {:>14.2f} {:>7.1f}x".format(
+                    schema_class.__name__, len(items), schema_ms, compiled_ms, schema_ms / compiled_ms))
+            db.session.remove()
+    finally:
+        os.close(db_fd)
+        os.unlink(db_fname)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark of model writes committed one object at a time compared to one unit of work.
+Runs against a temporary SQLite database file, so every commit is written to the disk.
+
+Run from the project root:
+    python -m benchmark.bench_unit_of_work --objects 1000
+"""
+import argparse
+import os
+import tempfile
+import time
+from contextlib import nullcontext
+
+from sqlalchemy import event
+
+from src.app import _populate_sample, app
+from src.database import db, unit_of_work
+from src.models.producer import Producer
+from src.models.region import Region
+
+
+def _producers(count):
+    region = Region(name="benchmark region")
+    region.add()
+    for i in range(count):
+        producer = Producer(name="producer {}".format(i), description="benchmark producer")
+        producer.region = region
+        producer.add()
+
+
+def measure(write, grouped):
+    """
+    Run the writes on an empty database and count the commits
+    :param write: function which adds the objects
+    :param grouped: bool whether the writes run in a unit of work
+    :return: tuple of commits and seconds
+    """
+    commits = [0]
+
+    def count(session):
+        commits[0] += 1
+
+    db.session.remove()
+    db.drop_all()
+    db.create_all()
+    event.listen(db.session, "after_commit", count)
+    try:
+        start = time.perf_counter()
+        with unit_of_work() if grouped else nullcontext():
+            write()
+        return commits[0], time.perf_counter() - start
+    finally:
+        event.remove(db.session, "after_commit", count)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--objects", type=int, default=1000, help="producers added")
+    args = parser.parse_args()
+
+    db_fd, db_fname = tempfile.mkstemp()
+    app.config.update(SQLALCHEMY_DATABASE_URI="sqlite:///" + db_fname, TESTING=True, DEBUG=False,
+                      METRICS_ENABLED=False)
+    db.init_app(app)
+    try:
+        with app.app_context():
+            cases = [("populate-database", _populate_sample),
+                     ("{} producers".format(args.objects), lambda: _producers(args.objects))]
+            print("{:<20} {:>14} {:>9} {:>10}".format("case", "path", "commits", "seconds"))
+            for name, write in cases:
+                for path, grouped in (("per object", False), ("unit of work", True)):
+                    commits, seconds = measure(write, grouped)
+                    print("{:<20} {:>14} {:>9} {:>10.3f}".format(name, path, commits, seconds))
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        os.close(db_fd)
+        os.unlink(db_fname)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark of picture upload latency and throughput against a local S3 stand-in.
+Compares the old temp file + head object + presigned post path to the streaming upload.
+
+Run from the project root:
+    python -m benchmark.bench_upload --iterations 20
+
+The stand-in is served over plain http, where botocore hashes the whole payload
+for the SigV4 signature. Against S3 over https the payload is not hashed, so the
+numbers for the largest files overstate the cost of the streaming path.
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+from io import BytesIO
+
+import requests
+from werkzeug.datastructures import FileStorage
+
+from benchmark.s3_stand_in import S3StandIn
+from config import Config
+
+SIZES = [16 * 1024, 256 * 1024, 4 * 1024 * 1024, 12 * 1024 * 1024]
+
+
+def legacy_upload(bucket, file, directory):
+    """
+    Upload path before streaming: temp file, head object and presigned post
+    """
+    path = os.path.join(directory, file.filename)
+    file.save(path)
+    if not bucket.check_if_file_exists(file.filename):
+        response = bucket.create_presigned_post(file_name=file.filename)
+        with open(path, 'rb') as picture:
+            requests.post(response['url'], data=response['fields'], files=[('file', picture)])
+    os.remove(path)
+
+
+def streaming_upload(bucket, file, directory):
+    """
+    Streaming upload path
+    """
+    bucket.upload_fileobj(file.filename, file.stream, file.mimetype)
+
+
+def run(upload, bucket, size, iterations, directory):
+    payload = os.urandom(size)
+    timings = []
+    for i in range(iterations):
+        file = FileStorage(BytesIO(payload), filename="bench-{}-{}.png".format(size, i),
+                           content_type="image/png")
+        start = time.perf_counter()
+        upload(bucket, file, directory)
+        timings.append(time.perf_counter() - start)
+    total = sum(timings)
+    return {
+        "mean_ms": statistics.mean(timings) * 1000,
+        "p95_ms": sorted(timings)[int(len(timings) * 0.95) - 1] * 1000,
+        "mb_per_s": size * iterations / total / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+
+    with S3StandIn() as stand_in, tempfile.TemporaryDirectory() as directory:
+        Config.AWS_ENDPOINT_URL = stand_in.url
+        # imported after the endpoint is set since helpers creates the bucket client on import
+        from src.libs.aws import AwsBucket
+        bucket = AwsBucket()
+
+        print("{:>10} {:>10} {:>10} {:>10} {:>10}".format("size", "path", "mean ms", "p95 ms", "MB/s"))
+        for size in SIZES:
+            for name, upload in (("legacy", legacy_upload), ("streaming", streaming_upload)):
+                result = run(upload, bucket, size, args.iterations, directory)
+                print("{:>10} {:>10} {:>10.2f} {:>10.2f} {:>10.1f}".format(
+                    size, name, result["mean_ms"], result["p95_ms"], result["mb_per_s"]))
+
+
+if __name__ == "__main__":
+    main()
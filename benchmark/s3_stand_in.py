@@ -0,0 +1,137 @@
+"""
+Minimal local S3 stand-in for the benchmarks. Supports the calls the app makes:
+put object, multipart upload, head object, presigned post and list objects v2.
+Objects are not stored, only their sizes are kept.
+"""
+import bisect
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from xml.sax.saxutils import escape
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _split(self):
+        parts = urlsplit(self.path)
+        bucket, _, key = parts.path.lstrip("/").partition("/")
+        return bucket, key, parse_qs(parts.query, keep_blank_values=True)
+
+    def _read_body(self):
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            size = 0
+            while True:
+                chunk_size = int(self.rfile.readline().split(b";")[0], 16)
+                if chunk_size == 0:
+                    self.rfile.readline()
+                    return size
+                self.rfile.read(chunk_size)
+                self.rfile.readline()
+                size += chunk_size
+        length = int(self.headers.get("Content-Length", 0))
+        remaining = length
+        while remaining:
+            remaining -= len(self.rfile.read(min(remaining, 1 << 20)))
+        return length
+
+    def _reply(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_PUT(self):
+        _, key, query = self._split()
+        size = self._read_body()
+        if "uploadId" not in query:
+            self.server.objects[key] = size
+        self._reply(200, headers={"ETag": '"{}"'.format(uuid.uuid4().hex)})
+
+    def do_POST(self):
+        bucket, key, query = self._split()
+        self._read_body()
+        if "uploads" in query:
+            body = ("<InitiateMultipartUploadResult><Bucket>{}</Bucket><Key>{}</Key>"
+                    "<UploadId>{}</UploadId></InitiateMultipartUploadResult>"
+                    ).format(bucket, escape(key), uuid.uuid4().hex)
+            self._reply(200, body.encode())
+        elif "uploadId" in query:
+            self.server.objects[key] = 0
+            body = ("<CompleteMultipartUploadResult><Bucket>{}</Bucket><Key>{}</Key>"
+                    "<ETag>\"{}\"</ETag></CompleteMultipartUploadResult>"
+                    ).format(bucket, escape(key), uuid.uuid4().hex)
+            self._reply(200, body.encode())
+        else:
+            # presigned post form upload
+            self._reply(204)
+
+    def do_HEAD(self):
+        _, key, _ = self._split()
+        if key in self.server.objects:
+            self._reply(200, headers={"Content-Length": str(self.server.objects[key])})
+        else:
+            self._reply(404)
+
+    def do_GET(self):
+        bucket, _, query = self._split()
+        time.sleep(self.server.latency)
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        start = query.get("continuation-token", query.get("start-after", [""]))[0]
+        keys = self.server.sorted_keys()
+        offset = bisect.bisect_right(keys, start)
+        page, truncated = keys[offset:offset + max_keys], len(keys) > offset + max_keys
+        contents = "".join("<Contents><Key>{}</Key><Size>{}</Size></Contents>".format(
+            escape(key), self.server.objects[key]) for key in page)
+        token = "<NextContinuationToken>{}</NextContinuationToken>".format(
+            escape(page[-1])) if truncated else ""
+        body = ("<ListBucketResult><Name>{}</Name><KeyCount>{}</KeyCount><MaxKeys>{}</MaxKeys>"
+                "<IsTruncated>{}</IsTruncated>{}{}</ListBucketResult>"
+                ).format(bucket, len(page), max_keys, str(truncated).lower(), contents, token)
+        self._reply(200, body.encode())
+
+
+class S3StandIn:
+    """
+    Runs the stand-in server in a background thread. Listing requests
+    wait for the given latency in seconds to resemble a remote bucket.
+    """
+    def __init__(self, latency=0.0):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.latency = latency
+        self.server.objects = {}
+        self.server.sorted_keys = self._sorted_keys
+        self._keys = (None, [])
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def _sorted_keys(self):
+        # listings of a large bucket are paged many times, keep the keys sorted once
+        # per generation of the object set instead of sorting on every page
+        size, keys = self._keys
+        if size != len(self.server.objects):
+            keys = sorted(self.server.objects)
+            self._keys = (len(keys), keys)
+        return keys
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server.server_port)
+
+    @property
+    def objects(self):
+        return self.server.objects
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -1,6 +1,7 @@
 """
 Configuration file to provide the app configuration
 """
+from datetime import timedelta
 from os import environ
 from dotenv import load_dotenv
 
@@ -18,13 +19,66 @@ class Config:
     SQLALCHEMY_DATABASE_URI = environ.get('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Pagination
+    PAGE_SIZE_DEFAULT = int(environ.get("PAGE_SIZE_DEFAULT", 100))
+    PAGE_SIZE_MAX = int(environ.get("PAGE_SIZE_MAX", 1000))
+
+    # Bulk import, records validated and inserted in one transaction
+    BULK_CHUNK_SIZE = int(environ.get("BULK_CHUNK_SIZE", 500))
+
+    # Catalog export, rows read and written per batch
+    EXPORT_BATCH_SIZE = int(environ.get("EXPORT_BATCH_SIZE", 1000))
+
+    # Response cache
+    CACHE_ENABLED = environ.get("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_MAX_ENTRIES = int(environ.get("CACHE_MAX_ENTRIES", 1024))
+    CACHE_TTL = int(environ.get("CACHE_TTL", 60))
+
+    # Primary keys of the reference tables by name, for linking rows on the write paths
+    REFERENCE_CACHE_ENABLED = environ.get("REFERENCE_CACHE_ENABLED", "true").lower() == "true"
+    REFERENCE_CACHE_MAX_ENTRIES = int(environ.get("REFERENCE_CACHE_MAX_ENTRIES", 10000))
+    REFERENCE_CACHE_TTL = int(environ.get("REFERENCE_CACHE_TTL", 60))
+
+    # Response compression, levels of the content codings
+    COMPRESSION_ENABLED = environ.get("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE = int(environ.get("COMPRESSION_MIN_SIZE", 1024))
+    COMPRESSION_GZIP_LEVEL = int(environ.get("COMPRESSION_GZIP_LEVEL", 6))
+    COMPRESSION_BROTLI_LEVEL = int(environ.get("COMPRESSION_BROTLI_LEVEL", 4))
+    COMPRESSION_ZSTD_LEVEL = int(environ.get("COMPRESSION_ZSTD_LEVEL", 3))
+
+    # Prometheus metrics at /metrics
+    METRICS_ENABLED = environ.get("METRICS_ENABLED", "true").lower() == "true"
+
+    # Request timings in Server-Timing header and log lines
+    TIMING_ENABLED = environ.get("TIMING_ENABLED", "false").lower() == "true"
+    TIMING_LOG = environ.get("TIMING_LOG", "false").lower() == "true"
+
     # AWS configs
     AWS_BUCKET = environ.get("AWS_BUCKET")
     ACCESS_KEY_ID = environ.get("ACCESS_KEY_ID")
     ACCESS_KEY_SECRET = environ.get("ACCESS_KEY_SECRET")
+    # e.g. a local S3 compatible server for development and benchmarks
+    AWS_ENDPOINT_URL = environ.get("AWS_ENDPOINT_URL")
+
+    # Uploads, files up to spool size are kept in memory and sent to S3 with one request,
+    # larger ones are spooled to a temporary file and sent as a multipart upload
+    UPLOAD_MAX_SIZE = int(environ.get("UPLOAD_MAX_SIZE", 64 * 1024 * 1024))
+    UPLOAD_SPOOL_SIZE = int(environ.get("UPLOAD_SPOOL_SIZE", 8 * 1024 * 1024))
 
     # Authentication
     JWT_SECRET_KEY = environ.get("JWT_SECRET_KEY")
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(environ.get("JWT_REFRESH_TOKEN_DAYS", 30)))
+    # Revoked tokens, shared by the workers of the host through the file, by default in the instance
+    # folder of the app, empty keeps them in the process
+    JWT_BLOCKLIST_PATH = environ.get("JWT_BLOCKLIST_PATH")
+    JWT_BLOCKLIST_SYNC_INTERVAL = float(environ.get("JWT_BLOCKLIST_SYNC_INTERVAL", 1.0))
+
+    # Password hashing in a process pool, method and its cost for new and rehashed passwords,
+    # logins over the pending limit get 429. With no workers passwords are hashed in the request.
+    PASSWORD_HASH_METHOD = environ.get("PASSWORD_HASH_METHOD", "pbkdf2:sha256")
+    PASSWORD_HASH_ITERATIONS = int(environ.get("PASSWORD_HASH_ITERATIONS", 260000))
+    PASSWORD_HASH_WORKERS = int(environ.get("PASSWORD_HASH_WORKERS", 2))
+    PASSWORD_HASH_MAX_PENDING = int(environ.get("PASSWORD_HASH_MAX_PENDING", 8))
 
     # Redoc
     REDOC = {'title': 'Winetime',
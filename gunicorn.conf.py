@@ -0,0 +1,31 @@
+"""
+Gunicorn configuration, read from the working directory when gunicorn starts.
+The workers write their Prometheus metrics to files in PROMETHEUS_MULTIPROC_DIR,
+which has to be set before the app is imported and is emptied on every start.
+"""
+import os
+import shutil
+import tempfile
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "winetime-metrics"))
+
+
+def on_starting(server):
+    """
+    Empty the metrics directory of the previous run
+    :param server: gunicorn arbiter
+    """
+    directory = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(directory, ignore_errors=True)
+    os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    """
+    Remove the live gauges of an exited worker, its counters and histograms are kept
+    :param server: gunicorn arbiter
+    :param worker: exited worker
+    """
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,62 @@
+"""add full-text search index
+
+Revision ID: 4e8b6f2a9d15
+Revises: d27a9be4c018
+Create Date: 2026-10-18 13:21:40.118524
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4e8b6f2a9d15'
+down_revision = 'd27a9be4c018'
+branch_labels = None
+depends_on = None
+
+# searched table, document id offset, name column and body expression
+sources = (
+    ('wine', 1, 'name', "coalesce({0}description, '') || ' ' || coalesce({0}style, '')"),
+    ('producer', 2, 'name', "coalesce({0}description, '')"),
+    ('grape', 3, 'name', "coalesce({0}description, '')"),
+)
+searched_columns = {'wine': 'name, description, style', 'producer': 'name, description',
+                    'grape': 'name, description'}
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE search_index USING fts5("
+                   "name, body, kind UNINDEXED, tokenize = 'porter unicode61')")
+        for table, offset, name, body in sources:
+            insert = ("INSERT INTO search_index(rowid, name, body, kind) VALUES "
+                      "(new.id * 4 + {offset}, new.{name}, {body}, '{table}');"
+                      ).format(offset=offset, name=name, body=body.format('new.'), table=table)
+            delete = "DELETE FROM search_index WHERE rowid = old.id * 4 + {};".format(offset)
+            op.execute("CREATE TRIGGER {0}_search_insert AFTER INSERT ON {0} BEGIN {1} END".format(
+                table, insert))
+            op.execute("CREATE TRIGGER {0}_search_update AFTER UPDATE OF {1} ON {0} BEGIN {2} {3} END".format(
+                table, searched_columns[table], delete, insert))
+            op.execute("CREATE TRIGGER {0}_search_delete AFTER DELETE ON {0} BEGIN {1} END".format(
+                table, delete))
+            op.execute("INSERT INTO search_index(rowid, name, body, kind) "
+                       "SELECT id * 4 + {offset}, {name}, {body}, '{table}' FROM {table}".format(
+                           offset=offset, name=name, body=body.format(''), table=table))
+    elif dialect == 'postgresql':
+        for table, _, name, body in sources:
+            op.execute("CREATE INDEX ix_{0}_search ON {0} USING gin "
+                       "(to_tsvector('english', coalesce({1}, '') || ' ' || {2}))".format(
+                           table, name, body.format('')))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for table, *_ in sources:
+            for operation in ('insert', 'update', 'delete'):
+                op.execute("DROP TRIGGER {}_search_{}".format(table, operation))
+        op.execute("DROP TABLE search_index")
+    elif dialect == 'postgresql':
+        for table, *_ in sources:
+            op.execute("DROP INDEX ix_{}_search".format(table))
@@ -0,0 +1,35 @@
+"""store picture keys instead of presigned urls
+
+Revision ID: d27a9be4c018
+Revises: 9c41e7b03a56
+Create Date: 2026-10-18 11:47:52.910385
+
+"""
+from urllib.parse import unquote, urlsplit
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd27a9be4c018'
+down_revision = '9c41e7b03a56'
+branch_labels = None
+depends_on = None
+
+wine = sa.table('wine', sa.column('id', sa.Integer), sa.column('picture', sa.String))
+
+
+def upgrade():
+    connection = op.get_bind()
+    rows = connection.execute(
+        sa.select(wine.c.id, wine.c.picture).where(wine.c.picture.like('https://%.amazonaws.com/%'))
+    ).all()
+    for id_, picture in rows:
+        key = unquote(urlsplit(picture).path.rsplit('/', 1)[-1])
+        connection.execute(wine.update().where(wine.c.id == id_).values(picture=key))
+
+
+def downgrade():
+    # presigned urls are produced on dump, stored keys remain valid
+    pass
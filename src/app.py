@@ -12,8 +12,19 @@ from flask_migrate import Migrate
 from flask_redoc import Redoc
 from flask_restful import Api
 
-from src.database import db
-from src.libs.helpers import get_file_url
+from src.database import db, unit_of_work
+from src.libs import changes  # pylint: disable=unused-import
+from src.libs import metrics, timing
+from src.libs.blocklist import token_blocklist
+from src.libs.cache import response_cache
+from src.libs.codec import output_json
+from src.libs.compression import compress_response
+from src.libs.export import EXPORT_FORMATS, export_catalog, gzipped
+from src.libs.generator import generate_catalog
+from src.libs.helpers import SpooledRequest
+from src.libs.passwords import password_hasher
+from src.libs.references import reference_cache
+from src.libs.search import include_object
 from src.models.country import Country
 from src.models.grape import Grape
 from src.models.producer import Producer
@@ -21,20 +32,32 @@ from src.models.region import Region
 from src.models.wine import Wine
 from src.models.wine_type import Wine_type
 from src.resources.country import CountryItem, CountryList
+from src.resources.export import CatalogExport
 from src.resources.grape import GrapeItem, GrapeList
 from src.resources.producer import ProducerList, ProducerItem
 from src.resources.region import RegionItem, RegionList
-from src.resources.user import UserLogin, UserLogout, UserRegister, UserItem
-from src.resources.wine import WineItem, WineList
+from src.resources.search import Search
+from src.resources.user import UserLogin, UserLogout, UserRefresh, UserRegister, UserItem
+from src.resources.wine import WineBulk, WineItem, WineList
 from src.resources.wine_type import Wine_typeItem, Wine_typeList
 
 app = Flask(__name__)
+app.request_class = SpooledRequest
 env_config = os.getenv("APP_SETTINGS", "config.Config")
 app.config.from_object(env_config)
 jwt = JWTManager(app)
+token_blocklist.init_app(app, jwt)
 db.init_app(app)
+response_cache.init_app(app)
+reference_cache.init_app(app)
+password_hasher.init_app(app)
 api = Api(app)
-migrate = Migrate(app, db)
+api.representation("application/json")(output_json)
+# metrics and timing hooks first, the after request hooks run in reverse order
+metrics.init_app(app)
+timing.init_app(app)
+app.after_request(compress_response)
+migrate = Migrate(app, db, include_object=include_object)
 Bootstrap(app)
 redoc = Redoc(app, "doc/bundled.yml")
 
@@ -67,12 +90,26 @@ def delete_tables_cmd():
 
 
 @click.command("populate-database")
+@click.option("--scale", type=click.IntRange(min=0), default=None,
+              help="Number of wines of a generated catalog, the sample wines when not given")
+@click.option("--seed", type=int, default=0, help="Seed of the generated catalog")
 @with_appcontext
-def populate_database_cmd():
+def populate_database_cmd(scale, seed):
     """
-    Populate the base contents of database
+    Populate the base contents of database, or a generated catalog of given scale
     :return db content:
     """
+    if scale is not None:
+        counts = generate_catalog(scale, seed)
+        click.echo(", ".join("{} {}".format(count, table) for table, count in counts.items()))
+        return
+
+    # one transaction for the whole sample instead of a commit for every object
+    with unit_of_work():
+        _populate_sample()
+
+
+def _populate_sample():
     italy = Country(name='Italy')
     italy.add()
     france = Country(name='France')
@@ -153,9 +190,8 @@ def populate_database_cmd():
     touriga_nacional.region = norte
     touriga_nacional.add()
 
-    crognolo_picture = get_file_url('tenuta-sette-ponti-crognolo-toscana.png')
     crognolo_toscana = Wine(name='Crognolo Toscana', year_produced=2018, alcohol_percentage=14.5, volume=750,
-                            picture=crognolo_picture,
+                            picture='tenuta-sette-ponti-crognolo-toscana.png',
                             description='Made with 85% Sangiovese, 8% Merlot and 7% Cabernet Sauvignon, this opens '
                                         'with aromas of plum, tobacco and baking spice. The concentrated palate '
                                         'offers blackberry jam, licorice and powdered sage alongside grainy tannins.',
@@ -165,9 +201,8 @@ def populate_database_cmd():
     crognolo_toscana.grape = sangiovese
     crognolo_toscana.add()
 
-    muscadet_picture = get_file_url('chateau-de-poyet-muscadet-sevre-et-maine-sur-lie.png')
     muscadet = Wine(name='Muscadet Sevre et Maine Sur Lie', year_produced=2018, alcohol_percentage=14.5, volume=750,
-                    picture=muscadet_picture,
+                    picture='chateau-de-poyet-muscadet-sevre-et-maine-sur-lie.png',
                     description='A nice crisp drink. Pale in colour with a nice "tang" on the mouth. Absolutely '
                                 'quaffable. As all Muscadet Sevre et Maine sur Lie, Chateau du Poyet keeps its wine '
                                 'on lees all over the winter and cannot bottle them before the 3rd Thursday of March. '
@@ -178,9 +213,8 @@ def populate_database_cmd():
     muscadet.grape = melon_de_bourgogne
     muscadet.add()
 
-    grahams_picture = get_file_url('grahams-20-years-old-tawny-port.png')
     grahams_port = Wine(name='20 year old tawny port', year_produced=2018, alcohol_percentage=20, volume=750,
-                        picture=grahams_picture,
+                        picture='grahams-20-years-old-tawny-port.png',
                         description='Graham’s 20 Year Old Tawny has an amber, golden tawny colour. On the nose, '
                                     'it shows an excellent bouquet with a characteristic ‘nutty’ character and '
                                     'delicious mature fruit with hints of orange peel, exquisitely mellowed by '
@@ -193,16 +227,38 @@ def populate_database_cmd():
     grahams_port.add()
 
 
+@click.command("export-catalog")
+@click.option("--format", "export_format", type=click.Choice(list(EXPORT_FORMATS)), default="ndjson",
+              help="Export format")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True), default="-",
+              help="Output file, defaults to standard output")
+@click.option("--gzip", "compress", is_flag=True, help="Compress the output with gzip")
+@with_appcontext
+def export_catalog_cmd(export_format, output, compress):
+    """
+    Export all wines with the names of their relations as NDJSON or CSV
+    """
+    chunks = export_catalog(export_format, app.config["EXPORT_BATCH_SIZE"])
+    if compress:
+        chunks = gzipped(chunks)
+    with click.open_file(output, "wb") as file:
+        for chunk in chunks:
+            file.write(chunk)
+
+
 app.cli.add_command(create_tables_cmd)
 app.cli.add_command(delete_tables_cmd)
 app.cli.add_command(populate_database_cmd)
+app.cli.add_command(export_catalog_cmd)
 
 api.add_resource(UserLogin, "/api/login")
 api.add_resource(UserLogout, "/api/logout")
+api.add_resource(UserRefresh, "/api/refresh")
 api.add_resource(UserRegister, "/api/register")
 api.add_resource(UserItem, "/api/user/<string:username>")
 api.add_resource(WineItem, "/api/wines/<string:name>")
 api.add_resource(WineList, "/api/wines")
+api.add_resource(WineBulk, "/api/wines/bulk")
 api.add_resource(GrapeItem, "/api/grapes/<string:name>")
 api.add_resource(GrapeList, "/api/grapes")
 api.add_resource(Wine_typeItem, "/api/wine_types/<string:name>")
@@ -213,3 +269,5 @@ api.add_resource(RegionItem, "/api/regions/<string:name>")
 api.add_resource(RegionList, "/api/regions")
 api.add_resource(CountryItem, "/api/countries/<string:name>")
 api.add_resource(CountryList, "/api/countries")
+api.add_resource(CatalogExport, "/api/export")
+api.add_resource(Search, "/api/search")
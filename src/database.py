@@ -1,6 +1,44 @@
-"""
-Module that provides the SQLAlchemy database
-"""
-from flask_sqlalchemy import SQLAlchemy
-
-db = SQLAlchemy()
+"""
+Module that provides the SQLAlchemy database and the unit of work,
+which groups the writes of several model methods to one transaction
+"""
+from contextlib import contextmanager
+
+from flask_sqlalchemy import SQLAlchemy
+
+db = SQLAlchemy()
+
+# session info key of the number of open units of work
+UNIT_OF_WORK_DEPTH = "unit_of_work_depth"
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Group the writes of the block to one transaction. Model add and delete only stage
+    their objects in the block, they are flushed when a query needs them or with
+    db.session.flush(), and committed once when the block ends. The transaction is rolled
+    back when the block raises. Nested units of work join the outermost one.
+    :return: SQLAlchemy session
+    """
+    session = db.session()
+    depth = session.info.get(UNIT_OF_WORK_DEPTH, 0)
+    session.info[UNIT_OF_WORK_DEPTH] = depth + 1
+    try:
+        yield session
+        if depth == 0:
+            session.commit()
+    except BaseException:
+        if depth == 0:
+            session.rollback()
+        raise
+    finally:
+        session.info[UNIT_OF_WORK_DEPTH] = depth
+
+
+def commit_session():
+    """
+    Commit the session, unless a unit of work is open, which commits when it ends
+    """
+    if not db.session.info.get(UNIT_OF_WORK_DEPTH):
+        db.session.commit()
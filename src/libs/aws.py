@@ -3,9 +3,47 @@ This module is a lib class to provide AWS S3 bucket functionalities.
 """
 
 import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from config import Config
+from src.libs.metrics import CACHE_LOOKUPS
+
+# presigned urls are valid for 7 days and are signed again one day before they expire
+URL_EXPIRATION = 604800
+URL_REFRESH_MARGIN = 86400
+URL_CACHE_SIZE = 10000
+# bucket listings are read in pages of list objects v2 and signed in parallel batches
+LIST_PAGE_SIZE = 1000
+SIGN_BATCH_SIZE = 250
+SIGN_WORKERS = 8
+
+
+class _PrefixedStream:
+    """
+    Read-only stream which first returns the already read prefix
+    and then continues reading from the underlying stream.
+    """
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._offset = 0
+        self._stream = stream
+
+    def read(self, size=-1):
+        if self._offset >= len(self._prefix):
+            return self._stream.read(size)
+        if size is None or size < 0:
+            data = self._prefix[self._offset:] + self._stream.read()
+            self._offset = len(self._prefix)
+            return data
+        data = self._prefix[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
 
 
 class AwsBucket:
@@ -17,9 +55,15 @@ class AwsBucket:
         self.bucket = bucket_name or Config.AWS_BUCKET
         self.s3 = boto3.client(
             's3',
+            endpoint_url=Config.AWS_ENDPOINT_URL,
             aws_access_key_id=Config.ACCESS_KEY_ID,
             aws_secret_access_key=Config.ACCESS_KEY_SECRET
         )
+        self.spool_size = Config.UPLOAD_SPOOL_SIZE
+        self.transfer_config = TransferConfig(multipart_threshold=self.spool_size,
+                                              multipart_chunksize=self.spool_size)
+        self._urls = OrderedDict()
+        self._urls_lock = threading.Lock()
 
     def create_presigned_post(self, file_name,
                               fields=None, conditions=None, expiration=3600):
@@ -43,36 +87,118 @@ class AwsBucket:
             return None
         return response
 
-    def get_file_url(self, file_name):
+    def upload_fileobj(self, file_name, stream, content_type=None):
         """
-        Fetches the presigned url for the file
+        Streams the file to the bucket. Files up to the spool size are read
+        to memory and sent with one put request, larger files are sent as
+        a multipart upload while the rest of the stream is read.
         :param file_name: string name of the picture file
-        :return: presigned url for the picture file
+        :param stream: binary file-like object to read the file from
+        :param content_type: string mime type of the file
+        :return: True or false, depending on if the upload succeeded
         """
+        extra_args = {'ContentType': content_type} if content_type else {}
         try:
-            public_url = self.s3.generate_presigned_url('get_object',
-                                                        Params={'Bucket': self.bucket,
-                                                                'Key': file_name},
-                                                        ExpiresIn=604800)
-            return public_url
+            head = stream.read(self.spool_size + 1)
+            if len(head) <= self.spool_size:
+                self.s3.put_object(Bucket=self.bucket, Key=file_name, Body=head, **extra_args)
+            else:
+                self.s3.upload_fileobj(_PrefixedStream(head, stream), self.bucket, file_name,
+                                       ExtraArgs=extra_args, Config=self.transfer_config)
         except ClientError as e:
             logging.error(e)
+            return False
+        return True
+
+    def get_file_url(self, file_name):
+        """
+        Fetches the presigned url for the file. Urls are memoized and
+        signed again when they are about to expire.
+        :param file_name: string name of the picture file
+        :return: presigned url for the picture file
+        """
+        now = time.time()
+        with self._urls_lock:
+            cached = self._urls.get(file_name)
+            if cached is not None and cached[1] - now > URL_REFRESH_MARGIN:
+                self._urls.move_to_end(file_name)
+                CACHE_LOOKUPS.labels("picture_url", "hit").inc()
+                return cached[0]
+        CACHE_LOOKUPS.labels("picture_url", "miss").inc()
+
+        public_url = self.sign_file_url(file_name)
+        if public_url is None:
             return None
 
+        with self._urls_lock:
+            self._urls[file_name] = (public_url, now + URL_EXPIRATION)
+            self._urls.move_to_end(file_name)
+            while len(self._urls) > URL_CACHE_SIZE:
+                self._urls.popitem(last=False)
+        return public_url
+
+    def iter_file_keys(self, page_size=LIST_PAGE_SIZE):
+        """
+        Lists the keys of all files in the bucket, following the
+        continuation tokens until the listing is complete
+        :param page_size: int number of keys requested per page
+        :return: generator of string file keys
+        """
+        for keys in self._iter_key_pages(page_size):
+            yield from keys
+
+    def iter_file_urls(self, batch_size=SIGN_BATCH_SIZE, workers=SIGN_WORKERS):
+        """
+        Presigned urls for all files in the bucket. The next page of the
+        listing is requested while the keys of the current page are signed
+        in parallel batches, so at most two pages of keys are held in memory.
+        The listing bypasses the memoized urls to not evict them.
+        :param batch_size: int number of keys signed per batch
+        :param workers: int number of signing threads
+        :return: generator of presigned urls
+        """
+        pages = self._iter_key_pages(LIST_PAGE_SIZE)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = executor.submit(next, pages, None)
+            while True:
+                keys = pending.result()
+                if keys is None:
+                    return
+                pending = executor.submit(next, pages, None)
+                for start in range(0, len(keys), batch_size):
+                    for public_url in executor.map(self.sign_file_url, keys[start:start + batch_size]):
+                        if public_url is not None:
+                            yield public_url
+
     def get_file_urls(self):
         """
         Get all presigned urls for files
         :return: List of presigned urls
         """
-        public_urls = []
         try:
-            for item in self.s3.list_objects(Bucket=self.bucket)['Contents']:
-                presigned_url = self.s3.generate_presigned_url('get_object',
-                                                               Params={'Bucket': self.bucket,
-                                                                       'Key': item['Key']},
-                                                               ExpiresIn=604800)
-                public_urls.append(presigned_url)
-                return public_urls
+            return list(self.iter_file_urls())
+        except ClientError as e:
+            logging.error(e)
+            return None
+
+    def _iter_key_pages(self, page_size):
+        paginator = self.s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket,
+                                       PaginationConfig={'PageSize': page_size}):
+            yield [item['Key'] for item in page.get('Contents', [])]
+
+    def sign_file_url(self, file_name):
+        """
+        Signs a new presigned url for the file without memoizing it,
+        for bulk reads which would evict the memoized urls
+        :param file_name: string name of the picture file
+        :return: presigned url for the picture file
+        """
+        try:
+            return self.s3.generate_presigned_url('get_object',
+                                                  Params={'Bucket': self.bucket,
+                                                          'Key': file_name},
+                                                  ExpiresIn=URL_EXPIRATION)
         except ClientError as e:
             logging.error(e)
             return None
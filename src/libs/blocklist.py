@@ -0,0 +1,142 @@
+"""
+This module is a lib class to provide the revocation of JWT tokens on logout. The revoked
+token ids are kept in memory until their tokens expire, so checking a token is a dict lookup
+and no database query. The workers on the same host share the revocations through a SQLite
+file, every worker reads the revocations of the others from it at most every sync interval.
+"""
+import heapq
+import os
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS revoked_token (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    jti TEXT NOT NULL UNIQUE,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_revoked_token_expires ON revoked_token (expires);
+"""
+
+
+class TokenBlocklist:
+    """
+    Revoked token ids with the expiry of their tokens. The ids are evicted from memory
+    and from the shared file when their tokens expire, after which the JWT validation
+    refuses the tokens anyway. The rows of the file are read incrementally by id.
+    """
+    def __init__(self, path=None, sync_interval=1.0):
+        self.path = path
+        self.sync_interval = sync_interval
+        self._expires = {}
+        self._expiry_heap = []
+        self._last_id = 0
+        self._next_sync = 0.0
+        self._connection = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app, jwt):
+        """
+        Read the blocklist settings from app config and register the
+        blocklist check of flask_jwt_extended. Without a configured path the file
+        is in the instance folder of the app, an empty path keeps the revocations
+        in the process.
+        :param app: Flask app
+        :param jwt: JWTManager
+        """
+        path = app.config.get("JWT_BLOCKLIST_PATH")
+        if path is None:
+            os.makedirs(app.instance_path, exist_ok=True)
+            path = os.path.join(app.instance_path, "token-blocklist.db")
+        with self._lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+        self.path = path
+        self.sync_interval = app.config.get("JWT_BLOCKLIST_SYNC_INTERVAL", self.sync_interval)
+        self.clear()
+        jwt.token_in_blocklist_loader(self._check_token)
+
+    def is_revoked(self, jti):
+        """
+        Whether the token of given id is revoked, here or in another worker
+        :param jti: string JWT id
+        :return: bool
+        """
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        return jti in self._expires
+
+    def revoke(self, jti, expires):
+        """
+        Revoke a token until it expires
+        :param jti: string JWT id
+        :param expires: int expiry timestamp of the token, the exp claim
+        """
+        with self._lock:
+            self._add(jti, expires)
+            if self.path:
+                connection = self._connect()
+                with connection:
+                    connection.execute("DELETE FROM revoked_token WHERE expires < ?", (time.time(),))
+                    connection.execute("INSERT OR IGNORE INTO revoked_token (jti, expires) VALUES (?, ?)",
+                                       (jti, expires))
+
+    def sync(self):
+        """
+        Read the revocations of the other workers from the shared file and evict the
+        expired ones. Skipped when another thread is syncing.
+        """
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._next_sync = time.monotonic() + self.sync_interval
+            if self.path:
+                rows = self._connect().execute("SELECT id, jti, expires FROM revoked_token WHERE id > ?",
+                                               (self._last_id,)).fetchall()
+                for id_, jti, expires in rows:
+                    self._add(jti, expires)
+                    self._last_id = id_
+            now = time.time()
+            while self._expiry_heap and self._expiry_heap[0][0] < now:
+                _, jti = heapq.heappop(self._expiry_heap)
+                if self._expires.get(jti, now) < now:
+                    del self._expires[jti]
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """
+        Forget the revocations in memory, those in the shared file are read on next sync
+        """
+        with self._lock:
+            self._expires.clear()
+            self._expiry_heap.clear()
+            self._last_id = 0
+            self._next_sync = 0.0
+
+    def __len__(self):
+        return len(self._expires)
+
+    def _add(self, jti, expires):
+        if jti not in self._expires and expires >= time.time():
+            self._expires[jti] = expires
+            heapq.heappush(self._expiry_heap, (expires, jti))
+
+    def _connect(self):
+        # a connection inherited from the parent process is not usable after fork
+        if self._connection is None or self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            # readers of the other workers do not wait for a revocation being written
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._connection
+
+    def _check_token(self, jwt_header, jwt_payload):
+        return self.is_revoked(jwt_payload["jti"])
+
+
+token_blocklist = TokenBlocklist()
@@ -0,0 +1,165 @@
+"""
+This module is a lib class to provide the bulk import of wines. Records are validated
+in chunks, the names of a chunk are resolved with one query per table and every chunk
+is inserted in its own transaction, so a failing chunk does not undo the others. A chunk
+which conflicts with a concurrent write is inserted again one record at a time.
+"""
+from itertools import islice
+
+from flask import request
+from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError
+
+from src.database import db, unit_of_work
+from src.libs import codec
+from src.libs.changes import mark_changed
+from src.models.grape import Grape
+from src.models.producer import Producer
+from src.models.wine import Wine
+from src.models.wine_type import Wine_type
+from src.schemas.schemas import WineImportSchema
+from src.utils.constants import ALREADY_EXISTS, ERROR_INSERTING, INVALID_RECORD, NOT_JSON
+
+NDJSON_MIMETYPES = ("application/x-ndjson", "application/jsonl")
+
+# wine columns copied as they are from the loaded records
+WINE_COLUMNS = ("name", "style", "year_produced", "alcohol_percentage",
+                "volume", "picture", "description")
+
+wine_import_schema = WineImportSchema()
+
+
+def read_records():
+    """
+    Read the import records from request body. Newline delimited JSON is parsed
+    line by line while the body is read, otherwise the body must be a JSON array.
+    :return: iterator of records, lines which are not JSON are given as ValueError
+    :raise ValueError: when the body is neither
+    """
+    if request.mimetype in NDJSON_MIMETYPES:
+        return _read_lines(request.stream)
+
+    if request.is_json:
+        content = request.get_json(silent=True)
+        if isinstance(content, list):
+            return iter(content)
+    raise ValueError(NOT_JSON)
+
+
+def import_wines(records, chunk_size):
+    """
+    Import wines from records in the WineSchema format. Wine types, grapes and
+    producers which do not exist yet are created like on a single wine post.
+    :param records: iterable of records
+    :param chunk_size: int number of records validated and inserted together
+    :return: list of per record results in record order
+    """
+    records = iter(records)
+    results = []
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return results
+        results.extend(_import_chunk(chunk, len(results)))
+
+
+def _read_lines(stream):
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield codec.loads(line)
+        except ValueError as err:
+            yield err
+
+
+def _import_chunk(chunk, offset):
+    results = [None] * len(chunk)
+    pending = []
+    names = set()
+
+    for position, record in enumerate(chunk):
+        index = offset + position
+        if isinstance(record, ValueError):
+            results[position] = {"index": index, "status": 400, "[ERROR]": INVALID_RECORD}
+            continue
+        try:
+            data = wine_import_schema.load(record)
+        except ValidationError as err:
+            results[position] = {"index": index, "status": 400, "errors": err.messages}
+            continue
+        pending.append((position, data))
+        names.add(data["name"])
+
+    # duplicates of existing wines and of earlier records in the same import
+    existing = Wine.find_existing_names(names) if names else set()
+    rows = []
+    for position, data in pending:
+        name = data["name"]
+        if name in existing:
+            results[position] = {"index": offset + position, "name": name,
+                                 "status": 409, "[INFO]": ALREADY_EXISTS}
+            continue
+        existing.add(name)
+        rows.append((position, data))
+
+    if rows:
+        try:
+            with unit_of_work():
+                _insert_rows([data for _, data in rows])
+            inserted = [{"status": 201}] * len(rows)
+        except IntegrityError:
+            # e.g. a wine of the same name inserted after the duplicate check, only
+            # the conflicting records fail when they are inserted one at a time
+            inserted = [_insert_record(data) for _, data in rows]
+        for (position, data), result in zip(rows, inserted):
+            results[position] = dict(result, index=offset + position, name=data["name"])
+    return results
+
+
+def _insert_record(data):
+    try:
+        with unit_of_work():
+            _insert_rows([data])
+        return {"status": 201}
+    except IntegrityError:
+        if Wine.find_existing_names([data["name"]]):
+            return {"status": 409, "[INFO]": ALREADY_EXISTS}
+        return {"status": 500, "[ERROR]": ERROR_INSERTING}
+
+
+def _insert_rows(chunk):
+    tables = {Wine.__tablename__}
+    wine_type_ids = _resolve(Wine_type.find_ids_by_types, Wine_type.insert_types,
+                             {data["wine_type"].type for data in chunk if "wine_type" in data},
+                             Wine_type.__tablename__, tables)
+    grape_ids = _resolve(Grape.find_ids_by_names, Grape.insert_names,
+                         {data["grape"].name for data in chunk if "grape" in data},
+                         Grape.__tablename__, tables)
+    producer_ids = _resolve(Producer.find_ids_by_names, Producer.insert_names,
+                            {data["producer"].name for data in chunk if "producer" in data},
+                            Producer.__tablename__, tables)
+
+    rows = []
+    for data in chunk:
+        row = {column: data.get(column) for column in WINE_COLUMNS}
+        row["wine_type_id"] = wine_type_ids[data["wine_type"].type] if "wine_type" in data else None
+        row["grape_id"] = grape_ids[data["grape"].name] if "grape" in data else None
+        row["producer_id"] = producer_ids[data["producer"].name] if "producer" in data else None
+        rows.append(row)
+
+    Wine.insert_rows(rows)
+    mark_changed(db.session, *tables)
+
+
+def _resolve(find, insert, values, table, tables):
+    if not values:
+        return {}
+    ids = find(values)
+    missing = values - ids.keys()
+    if missing:
+        insert(missing)
+        ids.update(find(missing))
+        tables.add(table)
+    return ids
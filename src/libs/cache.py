@@ -0,0 +1,182 @@
+"""
+This module is a lib class to provide an in-process response cache for the GET resources.
+Cached responses are evicted when a commit changes any of the tables they are built from,
+see src.libs.changes for the tracking of changed tables. Every entry also keeps the change
+versions of its tables, and is not served once they differ from those in the database, so
+the writes of other workers are not served stale either.
+"""
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from flask import g, request
+from flask_restful import unpack
+
+from src.libs.metrics import CACHE_LOOKUPS
+from src.models.table_version import TableVersion
+
+
+class ResponseCache:
+    """
+    Bounded LRU cache with time to live. Every entry is tagged with the
+    database tables its response is built from, so that a write evicts
+    exactly the responses it makes stale.
+    """
+    def __init__(self, max_entries=1024, ttl=60):
+        self.enabled = True
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._keys_by_table = defaultdict(set)
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Read the cache settings from app config
+        :param app: Flask app
+        """
+        self.enabled = app.config.get("CACHE_ENABLED", True)
+        self.max_entries = app.config.get("CACHE_MAX_ENTRIES", self.max_entries)
+        self.ttl = app.config.get("CACHE_TTL", self.ttl)
+        app.before_request(_reset_variants)
+
+    def snapshot(self, tables):
+        """
+        Take the current write generation of the tables, which is given back
+        to set method to detect writes that happened while building a response
+        :param tables: iterable of table names
+        :return: tuple of generations
+        """
+        with self._lock:
+            return tuple(self._generations[table] for table in tables)
+
+    def get(self, key):
+        """
+        Get a cached value, expired entries are dropped on read
+        :param key: string cache key
+        :return: cached value or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, _, value = entry
+            if expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tables, generations=None):
+        """
+        Store a value tagged with the tables it depends on. The value is not
+        stored if any of the tables changed after the generations were taken.
+        :param key: string cache key
+        :param value: value to cache
+        :param tables: iterable of table names
+        :param generations: tuple from snapshot method
+        """
+        tables = tuple(tables)
+        with self._lock:
+            if generations is not None and \
+                    generations != tuple(self._generations[table] for table in tables):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + self.ttl, tables, value)
+            for table in tables:
+                self._keys_by_table[table].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tables):
+        """
+        Evict all entries built from any of the given tables
+        :param tables: iterable of table names
+        """
+        with self._lock:
+            for table in tables:
+                self._generations[table] += 1
+                for key in list(self._keys_by_table.pop(table, ())):
+                    self._remove(key)
+
+    def clear(self):
+        """
+        Evict all entries
+        """
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_table.clear()
+
+    def _remove(self, key):
+        _, tables, _ = self._entries.pop(key)
+        for table in tables:
+            keys = self._keys_by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_table[table]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+response_cache = ResponseCache()
+
+
+def _reset_variants():
+    # g outlives the request when an app context was pushed before it
+    g.pop("cached_variants", None)
+    g.pop("table_versions", None)
+
+
+def _table_versions(tables):
+    """
+    Change versions of the tables, read once per request and shared with the ETag
+    :param tables: names of the tables
+    :return: tuple of versions in the order of the tables
+    """
+    versions = g.get("table_versions")
+    if versions is None or not set(tables) <= set(versions):
+        versions = g.table_versions = TableVersion.find_versions(tables)
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def cached(*tables):
+    """
+    Decorator for resource GET methods to serve the response from cache.
+    The key is the request path with query string, only 200 responses are cached.
+    Every entry keeps a dict of its compressed bodies by content coding, which is
+    given to the compression of the response in g.cached_variants, and the change
+    versions of the tables, which are read from the database on every request.
+    :param tables: names of the tables the response is built from
+    :return: decorated method
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not response_cache.enabled:
+                return func(*args, **kwargs)
+
+            key = request.full_path
+            versions = _table_versions(tables)
+            hit = response_cache.get(key)
+            if hit is not None and hit[2] != versions:
+                # another worker changed the tables since the entry was stored
+                hit = None
+            CACHE_LOOKUPS.labels("response", "miss" if hit is None else "hit").inc()
+            if hit is not None:
+                response, g.cached_variants, _ = hit
+                return response
+
+            generations = response_cache.snapshot(tables)
+            response = unpack(func(*args, **kwargs))
+            if response[1] == 200:
+                g.cached_variants = {}
+                response_cache.set(key, (response, g.cached_variants, versions), tables, generations)
+            return response
+        return wrapper
+    return decorator
+
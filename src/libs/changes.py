@@ -0,0 +1,50 @@
+"""
+This module is a lib class to track the tables changed by database sessions.
+Every flush increments the change versions of the written tables in the same
+transaction, and every commit evicts the cached responses built from them
+and the cached primary keys of them.
+"""
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.database import db
+from src.libs.cache import response_cache
+from src.libs.references import reference_cache
+from src.models.table_version import TableVersion
+
+
+def mark_changed(session, *tables):
+    """
+    Mark tables changed in the current transaction. Called for every flush,
+    writes which bypass the ORM flush, such as bulk inserts, call it directly.
+    :param session: SQLAlchemy session
+    :param tables: names of the changed tables
+    """
+    tables = {table for table in tables if table != TableVersion.__tablename__
+              and db.metadata.tables[table].info.get("versioned", True)}
+    if not tables:
+        return
+
+    session.info.setdefault("changed_tables", set()).update(tables)
+    TableVersion.bump(session.connection(), tables)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_tables(session, flush_context):
+    mark_changed(session, *(obj.__table__.name for obj in
+                            chain(session.new, session.dirty, session.deleted)))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_tables(session):
+    tables = session.info.pop("changed_tables", None)
+    if tables:
+        response_cache.invalidate(tables)
+        reference_cache.invalidate(tables)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_tables(session):
+    session.info.pop("changed_tables", None)
@@ -0,0 +1,58 @@
+"""
+This module is a lib class to provide the JSON encoding and decoding of the api.
+orjson is used when it is installed, it encodes and decodes several times faster
+than the json module of the standard library, which is used otherwise.
+"""
+import json
+
+from flask import current_app, make_response
+
+from src.libs.timing import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# marshmallow error messages of list fields have integer keys
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS if orjson is not None else 0
+
+
+def dumps(data, indent=False) -> bytes:
+    """
+    Encode data to JSON
+    :param data: JSON serializable data
+    :param indent: whether the JSON is indented for reading
+    :return: bytes UTF-8 encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(data, option=ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+    return json.dumps(data, indent=4 if indent else None).encode()
+
+
+def loads(data):
+    """
+    Decode JSON, used also for request bodies as the json_module of the request class
+    :param data: string or bytes JSON
+    :return: decoded data
+    :raise ValueError: when data is not valid JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def output_json(data, code, headers=None):
+    """
+    JSON representation of the api responses, indented in debug mode
+    like the default representation of flask_restful
+    :param data: JSON serializable data
+    :param code: int status code
+    :param headers: dict of response headers
+    :return: Response
+    """
+    with timed("serialize"):
+        body = dumps(data, indent=current_app.debug) + b"\n"
+    response = make_response(body, code)
+    response.headers.extend(headers or {})
+    return response
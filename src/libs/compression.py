@@ -0,0 +1,95 @@
+"""
+This module is a lib class to provide the compression of the JSON responses.
+The encoding is negotiated from Accept-Encoding among brotli, zstd and gzip, in this
+order of preference. Compressed bodies of cached responses
+are stored with the cache entry, so a cached response is compressed only once.
+"""
+import gzip
+
+import brotli
+import zstandard
+from flask import current_app, g, request
+
+from src.libs.timing import timed
+
+
+def _brotli(data, level):
+    return brotli.compress(data, quality=level)
+
+
+def _zstd(data, level):
+    return zstandard.ZstdCompressor(level=level).compress(data)
+
+
+def _gzip(data, level):
+    # without modification time the same body is always compressed to the same bytes
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+# content codings in the order of preference, with the compressor and its level config
+ENCODINGS = {
+    "br": (_brotli, "COMPRESSION_BROTLI_LEVEL"),
+    "zstd": (_zstd, "COMPRESSION_ZSTD_LEVEL"),
+    "gzip": (_gzip, "COMPRESSION_GZIP_LEVEL"),
+}
+
+COMPRESSED_MIMETYPES = ("application/json",)
+
+
+def compress(data, encoding):
+    """
+    Compress data with given content coding at the configured level
+    :param data: bytes
+    :param encoding: string key of ENCODINGS
+    :return: compressed bytes
+    """
+    compressor, level = ENCODINGS[encoding]
+    return compressor(data, current_app.config[level])
+
+
+def etag_variants(etag):
+    """
+    ETags of the representation in every content coding. A compressed
+    body is a different representation, its ETag has the coding as suffix.
+    :param etag: string ETag of the uncompressed representation
+    :return: list of strings
+    """
+    return [etag] + ["{}-{}".format(etag, encoding) for encoding in ENCODINGS]
+
+
+def compress_response(response):
+    """
+    After request handler to compress JSON responses above the size threshold
+    with the best content coding the client accepts
+    :param response: Response
+    :return: Response
+    """
+    config = current_app.config
+    if not config["COMPRESSION_ENABLED"] or response.mimetype not in COMPRESSED_MIMETYPES or \
+            response.status_code in (204, 304) or response.direct_passthrough or \
+            response.is_streamed or "Content-Encoding" in response.headers:
+        return response
+
+    length = response.calculate_content_length()
+    if length is None or length < config["COMPRESSION_MIN_SIZE"]:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = request.accept_encodings.best_match(list(ENCODINGS))
+    if encoding is None:
+        return response
+
+    variants = g.get("cached_variants") if response.status_code == 200 else None
+    data = variants.get(encoding) if variants is not None else None
+    if data is None:
+        with timed("compress"):
+            data = compress(response.get_data(), encoding)
+        if variants is not None:
+            variants[encoding] = data
+
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag("{}-{}".format(etag, encoding), weak)
+    return response
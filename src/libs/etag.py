@@ -0,0 +1,75 @@
+"""
+This module is a lib class to provide ETags and conditional requests for the resources.
+ETags are computed from the change versions of the tables a representation is built from,
+so a conditional request is answered with one small query and without building the body.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from flask import Response, g, request
+from flask_restful import unpack
+
+from src.libs.aws import URL_REFRESH_MARGIN
+from src.libs.compression import etag_variants
+from src.models.table_version import TableVersion
+from src.utils.constants import PRECONDITION_FAILED
+
+
+def current_etag(tables):
+    """
+    Compute the ETag of the requested representation, the table versions
+    are kept in g.table_versions for the response cache
+    :param tables: names of the tables the representation is built from
+    :return: string ETag without quotes
+    """
+    versions = g.table_versions = TableVersion.find_versions(tables)
+    # presigned picture urls are signed again once per refresh margin,
+    # the ETag rotates with them so clients never keep an expired url
+    state = "{}|{}|{}".format(request.full_path,
+                              ",".join("{}:{}".format(table, versions.get(table, 0))
+                                       for table in sorted(tables)),
+                              int(time.time() // URL_REFRESH_MARGIN))
+    return hashlib.sha1(state.encode()).hexdigest()
+
+
+def etagged(*tables):
+    """
+    Decorator for resource GET methods to add an ETag header
+    and answer If-None-Match requests with 304 Not Modified
+    :param tables: names of the tables the representation is built from
+    :return: decorated method
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            etag = current_etag(tables)
+            # the client may hold the ETag of a compressed representation
+            for variant in etag_variants(etag):
+                if request.if_none_match.contains_weak(variant):
+                    return Response(status=304, headers={"ETag": '"{}"'.format(variant)})
+
+            data, code, headers = unpack(func(*args, **kwargs))
+            if code == 200:
+                headers = dict(headers, ETag='"{}"'.format(etag))
+            return data, code, headers
+        return wrapper
+    return decorator
+
+
+def precondition(*tables):
+    """
+    Decorator for resource PATCH and DELETE methods to refuse the request
+    with 412 Precondition Failed when If-Match does not match the current ETag
+    :param tables: names of the tables the representation is built from
+    :return: decorated method
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if request.if_match and not any(request.if_match.contains(variant)
+                                            for variant in etag_variants(current_etag(tables))):
+                return {"[ERROR]": PRECONDITION_FAILED}, 412
+            return func(*args, **kwargs)
+        return wrapper
+    return decorator
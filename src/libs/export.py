@@ -0,0 +1,114 @@
+"""
+This module is a lib class to provide the streaming export of the wine catalog.
+Rows are read with a server-side cursor in batches and written as NDJSON or CSV
+one batch at a time, so memory use does not grow with the size of the catalog.
+"""
+import csv
+import io
+import zlib
+
+from sqlalchemy import select
+
+from src.database import db
+from src.libs import codec
+from src.libs.helpers import is_file_key, sign_file_url
+from src.models.country import Country
+from src.models.grape import Grape
+from src.models.producer import Producer
+from src.models.region import Region
+from src.models.wine import Wine
+from src.models.wine_type import Wine_type
+
+EXPORT_COLUMNS = ("name", "wine_type", "style", "description", "grape", "producer", "region",
+                  "country", "year_produced", "alcohol_percentage", "volume", "picture")
+
+# export format to file extension and mime type
+EXPORT_FORMATS = {
+    "ndjson": ("ndjson", "application/x-ndjson"),
+    "csv": ("csv", "text/csv"),
+}
+
+
+def catalog_query():
+    """
+    Query of the exported wine columns joined with the names of the wine type,
+    grape, producer and the region and country of the producer
+    :return: SQLAlchemy select
+    """
+    return select(
+        Wine.name, Wine_type.type.label("wine_type"), Wine.style, Wine.description,
+        Grape.name.label("grape"), Producer.name.label("producer"), Region.name.label("region"),
+        Country.name.label("country"), Wine.year_produced, Wine.alcohol_percentage, Wine.volume,
+        Wine.picture
+    ).select_from(Wine) \
+        .outerjoin(Wine_type, Wine.wine_type_id == Wine_type.id) \
+        .outerjoin(Grape, Wine.grape_id == Grape.id) \
+        .outerjoin(Producer, Wine.producer_id == Producer.id) \
+        .outerjoin(Region, Producer.region_id == Region.id) \
+        .outerjoin(Country, Region.country_id == Country.id) \
+        .order_by(Wine.id)
+
+
+def catalog_batches(batch_size):
+    """
+    Read the catalog in batches with a server-side cursor where the database supports it.
+    Picture keys are signed to urls without memoizing them.
+    :param batch_size: int number of rows per batch
+    :return: generator of lists of row tuples in EXPORT_COLUMNS order
+    """
+    result = db.session.execute(catalog_query().execution_options(stream_results=True,
+                                                                  max_row_buffer=batch_size))
+    picture = EXPORT_COLUMNS.index("picture")
+    for rows in result.yield_per(batch_size).partitions():
+        batch = []
+        for row in rows:
+            row = tuple(row)
+            if row[picture] is not None and is_file_key(row[picture]):
+                row = row[:picture] + (sign_file_url(row[picture]),) + row[picture + 1:]
+            batch.append(row)
+        yield batch
+
+
+def export_catalog(export_format, batch_size):
+    """
+    Export the catalog in given format
+    :param export_format: string key of EXPORT_FORMATS
+    :param batch_size: int number of rows per written chunk
+    :return: generator of encoded chunks
+    """
+    if export_format == "csv":
+        return _csv_chunks(catalog_batches(batch_size))
+    return _ndjson_chunks(catalog_batches(batch_size))
+
+
+def gzipped(chunks, level=6):
+    """
+    Compress the chunks to one gzip stream while they are produced
+    :param chunks: iterable of bytes
+    :param level: int compression level
+    :return: generator of compressed bytes
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _ndjson_chunks(batches):
+    for batch in batches:
+        yield b"".join(codec.dumps(dict(zip(EXPORT_COLUMNS, row))) + b"\n" for row in batch)
+
+
+def _csv_chunks(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
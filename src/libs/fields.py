@@ -0,0 +1,66 @@
+"""
+This module is a lib class to provide sparse fieldsets for the resources. The fields query
+parameter selects the dumped fields of the schema, and the same fields select the columns
+and relations the models load, so unrequested columns and joins are left out of the queries.
+"""
+from functools import lru_cache
+
+from flask import request
+from sqlalchemy.orm import load_only
+
+from src.utils.constants import INVALID_FIELDS
+
+
+def fields_arg(schema_class):
+    """
+    Read the fields query parameter of the current request
+    :param schema_class: schema class of the representation
+    :return: tuple of requested field names or None for all fields
+    :raise ValueError: when a field is not dumped by the schema
+    """
+    value = request.args.get("fields")
+    if value is None:
+        return None
+
+    fields = tuple(sorted({field.strip() for field in value.split(",") if field.strip()}))
+    dumped = _dumped_fields(schema_class)
+    if not fields or not set(fields) <= dumped:
+        raise ValueError(INVALID_FIELDS.format(", ".join(sorted(dumped))))
+    return fields
+
+
+@lru_cache(maxsize=256)
+def projection(schema_class, fields=None, many=False):
+    """
+    Schema instance which dumps only the given fields. Building a schema is costly
+    compared to dumping a page, so the instances are cached per projection.
+    :param schema_class: schema class of the representation
+    :param fields: tuple of field names from fields_arg, or None for all fields
+    :param many: whether the schema dumps a list
+    :return: schema instance
+    """
+    return schema_class(only=fields, many=many)
+
+
+def projection_options(model, fields, relations):
+    """
+    Loader options which load only the requested columns and relations of the model
+    :param model: model class
+    :param fields: names of the requested fields
+    :param relations: dict of relation field name and its loader options
+    :return: tuple of loader options
+    """
+    columns = [getattr(model, field) for field in fields if field not in relations]
+    if not columns:
+        # only relations requested, the mapped primary key attributes are loaded
+        columns = [getattr(model, prop.key) for prop in model.__mapper__.column_attrs
+                   if prop.columns[0].primary_key]
+    options = [load_only(*columns)]
+    for field in fields:
+        options.extend(relations.get(field, ()))
+    return tuple(options)
+
+
+@lru_cache(maxsize=None)
+def _dumped_fields(schema_class):
+    return frozenset(name for name, field in schema_class._declared_fields.items() if not field.load_only)
@@ -0,0 +1,180 @@
+"""
+This module is a lib class to provide the generation of large synthetic wine catalogs for
+load and benchmark work. The catalog is deterministic for a seed and skewed like real ones:
+a few countries have most of the regions, a few producers make most of the wines and a few
+grapes are in most of them. Rows are inserted with bulk statements in large transactions.
+"""
+import random
+from contextlib import contextmanager
+from itertools import accumulate
+
+from sqlalchemy import func, insert, select
+
+from src.database import db, unit_of_work
+from src.libs.changes import mark_changed
+from src.libs.search import deferred_index
+from src.models.country import Country
+from src.models.grape import Grape
+from src.models.producer import Producer
+from src.models.region import Region
+from src.models.wine import Wine
+from src.models.wine_type import Wine_type
+
+# wines generated and inserted at a time, bounds the memory use
+WINE_BATCH_SIZE = 100000
+
+COUNTRIES = ("France", "Italy", "Spain", "United States", "Argentina", "Australia", "Chile", "Portugal",
+             "Germany", "South Africa", "New Zealand", "Austria", "Greece", "Hungary", "Romania", "Georgia",
+             "Moldova", "Bulgaria", "Croatia", "Slovenia", "Uruguay", "Brazil", "Canada", "Switzerland",
+             "Lebanon", "Israel", "Mexico", "China", "Japan", "England")
+GRAPES = ("Cabernet Sauvignon", "Merlot", "Chardonnay", "Pinot Noir", "Syrah", "Sauvignon Blanc", "Tempranillo",
+          "Grenache", "Riesling", "Sangiovese", "Malbec", "Pinot Grigio", "Nebbiolo", "Zinfandel", "Chenin Blanc",
+          "Cabernet Franc", "Gewurztraminer", "Viognier", "Mourvedre", "Barbera", "Gruner Veltliner", "Carmenere",
+          "Touriga Nacional", "Melon de Bourgogne", "Albarino", "Semillon", "Muscat", "Glera", "Montepulciano",
+          "Aglianico", "Primitivo", "Gamay", "Petit Verdot", "Torrontes", "Verdejo", "Xinomavro", "Saperavi",
+          "Furmint", "Blaufrankisch", "Pinotage")
+# wine types with their share of the catalog
+WINE_TYPES = (("Red", 50), ("White", 30), ("Rose", 7), ("Sparkling", 7), ("Dessert", 3), ("Port", 2),
+              ("Orange", 1))
+STYLES = ("Dry", "Off-dry", "Sweet", "Light and Crisp", "Green and Flinty", "Savory and Classic",
+          "Rich and Warming", "Bold and Structured", "Fruity and Smooth", "Earthy and Spicy")
+REGION_WORDS = ("Valley", "Hills", "Coast", "Highlands", "Plateau", "Slopes", "Basin", "Ridge")
+PRODUCER_WORDS = ("Chateau", "Domaine", "Tenuta", "Bodega", "Quinta", "Weingut", "Estate", "Cellars", "Vineyards")
+WINE_WORDS = ("Reserve", "Grand Cru", "Classico", "Riserva", "Old Vines", "Single Vineyard", "Cuvee", "Estate",
+              "Selection", "Crianza")
+SYLLABLES = ("bel", "mon", "ta", "ri", "vo", "san", "lu", "ca", "dor", "ve", "ro", "mar", "li", "sel", "na",
+             "gar", "do", "pe", "ral", "to")
+
+
+def _zipf_weights(count, exponent=1.1):
+    """
+    Cumulative weights of a Zipf distribution, the first items are chosen the most
+    :param count: int number of items
+    :param exponent: float skew, larger is more skewed
+    :return: list of floats for random.choices
+    """
+    return list(accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+
+
+def _word(rng):
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def _insert(model, rows):
+    """
+    Insert the rows of given model whose names do not exist yet in one statement,
+    the rows of existing names, e.g. of the sample data or an earlier run, are reused
+    :param model: model class with unique name column
+    :param rows: list of dicts of column values
+    :return: list of the ids of the rows in the same order
+    """
+    table = model.__table__
+    name = table.c.type if model is Wine_type else table.c.name
+    ids = dict(db.session.execute(select(name, table.c.id)).all())
+    missing = [row for row in rows if row[name.key] not in ids]
+    if missing:
+        last_id = db.session.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
+        db.session.execute(insert(table), missing)
+        ids.update(db.session.execute(select(name, table.c.id).where(table.c.id > last_id)).all())
+    return [ids[row[name.key]] for row in rows]
+
+
+@contextmanager
+def _rebuilt_indexes(table):
+    """
+    Drop the indexes of a table for the block and create them again after it. Building
+    an index of all rows at once is several times faster than adding the rows one at
+    a time to it. The block must run in a transaction, so that the indexes are not
+    missing when it fails.
+    :param table: Table
+    """
+    connection = db.session.connection()
+    for index in table.indexes:
+        index.drop(connection)
+    try:
+        yield
+    finally:
+        for index in table.indexes:
+            index.create(connection)
+
+
+def generate_catalog(wines: int, seed: int = 0) -> dict:
+    """
+    Insert a generated catalog with given number of wines. The countries, regions,
+    producers, grapes and wine types are inserted in one transaction and the wines
+    in another. Existing rows of the same names are reused, and the wines are numbered
+    after the existing ones, so the catalog can be added to a populated database.
+    :param wines: int number of wines
+    :param seed: int seed, the same seed generates the same catalog
+    :return: dict of table name and number of rows in the catalog, reused rows included
+    """
+    rng = random.Random(seed)
+
+    with unit_of_work():
+        countries = _insert(Country, [{"name": name} for name in COUNTRIES])
+        country_weights = _zipf_weights(len(countries))
+
+        region_count = max(len(countries), wines // 500)
+        regions = _insert(Region, [{
+            "name": "{} {} {}".format(_word(rng), rng.choice(REGION_WORDS), i),
+            "country_id": country,
+        } for i, country in enumerate(rng.choices(countries, cum_weights=country_weights, k=region_count))])
+        region_weights = _zipf_weights(len(regions), 0.8)
+
+        grape_names = list(GRAPES) + ["{} {}".format(_word(rng), i) for i in range(max(0, wines // 1000 - len(GRAPES)))]
+        grape_rows = [{
+            "name": name, "region_id": region,
+            "description": "{} is a grape variety grown in {} regions.".format(name, rng.randint(1, 40)),
+        } for name, region in zip(grape_names, rng.choices(regions, cum_weights=region_weights, k=len(grape_names)))]
+        producer_rows = [{
+            "name": "{} {} {}".format(rng.choice(PRODUCER_WORDS), _word(rng), i), "region_id": region,
+            "description": "Family producer since {}.".format(rng.randint(1700, 2015)),
+        } for i, region in enumerate(rng.choices(regions, cum_weights=region_weights, k=max(10, wines // 20)))]
+        with deferred_index(Grape.__tablename__, Producer.__tablename__):
+            grapes = _insert(Grape, grape_rows)
+            producers = _insert(Producer, producer_rows)
+        grape_weights = _zipf_weights(len(grapes), 1.0)
+        producer_weights = _zipf_weights(len(producers), 0.6)
+
+        wine_types = _insert(Wine_type, [{"type": name} for name, _ in WINE_TYPES])
+        type_weights = list(accumulate(share for _, share in WINE_TYPES))
+        mark_changed(db.session, Country.__tablename__, Region.__tablename__, Grape.__tablename__,
+                     Producer.__tablename__, Wine_type.__tablename__)
+
+    # the values are chosen a column at a time from pools, which is many times
+    # faster than calling random for every value of every row
+    words = [_word(rng) for _ in range(1000)]
+    descriptions = ["{} with notes of {} and {}.".format(rng.choice(STYLES), _word(rng).lower(), _word(rng).lower())
+                    for _ in range(1000)]
+    years = range(1960, 2024)
+    year_weights = list(accumulate(year - 1950 if year <= 2018 else (2024 - year) * 13 for year in years))
+    alcohol = [value / 10 for value in range(95, 166)]
+    alcohol_weights = list(accumulate(1 / (1 + (value - 13) ** 2) for value in alcohol))
+
+    # the wines are inserted in one transaction, which the version bump begins so that
+    # the indexes are dropped and created again in it also on SQLite
+    with unit_of_work():
+        mark_changed(db.session, Wine.__tablename__)
+        # the names end with a number after the ids of existing wines, so they are unique
+        offset = db.session.execute(select(func.coalesce(func.max(Wine.id), 0))).scalar()
+        with deferred_index(Wine.__tablename__), _rebuilt_indexes(Wine.__table__):
+            for start in range(offset, offset + wines, WINE_BATCH_SIZE):
+                count = min(WINE_BATCH_SIZE, offset + wines - start)
+                columns = zip(range(start, start + count), rng.choices(WINE_WORDS, k=count),
+                              rng.choices(words, k=count), rng.choices(STYLES, k=count),
+                              rng.choices(years, cum_weights=year_weights, k=count),
+                              rng.choices(alcohol, cum_weights=alcohol_weights, k=count),
+                              rng.choices((750, 375, 1500), cum_weights=(85, 95, 100), k=count),
+                              rng.choices(descriptions, k=count),
+                              rng.choices(producers, cum_weights=producer_weights, k=count),
+                              rng.choices(grapes, cum_weights=grape_weights, k=count),
+                              rng.choices(wine_types, cum_weights=type_weights, k=count))
+                Wine.insert_rows([{
+                    "name": "{} {} {}".format(prefix, word, i), "style": style, "year_produced": year,
+                    "alcohol_percentage": abv, "volume": volume, "picture": None, "description": description,
+                    "producer_id": producer, "grape_id": grape, "wine_type_id": wine_type,
+                } for i, prefix, word, style, year, abv, volume, description, producer, grape, wine_type in columns])
+
+    return {Country.__tablename__: len(countries), Region.__tablename__: len(regions),
+            Grape.__tablename__: len(grapes), Producer.__tablename__: len(producers),
+            Wine_type.__tablename__: len(wine_types), Wine.__tablename__: wines}
@@ -2,67 +2,74 @@
 This module is a lib class to provide some helper class for image handling.
 """
 import logging
-import os
 import re
-import requests
-
+from tempfile import SpooledTemporaryFile
 from typing import Union
+
+from flask import Request, current_app
 from werkzeug.datastructures import FileStorage
 from werkzeug.utils import secure_filename
 
+from src.libs import codec
 from src.libs.aws import AwsBucket
 from src.utils.constants import ALLOWED_EXTENSIONS
 
 s3 = AwsBucket()
 
+allowed_format = "|".join(ALLOWED_EXTENSIONS)
+file_key_regex = re.compile(rf"^[a-zA-Z0-9][a-zA-Z0-9_()-\.]*\.({allowed_format})$")
+
 
 def check_file_and_proper_naming(file: Union[str, FileStorage]) -> bool:
     """
     Check if a filename match the given regex and is in allowed format
     """
     filename = secure_filename(file.filename)
+    return is_file_key(filename)
 
-    allowed_format = "|".join(ALLOWED_EXTENSIONS)
-    regex = f"^[a-zA-Z0-9][a-zA-Z0-9_()-\.]*\.({allowed_format})$"
-    return re.match(regex, filename) is not None
+
+def is_file_key(value: str) -> bool:
+    """
+    Check if a stored picture value is a S3 Bucket key of an uploaded image
+    instead of an external url or free text
+    :param value: string picture value
+    :return: True or false, depending on if the value is a key
+    """
+    return file_key_regex.match(value) is not None
 
 
 def upload_file(file: Union[str, FileStorage]):
     """
-    Helper method to upload the file to S3 bucket using
-    AWSBucket create_presigned_post method
+    Helper method to upload the file to S3 bucket by streaming
+    it with AWSBucket upload_fileobj method
     :param file: file to be posted
-    :return: file url
+    :return: file key in the bucket or None if the upload failed
     """
-    key = file.filename
+    key = secure_filename(file.filename)
 
-    # check if file doesn't exist and create temp file under static folder
-    if not os.path.exists('static/' + key):
-        file.save('static/' + key)
+    if s3.upload_fileobj(key, file.stream, file.mimetype):
+        logging.info('File successfully uploaded to S3')
+        return key
+    return None
 
-    if s3.check_if_file_exists(key):
-        # remove temp file since the image exists already
-        os.remove('static/' + key)
-        logging.info('File already exists, returning url')
-        return get_file_url(key)
-    else:
-        response = s3.create_presigned_post(file_name=key)
-        if response is None:
-            return {"[ERROR]": "Response was empty, try again"}, 400
 
-        files = [('file', open('static/' + key, 'rb'))]
+class SpooledRequest(Request):
+    """
+    Request class which spools uploaded files larger than UPLOAD_SPOOL_SIZE to a temporary
+    file, which the upload streams to the bucket, smaller ones are kept in memory.
+    Multipart bodies, the picture uploads, are limited to UPLOAD_MAX_SIZE, other bodies
+    such as bulk imports are not limited. JSON bodies are decoded with the codec of the api.
+    """
+    json_module = codec
 
-        upload_response = requests.post(response['url'], data=response['fields'], files=files)
+    @property
+    def max_content_length(self):
+        if self.mimetype == "multipart/form-data":
+            return current_app.config["UPLOAD_MAX_SIZE"]
+        return None
 
-        if upload_response.status_code == 204:
-            # remove temp file
-            os.remove('static/' + key)
-            logging.info('File successfully uploaded to S3')
-            return get_file_url(key)
-        elif upload_response.status_code == 500:
-            return {"[ERROR]": "Unexpected error occurred"}, 500
-        else:
-            return {"[ERROR]": "Request was unsuccessful"}, 400
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return SpooledTemporaryFile(max_size=current_app.config["UPLOAD_SPOOL_SIZE"])
 
 
 def get_file_url(filename: str):
@@ -74,9 +81,19 @@ def get_file_url(filename: str):
     return s3.get_file_url(file_name=filename)
 
 
+def sign_file_url(filename: str):
+    """
+    Helper method to sign a file url for S3 Bucket without memoizing it
+    :param filename: string name of the file
+    :return: File url
+    """
+    return s3.sign_file_url(file_name=filename)
+
+
 def get_all_file_urls():
     """
-    Helper method to get all file urls for S3 Bucket
-    :return: List of file urls
+    Helper method to get all file urls for S3 Bucket. The urls are
+    streamed while the bucket is listed, a failing listing raises ClientError.
+    :return: iterator of file urls
     """
-    return s3.get_file_urls()
+    return s3.iter_file_urls()
@@ -0,0 +1,153 @@
+"""
+This module is a lib class to provide the Prometheus metrics of the api. With gunicorn the
+metrics of every worker are written to the PROMETHEUS_MULTIPROC_DIR directory, which is set
+in gunicorn.conf.py, and the metrics endpoint adds them up so one scrape covers all workers.
+Without the directory the metrics of the process are exposed as they are.
+"""
+import os
+import time
+
+from flask import Response, current_app, g, has_request_context, request
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, \
+    Histogram, generate_latest, multiprocess
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+REQUESTS = Counter("http_requests_total", "Handled requests", ["method", "route", "status"])
+ERRORS = Counter("http_request_errors_total", "Requests answered with a server error", ["method", "route"])
+LATENCY = Histogram("http_request_duration_seconds", "Request latency", ["method", "route"])
+DB_QUERIES = Counter("db_queries_total", "Executed SQL statements", ["route"])
+DB_LATENCY = Histogram("db_query_duration_seconds", "SQL statement latency",
+                       buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1))
+# gauges of live workers are added up, the files of exited workers are removed in child_exit
+POOL_CHECKED_OUT = Gauge("db_pool_connections_checked_out", "Connections in use",
+                         multiprocess_mode="livesum")
+POOL_CONNECTIONS = Gauge("db_pool_connections", "Open pooled connections", multiprocess_mode="livesum")
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups, the hit ratio is hits over all lookups",
+                        ["cache", "result"])
+S3_LATENCY = Histogram("s3_call_duration_seconds", "S3 call latency", ["operation"])
+
+
+def init_app(app):
+    """
+    Register the request hooks, the metrics endpoint and the S3 client events
+    :param app: Flask app
+    """
+    # imported here since the helpers read the config, which imports the schemas
+    from src.libs.helpers import s3
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown_request)
+    app.add_url_rule("/metrics", "metrics", metrics_view)
+    s3.s3.meta.events.register("before-call.s3", _before_s3_call)
+    s3.s3.meta.events.register("after-call.s3", _after_s3_call)
+    s3.s3.meta.events.register("after-call-error.s3", _after_s3_call)
+
+
+def metrics_view():
+    """
+    Metrics in the Prometheus text format, added up over the workers in multiprocess mode
+    :return: Response
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def current_route():
+    """
+    Route rule of the current request, such as /api/wines/<string:name>
+    :return: string rule, or none outside of a request and unmatched for unknown urls
+    """
+    if not has_request_context():
+        return "none"
+    return request.url_rule.rule if request.url_rule is not None else "unmatched"
+
+
+def _start_request():
+    g.metrics_start = time.perf_counter() if current_app.config["METRICS_ENABLED"] else None
+
+
+def _finish_request(response):
+    _record(response.status_code)
+    return response
+
+
+def _teardown_request(exception):
+    # the after request hooks are skipped when an exception is not handled
+    _record(500)
+
+
+def _record(status):
+    start = g.get("metrics_start")
+    if start is None or request.endpoint == "metrics":
+        return
+    g.metrics_start = None
+    route = current_route()
+    REQUESTS.labels(request.method, route, status).inc()
+    if status >= 500:
+        ERRORS.labels(request.method, route).inc()
+    LATENCY.labels(request.method, route).observe(time.perf_counter() - start)
+
+
+def _enabled():
+    return has_request_context() and g.get("metrics_start") is not None
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _enabled():
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("metrics_start")
+    if not starts:
+        return
+    start = starts.pop()
+    if _enabled():
+        DB_QUERIES.labels(current_route()).inc()
+        DB_LATENCY.observe(time.perf_counter() - start)
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    starts = conn.info.get("metrics_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+@event.listens_for(Pool, "connect")
+def _pool_connect(dbapi_connection, connection_record):
+    POOL_CONNECTIONS.inc()
+
+
+@event.listens_for(Pool, "close")
+def _pool_close(dbapi_connection, connection_record):
+    POOL_CONNECTIONS.dec()
+
+
+@event.listens_for(Pool, "checkout")
+def _pool_checkout(dbapi_connection, connection_record, connection_proxy):
+    POOL_CHECKED_OUT.inc()
+
+
+@event.listens_for(Pool, "checkin")
+def _pool_checkin(dbapi_connection, connection_record):
+    POOL_CHECKED_OUT.dec()
+
+
+def _before_s3_call(context, **kwargs):
+    context["metrics_start"] = time.perf_counter()
+
+
+def _after_s3_call(context, model, **kwargs):
+    if "metrics_start" in context:
+        S3_LATENCY.labels(model.name).observe(time.perf_counter() - context.pop("metrics_start"))
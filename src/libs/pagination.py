@@ -0,0 +1,93 @@
+"""
+This module is a lib class to provide keyset pagination for the collection resources.
+"""
+import base64
+import binascii
+import json
+from urllib.parse import urlencode
+
+from flask import current_app, request
+
+from src.utils.constants import INVALID_CURSOR, INVALID_LIMIT
+
+
+def encode_cursor(last_id: int, *value) -> str:
+    """
+    Encode the id of the last item on the page to an opaque cursor. Pages which
+    are not ordered by id also carry the sort value of the last item.
+    :param last_id: int id of the last item
+    :param value: optional sort value of the last item
+    :return: url safe cursor string
+    """
+    content = {"id": last_id}
+    if value:
+        content["value"] = value[0]
+    payload = json.dumps(content, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, with_value=False):
+    """
+    Decode the opaque cursor back to the id of the last item on the previous page
+    :param cursor: url safe cursor string
+    :param with_value: whether the cursor carries the sort value of the last item
+    :return: int id of the last item, or tuple of sort value and id with_value
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        content = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        last_id = content["id"]
+        value = content["value"] if with_value else None
+    except (binascii.Error, ValueError, TypeError, KeyError):
+        raise ValueError(INVALID_CURSOR)
+
+    if not isinstance(last_id, int) or isinstance(value, (dict, list)):
+        raise ValueError(INVALID_CURSOR)
+    return (value, last_id) if with_value else last_id
+
+
+def page_args(with_value=False):
+    """
+    Read the limit and cursor query parameters of the current request
+    :param with_value: whether the cursor carries the sort value of the last item
+    :return: tuple of page size and id after which the page starts,
+        or tuple of page size and tuple of sort value and id with_value
+    """
+    default_limit = current_app.config.get("PAGE_SIZE_DEFAULT", 100)
+    max_limit = current_app.config.get("PAGE_SIZE_MAX", 1000)
+
+    try:
+        limit = int(request.args.get("limit", default_limit))
+    except ValueError:
+        raise ValueError(INVALID_LIMIT.format(max_limit))
+    if not 1 <= limit <= max_limit:
+        raise ValueError(INVALID_LIMIT.format(max_limit))
+
+    cursor = request.args.get("cursor")
+    after = decode_cursor(cursor, with_value) if cursor else None
+    return limit, after
+
+
+def paginate(key: str, items: list, limit: int, dump, sort_key=None):
+    """
+    Build the response for one page of items. Items should be fetched
+    with limit + 1 rows, the extra row only tells that a next page exists.
+    :param key: string key of the item list in response body
+    :param items: list of model objects ordered by sort key and id
+    :param limit: int page size
+    :param dump: function to serialize the list of items
+    :param sort_key: name of the attribute the items are ordered by before id, if any
+    :return: response body, status code and headers
+    """
+    body = {key: dump(items[:limit])}
+    headers = {}
+
+    if len(items) > limit:
+        last = items[limit - 1]
+        cursor = encode_cursor(last.id, getattr(last, sort_key)) if sort_key else encode_cursor(last.id)
+        args = request.args.to_dict()
+        args.update(limit=limit, cursor=cursor)
+        body["next"] = cursor
+        headers["Link"] = '<{}?{}>; rel="next"'.format(request.base_url, urlencode(args))
+
+    return body, 200, headers
@@ -0,0 +1,114 @@
+"""
+This module is a lib class to provide password hashing in a bounded pool of processes,
+so that a burst of logins does not hold the request workers on CPU. Hashes waiting for
+the pool are limited, and a hash over the limit is refused with HashingBusy, which the
+resources answer with 429 Too Many Requests.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+from src.libs.timing import timed
+
+
+class HashingBusy(Exception):
+    """
+    Raised when the pool has as many hashes pending as it accepts
+    """
+
+
+class PasswordHasher:
+    """
+    Hashes and checks passwords in a process pool created on first use in every process,
+    so that gunicorn workers forked from a preloaded app get their own pool. Without
+    workers the passwords are hashed in the calling thread.
+    """
+    def __init__(self, method="pbkdf2:sha256", iterations=DEFAULT_PBKDF2_ITERATIONS, workers=2, max_pending=8):
+        self.method = method
+        self.iterations = iterations
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Read the hashing settings from app config
+        :param app: Flask app
+        """
+        self.method = app.config.get("PASSWORD_HASH_METHOD", self.method)
+        self.iterations = app.config.get("PASSWORD_HASH_ITERATIONS", self.iterations)
+        self.workers = app.config.get("PASSWORD_HASH_WORKERS", self.workers)
+        self.max_pending = app.config.get("PASSWORD_HASH_MAX_PENDING", self.max_pending)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+        self.shutdown()
+
+    @property
+    def full_method(self):
+        """
+        Method with its cost as stored in front of the hashes, e.g. pbkdf2:sha256:260000
+        :return: string
+        """
+        if self.method.startswith("pbkdf2:"):
+            return "{}:{}".format(self.method, self.iterations)
+        return self.method
+
+    def hash(self, password):
+        """
+        Hash a password with the configured method and cost
+        :param password: string
+        :return: string hash
+        """
+        return self._run(generate_password_hash, password, self.full_method)
+
+    def check(self, pwhash, password):
+        """
+        Check a password against its hash
+        :param pwhash: string hash
+        :param password: string
+        :return: bool
+        """
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """
+        Whether a hash was made with another method or cost than the configured ones
+        :param pwhash: string hash
+        :return: bool
+        """
+        return pwhash.split("$", 1)[0] != self.full_method
+
+    def shutdown(self):
+        """
+        Stop the pool of this process, a new one is created on next use
+        """
+        with self._lock:
+            if self._pool is not None and self._pid == os.getpid():
+                self._pool.shutdown()
+            self._pool = None
+
+    def _executor(self):
+        with self._lock:
+            # a pool inherited from the parent process is not usable after fork
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._pool
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HashingBusy()
+        try:
+            with timed("hash"):
+                if not self.workers:
+                    return function(*args)
+                return self._executor().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,122 @@
+"""
+This module is a lib class to provide an in-process cache of the primary keys of the
+reference tables by name, so that the write paths link wines, grapes, producers and
+regions to existing rows without a query for each of them. The names are cached when
+they are first looked up, and a commit that changes a table evicts all its names,
+see src.libs.changes for the tracking of changed tables. Every name also keeps the change
+version of its table, and is not used once it differs from the one in the database, so
+the ids deleted or reused by other workers are not used either.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, has_app_context
+
+from src.database import db
+from src.libs.metrics import CACHE_LOOKUPS
+from src.models.table_version import TableVersion
+
+# name column of the tables which are not looked up by name
+NAME_COLUMNS = {"wine_type": "type"}
+
+
+class ReferenceCache:
+    """
+    Bounded cache of primary keys by table and name with time to live. The writes of
+    other processes, which are not seen by the eviction, are detected by the table
+    versions, which are read once per request for all cached tables. Missing names
+    are not cached.
+    """
+    def __init__(self, max_entries=10000, ttl=60):
+        self.enabled = True
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._ids = defaultdict(dict)
+        self._generations = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        """
+        Read the cache settings from app config
+        :param app: Flask app
+        """
+        self.enabled = app.config.get("REFERENCE_CACHE_ENABLED", True)
+        self.max_entries = app.config.get("REFERENCE_CACHE_MAX_ENTRIES", self.max_entries)
+        self.ttl = app.config.get("REFERENCE_CACHE_TTL", self.ttl)
+        app.before_request(_reset_versions)
+
+    def find_id(self, model, name):
+        """
+        Find the primary key of the row of given model by name, from the cache or from
+        the database. Tables changed in the ongoing transaction are read from the database.
+        :param model: model class of a reference table
+        :param name: string name, or type of a wine type
+        :return: int id or None when not found
+        """
+        table = model.__table__
+        if not self.enabled or table.name in db.session.info.get("changed_tables", ()):
+            return self._select(table, name)
+
+        version = self._version(table.name)
+        with self._lock:
+            entry = self._ids[table.name].get(name)
+            generation = self._generations[table.name]
+        if entry is not None and entry[0] >= time.monotonic() and entry[1] == version:
+            CACHE_LOOKUPS.labels("reference", "hit").inc()
+            return entry[2]
+
+        CACHE_LOOKUPS.labels("reference", "miss").inc()
+        id_ = self._select(table, name)
+        if id_ is not None:
+            with self._lock:
+                # not stored when the table changed while it was read
+                if generation == self._generations[table.name]:
+                    ids = self._ids[table.name]
+                    if len(ids) >= self.max_entries:
+                        ids.clear()
+                    ids[name] = (time.monotonic() + self.ttl, version, id_)
+        return id_
+
+    def invalidate(self, tables):
+        """
+        Evict the names of given tables
+        :param tables: iterable of table names
+        """
+        with self._lock:
+            for table in tables:
+                self._generations[table] += 1
+                self._ids.pop(table, None)
+        _reset_versions()
+
+    def clear(self):
+        """
+        Evict all names
+        """
+        with self._lock:
+            self._ids.clear()
+
+    def _version(self, table):
+        # the versions of all cached tables are read with the first lookup of a request
+        versions = g.get("reference_versions") if has_app_context() else None
+        if versions is None or table not in versions:
+            with self._lock:
+                tables = set(self._ids) | {table}
+            versions = TableVersion.find_versions(tables)
+            versions = {name: versions.get(name, 0) for name in tables}
+            if has_app_context():
+                g.reference_versions = versions
+        return versions[table]
+
+    @staticmethod
+    def _select(table, name):
+        column = table.c[NAME_COLUMNS.get(table.name, "name")]
+        return db.session.execute(db.select(table.c.id).where(column == name)).scalar()
+
+
+def _reset_versions():
+    if has_app_context():
+        g.pop("reference_versions", None)
+
+
+reference_cache = ReferenceCache()
@@ -0,0 +1,215 @@
+"""
+This module is a lib class to provide the full-text search over wines, producers and grapes.
+On SQLite the documents are kept in a FTS5 table which triggers on the searched tables keep
+in sync, so every write is indexed, also bulk inserts which bypass the ORM. On Postgres
+the searched tables have GIN indexes over their tsvector expressions instead.
+"""
+import re
+from contextlib import contextmanager
+
+from sqlalchemy import event, text
+
+from src.database import db
+
+SEARCH_TABLE = "search_index"
+
+# searched table, kind in the results, document id offset and the searched columns,
+# the first column is the name. Document ids are row id * 4 + offset to keep them unique.
+SEARCH_SOURCES = (
+    ("wine", "wine", 1, ("name", "description", "style")),
+    ("producer", "producer", 2, ("name", "description")),
+    ("grape", "grape", 3, ("name", "description")),
+)
+
+# Postgres indexes of the searched tsvector expressions
+SEARCH_INDEXES = {"ix_{}_search".format(table) for table, *_ in SEARCH_SOURCES}
+
+search_term_regex = re.compile(r"\w+")
+
+
+def search_terms(query: str):
+    """
+    Split a free text search query to words, which are matched
+    all together. Query syntax of the database is not supported.
+    :param query: string search query
+    :return: list of strings
+    """
+    return search_term_regex.findall(query)
+
+
+def search(terms, limit, after=None):
+    """
+    Find wines, producers and grapes matching all search terms, best matches first
+    :param terms: list of search words
+    :param limit: int maximum number of results
+    :param after: tuple of score and id of the last result on the previous page
+    :return: list of rows with kind, name, score and id
+    """
+    if db.engine.dialect.name == "postgresql":
+        statement, params = _postgres_search(terms)
+    else:
+        statement, params = _sqlite_search(terms)
+
+    params.update(limit=limit, after_score=None, after_id=None)
+    if after is not None:
+        params.update(after_score=after[0], after_id=after[1])
+    return db.session.execute(text(statement), params).all()
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    """
+    Keep the search index out of migration autogenerate, it is created
+    with SQL which depends on the database
+    """
+    if type_ == "table":
+        return not name.startswith(SEARCH_TABLE)
+    if type_ == "index":
+        return name not in SEARCH_INDEXES
+    return True
+
+
+def _document(columns, prefix):
+    return " || ' ' || ".join("coalesce({}{}, '')".format(prefix, column) for column in columns[1:])
+
+
+def _sqlite_search(terms):
+    # every term is quoted as a phrase so that the terms are not read as FTS5 syntax
+    statement = """
+        SELECT id, kind, name, score FROM (
+            SELECT rowid AS id, kind, name, bm25({table}, 10.0, 1.0) AS score
+            FROM {table} WHERE {table} MATCH :query
+        )
+        WHERE :after_score IS NULL OR score > :after_score OR (score = :after_score AND id > :after_id)
+        ORDER BY score, id
+        LIMIT :limit
+    """.format(table=SEARCH_TABLE)
+    return statement, {"query": " ".join('"{}"'.format(term) for term in terms)}
+
+
+def _postgres_vector(columns):
+    return "to_tsvector('english', coalesce({}, '') || ' ' || {})".format(columns[0], _document(columns, ""))
+
+
+def _postgres_search(terms):
+    # the vectors repeat the indexed expressions so that the GIN indexes are used
+    selects = " UNION ALL ".join("""
+        SELECT id * 4 + {offset} AS id, '{kind}' AS kind, name,
+               -ts_rank({vector}, query) AS score
+        FROM {table}, plainto_tsquery('english', :query) AS query
+        WHERE {vector} @@ query
+    """.format(table=table, kind=kind, offset=offset, vector=_postgres_vector(columns))
+        for table, kind, offset, columns in SEARCH_SOURCES)
+    statement = """
+        SELECT id, kind, name, score FROM ({selects}) AS results
+        WHERE CAST(:after_score AS float) IS NULL OR score > :after_score
+              OR (score = :after_score AND id > :after_id)
+        ORDER BY score, id
+        LIMIT :limit
+    """.format(selects=selects)
+    return statement, {"query": " ".join(terms)}
+
+
+def sqlite_index_statements():
+    """
+    Statements to create the FTS5 table and the triggers which keep it in sync
+    :return: list of SQL strings
+    """
+    statements = ["CREATE VIRTUAL TABLE IF NOT EXISTS {} USING fts5("
+                  "name, body, kind UNINDEXED, tokenize = 'porter unicode61')".format(SEARCH_TABLE)]
+    for source in SEARCH_SOURCES:
+        table, _, offset, columns = source
+        delete = "DELETE FROM {search} WHERE rowid = old.id * 4 + {offset};".format(search=SEARCH_TABLE,
+                                                                                   offset=offset)
+        statements += [
+            _sqlite_insert_trigger(source),
+            "CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF {columns} ON {table} "
+            "BEGIN {delete} {insert} END".format(table=table, columns=", ".join(columns),
+                                                 delete=delete, insert=_sqlite_insert(source)),
+            "CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} "
+            "BEGIN {delete} END".format(table=table, delete=delete),
+            _sqlite_index_rows(source),
+        ]
+    return statements
+
+
+def _sqlite_insert(source):
+    table, kind, offset, columns = source
+    return "INSERT INTO {search}(rowid, name, body, kind) VALUES (new.id * 4 + {offset}, " \
+           "new.{name}, {body}, '{kind}');".format(search=SEARCH_TABLE, offset=offset, name=columns[0],
+                                                  body=_document(columns, "new."), kind=kind)
+
+
+def _sqlite_insert_trigger(source):
+    return "CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} " \
+           "BEGIN {insert} END".format(table=source[0], insert=_sqlite_insert(source))
+
+
+def _sqlite_index_rows(source, where=""):
+    table, kind, offset, columns = source
+    return "INSERT INTO {search}(rowid, name, body, kind) SELECT id * 4 + {offset}, {name}, {body}, " \
+           "'{kind}' FROM {table} {where}".format(search=SEARCH_TABLE, offset=offset, name=columns[0],
+                                                 body=_document(columns, ""), kind=kind, table=table,
+                                                 where=where)
+
+
+@contextmanager
+def deferred_index(*tables):
+    """
+    Index the rows inserted to given tables in the block with one statement after
+    the block, instead of with the insert trigger for every row, which is several
+    times faster for large bulk inserts. The block must not update or delete rows
+    of the tables. The trigger is dropped and created again in the transaction of
+    the block, which is committed after it. Only SQLite has the triggers, on other
+    databases the block is run as it is.
+    :param tables: names of the searched tables
+    """
+    if db.engine.dialect.name != "sqlite":
+        yield
+        return
+
+    sources = [source for source in SEARCH_SOURCES if source[0] in tables]
+    last_ids = {}
+    for table, *_ in sources:
+        last_ids[table] = db.session.execute(text("SELECT coalesce(max(id), 0) FROM {}".format(table))).scalar()
+        db.session.execute(text("DROP TRIGGER IF EXISTS {}_search_insert".format(table)))
+    try:
+        yield
+        for source in sources:
+            db.session.execute(text(_sqlite_index_rows(source, "WHERE id > :last_id")),
+                               {"last_id": last_ids[source[0]]})
+    finally:
+        # also when the block fails, so that the triggers are never left missing
+        for source in sources:
+            db.session.execute(text(_sqlite_insert_trigger(source)))
+
+
+def postgres_index_statements():
+    """
+    Statements to create the GIN indexes of the searched tsvector expressions
+    :return: list of SQL strings
+    """
+    return ["CREATE INDEX IF NOT EXISTS ix_{table}_search ON {table} USING gin ({vector})".format(
+        table=table, vector=_postgres_vector(columns)) for table, _, _, columns in SEARCH_SOURCES]
+
+
+@event.listens_for(db.Model.metadata, "after_create")
+def _create_search_index(target, connection, **kwargs):
+    if connection.dialect.name == "sqlite":
+        # the index is filled from the tables when it is created, not again
+        # when create_all is run for a database which already has it
+        if connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = :name"),
+                              {"name": SEARCH_TABLE}).first():
+            return
+        statements = sqlite_index_statements()
+    elif connection.dialect.name == "postgresql":
+        statements = postgres_index_statements()
+    else:
+        return
+    for statement in statements:
+        connection.execute(text(statement))
+
+
+@event.listens_for(db.Model.metadata, "after_drop")
+def _drop_search_index(target, connection, **kwargs):
+    if connection.dialect.name == "sqlite":
+        connection.execute(text("DROP TABLE IF EXISTS {}".format(SEARCH_TABLE)))
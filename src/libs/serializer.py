@@ -0,0 +1,100 @@
+"""
+This module is a lib class to provide compiled dump functions for the schemas.
+The dump function of a schema is generated once from its dump fields, so dumping
+an object reads its attributes directly instead of going through the per field
+machinery of schema.dump. The output is the same as schema.dump gives.
+"""
+from functools import lru_cache, wraps
+
+from marshmallow import missing
+from marshmallow.decorators import POST_DUMP, PRE_DUMP
+from marshmallow.fields import Float, Integer, List, Nested, String
+
+from src.libs.fields import projection
+from src.libs.timing import timed
+
+# field classes dumped inline, the value is converted like the field does
+CONVERSIONS = {Integer: "int", Float: "float", String: "str"}
+
+
+@lru_cache(maxsize=256)
+def dumper(schema_class, fields=None, many=False):
+    """
+    Compiled dump function of a projection, cached like the projection schemas
+    :param schema_class: schema class of the representation
+    :param fields: tuple of field names from fields_arg, or None for all fields
+    :param many: whether the function dumps a list
+    :return: dump function, timed as serialization of the request
+    """
+    dump = compile_dump(projection(schema_class, fields, many))
+
+    @wraps(dump)
+    def timed_dump(obj):
+        with timed("serialize"):
+            return dump(obj)
+    return timed_dump
+
+
+def compile_dump(schema, _compiling=frozenset()):
+    """
+    Generate the dump function of a schema instance, honouring its only, exclude
+    and many. Integer, float, string and nested fields are dumped inline, other
+    fields are dumped by the field itself. Schemas with dump hooks and recursive
+    schemas are dumped by marshmallow.
+    :param schema: schema instance
+    :return: function of an object, or a list of objects when many, to the dump
+    """
+    key = (type(schema), frozenset(schema.dump_fields))
+    if key in _compiling or schema._has_processors(PRE_DUMP) or schema._has_processors(POST_DUMP):
+        return schema.dump
+
+    namespace = {"missing": missing}
+    lines = []
+    items = []
+    optional = []
+    for number, (name, field) in enumerate(schema.dump_fields.items()):
+        data_key = field.data_key if field.data_key is not None else name
+        attribute = field.attribute or name
+        value = "v{}".format(number)
+        inline = _inline(field, value, number, namespace, _compiling | {key})
+        if inline is None or not attribute.isidentifier():
+            namespace["f{}".format(number)] = field
+            lines.append("{} = f{}.serialize({!r}, obj)".format(value, number, name))
+            optional.append(data_key)
+            items.append("{!r}: {}".format(data_key, value))
+            continue
+        lines.append("{} = obj.{}".format(value, attribute))
+        items.append("{!r}: None if {} is None else {}".format(data_key, value, inline))
+
+    lines.append("result = {{{}}}".format(", ".join(items)))
+    # fields which may not give a value, marshmallow leaves them out
+    for data_key in optional:
+        lines.append("if result[{0!r}] is missing: del result[{0!r}]".format(data_key))
+    lines.append("return result")
+
+    source = "def dump(obj):\n" + "".join("    {}\n".format(line) for line in lines)
+    exec(compile(source, "<dump {}>".format(type(schema).__name__), "exec"), namespace)  # pylint: disable=exec-used
+    dump = namespace["dump"]
+    if schema.many:
+        return lambda objs: [dump(obj) for obj in objs]
+    return dump
+
+
+def _inline(field, value, number, namespace, compiling):
+    conversion = CONVERSIONS.get(type(field))
+    if conversion is not None:
+        if getattr(field, "as_string", False):
+            return None
+        return "{}({})".format(conversion, value)
+
+    many = False
+    if type(field) is List and type(field.inner) is Nested:
+        field, many = field.inner, True
+    if type(field) is not Nested:
+        return None
+
+    nested = compile_dump(field.schema, compiling)
+    namespace["n{}".format(number)] = nested
+    if many or (field.many and not field.schema.many):
+        return "[None if item is None else n{0}(item) for item in {1}]".format(number, value)
+    return "n{}({})".format(number, value)
@@ -0,0 +1,158 @@
+"""
+This module is a lib class to provide the per request timings of the api. The time spent
+in SQL, serialization, password hashing and S3 calls is added up while a request is handled
+and given in a Server-Timing header and a structured log line. Both are switched on with
+config and are read on every request, the hooks only check a flag when they are off.
+"""
+import json
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# metrics of the Server-Timing header, the query count is given as description
+TIMED_CATEGORIES = ("db", "serialize", "hash", "s3", "compress")
+
+
+class Timings:
+    """
+    Durations and counts of one request by category
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.active = set()
+
+    def add(self, category, duration):
+        """
+        Add one timed call
+        :param category: string category
+        :param duration: float seconds
+        """
+        self.durations[category] += duration
+        self.counts[category] += 1
+
+    def server_timing(self, total):
+        """
+        Server-Timing header value
+        :param total: float seconds of the whole request
+        :return: string
+        """
+        metrics = ["{};dur={:.2f}".format(category, self.durations[category] * 1000)
+                   for category in TIMED_CATEGORIES]
+        metrics.insert(1, 'db-count;desc="{}"'.format(self.counts["db"]))
+        metrics.append("total;dur={:.2f}".format(total * 1000))
+        return ", ".join(metrics)
+
+    def record(self, response, total):
+        """
+        Fields of the log line
+        :param response: Response
+        :param total: float seconds of the whole request
+        :return: dict
+        """
+        record = {"method": request.method, "path": request.path, "status": response.status_code,
+                  "total_ms": round(total * 1000, 2), "db_count": self.counts["db"]}
+        for category in TIMED_CATEGORIES:
+            record["{}_ms".format(category)] = round(self.durations[category] * 1000, 2)
+        return record
+
+
+def current_timings():
+    """
+    Timings of the current request
+    :return: Timings or None when timing is off or outside of a request
+    """
+    return g.get("timings") if has_request_context() else None
+
+
+@contextmanager
+def timed(category):
+    """
+    Context manager which adds the time of its block to the current request.
+    Nested blocks of the same category, such as nested schemas, are counted once.
+    :param category: string one of TIMED_CATEGORIES
+    """
+    timings = current_timings()
+    if timings is None or category in timings.active:
+        yield
+        return
+    timings.active.add(category)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(category, time.perf_counter() - start)
+        timings.active.discard(category)
+
+
+def init_app(app):
+    """
+    Register the request hooks and the S3 client events
+    :param app: Flask app
+    """
+    # imported here since the helpers read the config, which imports the schemas
+    from src.libs.helpers import s3
+
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    s3.s3.meta.events.register("before-call.s3", _before_s3_call)
+    s3.s3.meta.events.register("after-call.s3", _after_s3_call)
+    s3.s3.meta.events.register("after-call-error.s3", _after_s3_call)
+
+
+def _start_request():
+    config = current_app.config
+    g.timings = Timings() if config["TIMING_ENABLED"] or config["TIMING_LOG"] else None
+
+
+def _finish_request(response):
+    timings = current_timings()
+    if timings is None:
+        return response
+    total = time.perf_counter() - timings.start
+    if current_app.config["TIMING_ENABLED"]:
+        response.headers["Server-Timing"] = timings.server_timing(total)
+    if current_app.config["TIMING_LOG"]:
+        logger.info(json.dumps(timings.record(response, total)))
+    return response
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_timings() is not None:
+        conn.info.setdefault("timing_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = current_timings()
+    starts = conn.info.get("timing_start")
+    if timings is not None and starts:
+        timings.add("db", time.perf_counter() - starts.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    conn = exception_context.connection
+    starts = conn.info.get("timing_start") if conn is not None else None
+    if starts:
+        starts.pop()
+
+
+def _before_s3_call(context, **kwargs):
+    if current_timings() is not None:
+        context["timing_start"] = time.perf_counter()
+
+
+def _after_s3_call(context, **kwargs):
+    timings = current_timings()
+    if timings is not None and "timing_start" in context:
+        timings.add("s3", time.perf_counter() - context.pop("timing_start"))
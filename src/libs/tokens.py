@@ -0,0 +1,65 @@
+"""
+This module is a lib class to provide the issuing and rotation of the JWT tokens. Login
+gives an access token and a refresh token, and the refresh token gives new ones without
+the password, so clients do not have to log in again when the access token expires.
+Every refresh token is used once, and using a rotated token again revokes its family.
+"""
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app
+from flask_jwt_extended import create_access_token, create_refresh_token
+
+from src.models.refresh_token import RefreshToken
+
+
+def issue_tokens(username, family=None):
+    """
+    Create an access token and a refresh token for the user, the refresh token is
+    added to the session. Both carry the family, so that logout can revoke it. The expired
+    refresh tokens of the user are deleted when a new family is started.
+    :param username: string identity
+    :param family: string family of a rotated token, or None to start a new family
+    :return: tuple of access token and refresh token
+    """
+    jti = str(uuid.uuid4())
+    if family is None:
+        RefreshToken.delete_by_username(username, expired_only=True)
+        family = jti
+    expires = datetime.now(timezone.utc) + current_app.config["JWT_REFRESH_TOKEN_EXPIRES"]
+    refresh_token = create_refresh_token(identity=username,
+                                         additional_claims={"jti": jti, "exp": expires, "family": family})
+    RefreshToken(jti=jti, family=family, username=username,
+                 expires=expires.replace(tzinfo=None)).add(commit=False)
+    access_token = create_access_token(identity=username, additional_claims={"family": family})
+    return access_token, refresh_token
+
+
+def rotate_tokens(claims):
+    """
+    Revoke the used refresh token and issue new tokens of its family. A token which
+    is already revoked has either been rotated, and is used again by someone who
+    copied it, or revoked by logout, so its whole family is revoked.
+    :param claims: dict of the decoded refresh token
+    :return: tuple of access token and refresh token, or None when the token is revoked
+    """
+    if not RefreshToken.revoke(claims["jti"]):
+        RefreshToken.revoke_family(claims["family"])
+        return None
+    return issue_tokens(claims["sub"], claims["family"])
+
+
+def revoke_family(family):
+    """
+    Revoke the refresh tokens of a family, e.g. on logout
+    :param family: string family from the token claims
+    """
+    RefreshToken.revoke_family(family)
+
+
+def revoke_user(username):
+    """
+    Delete the refresh tokens of a user, e.g. when the user is deleted
+    :param username: string
+    """
+    RefreshToken.delete_by_username(username)
@@ -2,9 +2,17 @@
 Module that provides database model for Country with
 methods to add or modify the data on database
 """
+from itertools import chain
 from typing import List
 
-from src.database import db
+from sqlalchemy.orm import subqueryload
+
+from src.database import commit_session, db
+from src.libs.fields import projection_options
+from src.models.grape import Grape
+from src.models.producer import Producer
+from src.models.region import Region
+from src.models.wine import Wine
 
 
 class Country(db.Model):
@@ -13,7 +21,7 @@ class Country(db.Model):
     database model and methods.
     """
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(64), nullable=False)
+    name = db.Column(db.String(64), nullable=False, unique=True, index=True)
 
     regions = db.relationship("Region", back_populates="country")
 
@@ -29,13 +37,40 @@ class Country(db.Model):
         return doc
             
     @classmethod
-    def find_by_name(cls, name):
+    def load_options(cls, fields=None):
+        """
+        Loader options matching the CountrySchema, regions, their producers,
+        grapes and wines are fetched with one extra query per level, subqueries
+        instead of IN lists of keys so that the count does not grow with the rows.
+        With fields only the requested columns and relations are loaded.
+        :param fields: names of the requested CountrySchema fields, or None for all
+        :return: tuple of loader options
+        """
+        relations = {
+            "regions": (subqueryload(cls.regions).subqueryload(Region.producers)
+                        .subqueryload(Producer.wines).joinedload(Wine.wine_type),
+                        subqueryload(cls.regions).subqueryload(Region.producers)
+                        .subqueryload(Producer.wines).joinedload(Wine.grape),
+                        subqueryload(cls.regions).subqueryload(Region.grapes)
+                        .subqueryload(Grape.wines).joinedload(Wine.wine_type),
+                        subqueryload(cls.regions).subqueryload(Region.grapes)
+                        .subqueryload(Grape.wines).joinedload(Wine.producer)),
+        }
+        if fields is not None:
+            return projection_options(cls, fields, relations)
+        return tuple(chain.from_iterable(relations.values()))
+
+    @classmethod
+    def find_by_name(cls, name, eager=False, fields=None):
         """
         Find the Country from database by given name
         :param name: string
+        :param eager: load the relations needed by the schema
+        :param fields: names of the requested schema fields when eager, or None for all
         :return: Country
         """
-        return cls.query.filter_by(name=name).first()
+        query = cls.query.options(*cls.load_options(fields)) if eager else cls.query
+        return query.filter_by(name=name).first()
 
     @classmethod
     def find_by_id(cls, id_):
@@ -52,18 +87,36 @@ class Country(db.Model):
         Find all Countries from database
         :return: List of Countries
         """
-        return cls.query.all()
+        return cls.query.options(*cls.load_options()).all()
 
-    def add(self):
+    @classmethod
+    def find_page(cls, limit, after_id=None, fields=None) -> List["Country"]:
+        """
+        Find one page of Countries ordered by id, starting after the given id
+        :param limit: int maximum number of rows
+        :param after_id: int id of the last row on the previous page
+        :param fields: names of the requested schema fields, or None for all
+        :return: List of Countries
+        """
+        query = cls.query.options(*cls.load_options(fields)).order_by(cls.id)
+        if after_id is not None:
+            query = query.filter(cls.id > after_id)
+        return query.limit(limit).all()
+
+    def add(self, commit: bool = True):
         """
         Add the Country to database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
         db.session.add(self)
-        db.session.commit()
+        if commit:
+            commit_session()
 
-    def delete(self):
+    def delete(self, commit: bool = True):
         """
         Delete the Country from database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
-        db.session.add(self)
-        db.session.commit()
+        db.session.delete(self)
+        if commit:
+            commit_session()
@@ -2,9 +2,15 @@
 Module that provides database model for Grape with
 methods to add or modify the data on database
 """
-from typing import List
+from itertools import chain
+from typing import Dict, List
 
-from src.database import db
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload, subqueryload
+
+from src.database import commit_session, db
+from src.libs.fields import projection_options
+from src.models.wine import Wine
 
 
 class Grape(db.Model):
@@ -13,8 +19,8 @@ class Grape(db.Model):
     database model and methods.
     """
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(64), nullable=False)
-    region_id = db.Column(db.Integer, db.ForeignKey("region.id"))
+    name = db.Column(db.String(64), nullable=False, unique=True, index=True)
+    region_id = db.Column(db.Integer, db.ForeignKey("region.id"), index=True)
     description = db.Column(db.String(500))
 
     # referenced from
@@ -36,13 +42,34 @@ class Grape(db.Model):
         return doc
         
     @classmethod
-    def find_by_name(cls, name):
+    def load_options(cls, fields=None):
+        """
+        Loader options matching the GrapeSchema, region is joined and
+        wines are fetched with one extra query together with their wine type and producer.
+        With fields only the requested columns and relations are loaded.
+        :param fields: names of the requested GrapeSchema fields, or None for all
+        :return: tuple of loader options
+        """
+        relations = {
+            "region": (joinedload(cls.region),),
+            "wines": (subqueryload(cls.wines).joinedload(Wine.wine_type),
+                      subqueryload(cls.wines).joinedload(Wine.producer)),
+        }
+        if fields is not None:
+            return projection_options(cls, fields, relations)
+        return tuple(chain.from_iterable(relations.values()))
+
+    @classmethod
+    def find_by_name(cls, name, eager=False, fields=None):
         """
         Find the Grape from database by given name
         :param name: string
+        :param eager: load the relations needed by the schema
+        :param fields: names of the requested schema fields when eager, or None for all
         :return: Grape
         """
-        return cls.query.filter_by(name=name).first()
+        query = cls.query.options(*cls.load_options(fields)) if eager else cls.query
+        return query.filter_by(name=name).first()
 
     @classmethod
     def find_by_id(cls, id_):
@@ -59,18 +86,56 @@ class Grape(db.Model):
         Find all Grapes from database
         :return: List of Grapes
         """
-        return cls.query.all()
+        return cls.query.options(*cls.load_options()).all()
+
+    @classmethod
+    def find_page(cls, limit, after_id=None, fields=None) -> List["Grape"]:
+        """
+        Find one page of Grapes ordered by id, starting after the given id
+        :param limit: int maximum number of rows
+        :param after_id: int id of the last row on the previous page
+        :param fields: names of the requested schema fields, or None for all
+        :return: List of Grapes
+        """
+        query = cls.query.options(*cls.load_options(fields)).order_by(cls.id)
+        if after_id is not None:
+            query = query.filter(cls.id > after_id)
+        return query.limit(limit).all()
+
+    @classmethod
+    def find_ids_by_names(cls, names) -> Dict[str, int]:
+        """
+        Find the ids of grapes by given names with one query
+        :param names: iterable of strings
+        :return: dict of name to id
+        """
+        return dict(db.session.query(cls.name, cls.id).filter(cls.name.in_(list(names))))
 
-    def add(self):
+    @classmethod
+    def insert_names(cls, names):
+        """
+        Insert grapes with given names in one statement, used by the
+        bulk import. The session is not committed.
+        :param names: iterable of strings
+        """
+        rows = [{"name": value} for value in names]
+        if rows:
+            db.session.execute(insert(cls.__table__), rows)
+
+    def add(self, commit: bool = True):
         """
         Add the Grape to database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
         db.session.add(self)
-        db.session.commit()
+        if commit:
+            commit_session()
 
-    def delete(self):
+    def delete(self, commit: bool = True):
         """
         Delete the Grape from database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
-        db.session.add(self)
-        db.session.commit()
+        db.session.delete(self)
+        if commit:
+            commit_session()
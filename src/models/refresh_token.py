@@ -0,0 +1,79 @@
+"""
+Module that provides database model for Refresh token with
+methods to rotate and revoke the issued refresh tokens
+"""
+from datetime import datetime
+
+from sqlalchemy import delete, update
+
+from src.database import commit_session, db
+
+
+class RefreshToken(db.Model):
+    """
+    Refresh token model class for the issued refresh tokens by their JWT id.
+    Every refresh revokes the used token and issues a new one of the same
+    family, the family is the session started by one login.
+    """
+    __tablename__ = "refresh_token"
+    # only the auth requests read the tokens, nothing cached depends on them
+    __table_args__ = {"info": {"versioned": False}}
+
+    jti = db.Column(db.String(36), primary_key=True)
+    family = db.Column(db.String(36), nullable=False, index=True)
+    username = db.Column(db.String(128), nullable=False, index=True)
+    expires = db.Column(db.DateTime, nullable=False)
+    revoked = db.Column(db.Boolean, nullable=False, default=False)
+
+    @classmethod
+    def find_by_jti(cls, jti):
+        """
+        Find the refresh token from database by given JWT id
+        :param jti: string
+        :return: RefreshToken
+        """
+        return cls.query.filter_by(jti=jti).first()
+
+    @classmethod
+    def revoke(cls, jti) -> bool:
+        """
+        Revoke the token by given JWT id if it is not revoked yet, with one statement
+        so that concurrent refreshes with the same token can not both use it. Expired
+        tokens are refused before by the JWT validation.
+        The session is not committed.
+        :param jti: string
+        :return: True when the token was valid and is now revoked
+        """
+        result = db.session.execute(
+            update(cls.__table__).where(cls.jti == jti, cls.revoked.is_(False)).values(revoked=True)
+        )
+        return result.rowcount == 1
+
+    @classmethod
+    def revoke_family(cls, family):
+        """
+        Revoke all tokens of a family. The session is not committed.
+        :param family: string JWT id of the first token of the family
+        """
+        db.session.execute(update(cls.__table__).where(cls.family == family).values(revoked=True))
+
+    @classmethod
+    def delete_by_username(cls, username, expired_only=False):
+        """
+        Delete the tokens of a user. The session is not committed.
+        :param username: string
+        :param expired_only: delete only the expired tokens
+        """
+        statement = delete(cls.__table__).where(cls.username == username)
+        if expired_only:
+            statement = statement.where(cls.expires <= datetime.utcnow())
+        db.session.execute(statement)
+
+    def add(self, commit: bool = True):
+        """
+        Add the Refresh token to database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
+        """
+        db.session.add(self)
+        if commit:
+            commit_session()
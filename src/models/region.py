@@ -2,9 +2,16 @@
 Module that provides database model for Region with
 methods to add or modify the data on database
 """
+from itertools import chain
 from typing import List
 
-from src.database import db
+from sqlalchemy.orm import joinedload, subqueryload
+
+from src.database import commit_session, db
+from src.libs.fields import projection_options
+from src.models.grape import Grape
+from src.models.producer import Producer
+from src.models.wine import Wine
 
 
 class Region(db.Model):
@@ -13,8 +20,8 @@ class Region(db.Model):
     database model and methods.
     """
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(128), nullable=False)
-    country_id = db.Column(db.Integer, db.ForeignKey("country.id"))
+    name = db.Column(db.String(128), nullable=False, unique=True, index=True)
+    country_id = db.Column(db.Integer, db.ForeignKey("country.id"), index=True)
 
     # referenced from
     producers = db.relationship("Producer", back_populates="region")
@@ -35,13 +42,37 @@ class Region(db.Model):
         return doc
     
     @classmethod
-    def find_by_name(cls, name):
+    def load_options(cls, fields=None):
+        """
+        Loader options matching the RegionSchema, country is joined and
+        producers, grapes and their wines are fetched with one extra query per level,
+        subqueries instead of IN lists of keys so that the count does not grow with the rows.
+        With fields only the requested columns and relations are loaded.
+        :param fields: names of the requested RegionSchema fields, or None for all
+        :return: tuple of loader options
+        """
+        relations = {
+            "country": (joinedload(cls.country),),
+            "producers": (subqueryload(cls.producers).subqueryload(Producer.wines).joinedload(Wine.wine_type),
+                          subqueryload(cls.producers).subqueryload(Producer.wines).joinedload(Wine.grape)),
+            "grapes": (subqueryload(cls.grapes).subqueryload(Grape.wines).joinedload(Wine.wine_type),
+                       subqueryload(cls.grapes).subqueryload(Grape.wines).joinedload(Wine.producer)),
+        }
+        if fields is not None:
+            return projection_options(cls, fields, relations)
+        return tuple(chain.from_iterable(relations.values()))
+
+    @classmethod
+    def find_by_name(cls, name, eager=False, fields=None):
         """
         Find the region from database by given name
         :param name: string
+        :param eager: load the relations needed by the schema
+        :param fields: names of the requested schema fields when eager, or None for all
         :return: Region
         """
-        return cls.query.filter_by(name=name).first()
+        query = cls.query.options(*cls.load_options(fields)) if eager else cls.query
+        return query.filter_by(name=name).first()
 
     @classmethod
     def find_by_id(cls, id_):
@@ -58,18 +89,36 @@ class Region(db.Model):
         Find all regions from database
         :return: List of Regions
         """
-        return cls.query.all()
+        return cls.query.options(*cls.load_options()).all()
+
+    @classmethod
+    def find_page(cls, limit, after_id=None, fields=None) -> List["Region"]:
+        """
+        Find one page of Regions ordered by id, starting after the given id
+        :param limit: int maximum number of rows
+        :param after_id: int id of the last row on the previous page
+        :param fields: names of the requested schema fields, or None for all
+        :return: List of Regions
+        """
+        query = cls.query.options(*cls.load_options(fields)).order_by(cls.id)
+        if after_id is not None:
+            query = query.filter(cls.id > after_id)
+        return query.limit(limit).all()
 
-    def add(self):
+    def add(self, commit: bool = True):
         """
         Add Region to database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
         db.session.add(self)
-        db.session.commit()
+        if commit:
+            commit_session()
 
-    def delete(self):
+    def delete(self, commit: bool = True):
         """
         Delete Region from database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
         db.session.delete(self)
-        db.session.commit()
+        if commit:
+            commit_session()
@@ -0,0 +1,60 @@
+"""
+Module that provides database model for Table version with
+methods to read and increment the change version of tables
+"""
+from typing import Dict, Iterable
+
+from sqlalchemy import event
+
+from src.database import db
+
+
+class TableVersion(db.Model):
+    """
+    Table version model class for defining the change version
+    of each table. Version is incremented by every flush that
+    writes to the table. Tables which no cached response is built
+    from are left out with info={"versioned": False}.
+    """
+    __tablename__ = "table_version"
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    @classmethod
+    def find_versions(cls, names: Iterable[str]) -> Dict[str, int]:
+        """
+        Find the versions of given tables from database
+        :param names: iterable of table names
+        :return: dict of table name and version
+        """
+        rows = db.session.execute(
+            db.select(cls.name, cls.version).where(cls.name.in_(list(names)))
+        )
+        return dict(rows.all())
+
+    @classmethod
+    def bump(cls, connection, names: Iterable[str]):
+        """
+        Increment the versions of given tables within the current transaction
+        :param connection: connection of the ongoing transaction
+        :param names: iterable of table names
+        """
+        names = set(names)
+        table = cls.__table__
+        result = connection.execute(
+            table.update().where(table.c.name.in_(names)).values(version=table.c.version + 1)
+        )
+        if result.rowcount != len(names):
+            existing = set(connection.execute(
+                db.select(table.c.name).where(table.c.name.in_(names))
+            ).scalars())
+            connection.execute(table.insert(), [{"name": name, "version": 1}
+                                                for name in names - existing])
+
+
+@event.listens_for(TableVersion.__table__, "after_create")
+def _insert_versions(target, connection, **kwargs):
+    connection.execute(target.insert(), [{"name": table.name, "version": 0}
+                                         for table in target.metadata.sorted_tables
+                                         if table is not target and table.info.get("versioned", True)])
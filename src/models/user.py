@@ -4,7 +4,7 @@ methods to add or modify the data on database
 """
 from typing import List
 
-from src.database import db
+from src.database import commit_session, db
 
 
 class User(db.Model):
@@ -13,7 +13,7 @@ class User(db.Model):
     database model and methods.
     """
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(128), nullable=False)
+    username = db.Column(db.String(128), nullable=False, unique=True, index=True)
     password = db.Column(db.String(128), nullable=False)
     email = db.Column(db.String(128))
     role = db.Column(db.String(32))
@@ -44,16 +44,20 @@ class User(db.Model):
         """
         return cls.query.all()
 
-    def add(self):
+    def add(self, commit: bool = True):
         """
         Add User to database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
         db.session.add(self)
-        db.session.commit()
+        if commit:
+            commit_session()
 
-    def delete(self):
+    def delete(self, commit: bool = True):
         """
         Delete User from database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
-        db.session.add(self)
-        db.session.commit()
+        db.session.delete(self)
+        if commit:
+            commit_session()
@@ -2,9 +2,14 @@
 Module that provides database model for Wine with
 methods to add or modify the data on database
 """
-from typing import List
+from itertools import chain
+from typing import List, Set
 
-from src.database import db
+from sqlalchemy import and_, insert, select, tuple_
+from sqlalchemy.orm import joinedload
+
+from src.database import commit_session, db
+from src.libs.fields import projection_options
 
 
 class Wine(db.Model):
@@ -12,8 +17,20 @@ class Wine(db.Model):
     Wine model class for defining the wine
     database model and methods.
     """
+    # wines can be sorted by these columns, each of them leads an index
+    SORT_KEYS = ("name", "year_produced", "alcohol_percentage")
+
+    __table_args__ = (
+        # filters on wine type, grape or producer are often combined with a vintage range
+        db.Index("ix_wine_wine_type_id_year_produced", "wine_type_id", "year_produced"),
+        db.Index("ix_wine_grape_id_year_produced", "grape_id", "year_produced"),
+        db.Index("ix_wine_producer_id_year_produced", "producer_id", "year_produced"),
+        db.Index("ix_wine_year_produced_id", "year_produced", "id"),
+        db.Index("ix_wine_alcohol_percentage_id", "alcohol_percentage", "id"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(128), nullable=False)
+    name = db.Column(db.String(128), nullable=False, unique=True, index=True)
     style = db.Column(db.String(64))
     wine_type_id = db.Column(db.Integer, db.ForeignKey("wine_type.id"))
     producer_id = db.Column(db.Integer, db.ForeignKey("producer.id"))
@@ -49,13 +66,34 @@ class Wine(db.Model):
         return doc
 
     @classmethod
-    def find_by_name(cls, name):
+    def load_options(cls, fields=None):
+        """
+        Loader options matching the WineSchema, wine type, producer
+        and grape are joined to the same query.
+        With fields only the requested columns and relations are loaded.
+        :param fields: names of the requested WineSchema fields, or None for all
+        :return: tuple of loader options
+        """
+        relations = {
+            "wine_type": (joinedload(cls.wine_type),),
+            "producer": (joinedload(cls.producer),),
+            "grape": (joinedload(cls.grape),),
+        }
+        if fields is not None:
+            return projection_options(cls, fields, relations)
+        return tuple(chain.from_iterable(relations.values()))
+
+    @classmethod
+    def find_by_name(cls, name, eager=False, fields=None):
         """
         Find wine from database by given name
         :param name: string
+        :param eager: load the relations needed by the WineSchema
+        :param fields: names of the requested schema fields when eager, or None for all
         :return: Wine
         """
-        return cls.query.filter_by(name=name).first()
+        query = cls.query.options(*cls.load_options(fields)) if eager else cls.query
+        return query.filter_by(name=name).first()
 
     @classmethod
     def find_by_id(cls, id_):
@@ -72,18 +110,133 @@ class Wine(db.Model):
         Find all wines from database
         :return: List of Wines
         """
-        return cls.query.all()
+        return cls.query.options(*cls.load_options()).all()
+
+    @classmethod
+    def filter_criteria(cls, filters):
+        """
+        Translate filters to SQL criteria. Names are resolved to ids in
+        subqueries so that the foreign key indexes are used.
+        :param filters: dict of type, grape, producer, region, year_min,
+            year_max, abv_min and abv_max filter values
+        :return: list of criteria
+        """
+        # imported here since the models of the relations import this model
+        from src.models.grape import Grape
+        from src.models.producer import Producer
+        from src.models.region import Region
+        from src.models.wine_type import Wine_type
+
+        criteria = []
+        if "type" in filters:
+            criteria.append(cls.wine_type_id == select(Wine_type.id).where(
+                Wine_type.type == filters["type"]).scalar_subquery())
+        if "grape" in filters:
+            criteria.append(cls.grape_id == select(Grape.id).where(
+                Grape.name == filters["grape"]).scalar_subquery())
+        if "producer" in filters:
+            criteria.append(cls.producer_id == select(Producer.id).where(
+                Producer.name == filters["producer"]).scalar_subquery())
+        if "region" in filters:
+            criteria.append(cls.producer_id.in_(select(Producer.id).where(
+                Producer.region_id == select(Region.id).where(
+                    Region.name == filters["region"]).scalar_subquery())))
+        if "year_min" in filters:
+            criteria.append(cls.year_produced >= filters["year_min"])
+        if "year_max" in filters:
+            criteria.append(cls.year_produced <= filters["year_max"])
+        if "abv_min" in filters:
+            criteria.append(cls.alcohol_percentage >= filters["abv_min"])
+        if "abv_max" in filters:
+            criteria.append(cls.alcohol_percentage <= filters["abv_max"])
+        return criteria
+
+    @classmethod
+    def find_page(cls, limit, after_id=None, filters=None, sort=None, after_value=None,
+                  fields=None) -> List["Wine"]:
+        """
+        Find one page of Wines ordered by id, or by a sort key and id,
+        starting after the given row. Missing values of the sort key are
+        ordered like the database orders them in the indexes, smallest on
+        SQLite and largest on PostgreSQL, so that the pages walk the index.
+        :param limit: int maximum number of rows
+        :param after_id: int id of the last row on the previous page
+        :param filters: dict of filters, see filter_criteria
+        :param sort: string one of SORT_KEYS, with - prefix for descending order
+        :param after_value: sort value of the last row on the previous page
+        :param fields: names of the requested schema fields, or None for all
+        :return: List of Wines
+        """
+        if fields is not None and sort:
+            # the sort value of the last row goes to the cursor
+            fields = tuple(sorted(set(fields) | {sort.lstrip("-")}))
+        query = cls.query.options(*cls.load_options(fields))
+        if filters:
+            query = query.filter(*cls.filter_criteria(filters))
+
+        if not sort:
+            query = query.order_by(cls.id)
+            if after_id is not None:
+                query = query.filter(cls.id > after_id)
+            return query.limit(limit).all()
+
+        descending = sort.startswith("-")
+        column = getattr(cls, sort.lstrip("-"))
+        if descending:
+            query = query.order_by(column.desc(), cls.id.desc())
+        else:
+            query = query.order_by(column, cls.id)
+        if after_id is None:
+            return query.limit(limit).all()
+
+        # the rest of the group of the last row, with or without a value, and the other
+        # group when it follows are read separately, both are ranges of the index
+        nulls_first = (db.engine.dialect.name == "postgresql") == descending
+        if after_value is None:
+            rest = and_(column.is_(None), cls.id < after_id if descending else cls.id > after_id)
+            following = column.isnot(None) if nulls_first else None
+        else:
+            rest = (tuple_(column, cls.id) < tuple_(after_value, after_id) if descending
+                    else tuple_(column, cls.id) > tuple_(after_value, after_id))
+            following = None if nulls_first else column.is_(None)
+        wines = query.filter(rest).limit(limit).all()
+        if following is not None and len(wines) < limit:
+            wines += query.filter(following).limit(limit - len(wines)).all()
+        return wines
+
+    @classmethod
+    def find_existing_names(cls, names) -> Set[str]:
+        """
+        Find which of the given wine names exist in database with one query
+        :param names: iterable of string names
+        :return: set of existing names
+        """
+        return {name for name, in db.session.query(cls.name).filter(cls.name.in_(list(names)))}
+
+    @classmethod
+    def insert_rows(cls, rows):
+        """
+        Insert wines from column value dicts in one statement, used by
+        the bulk import. The session is not committed.
+        :param rows: list of dicts of column values
+        """
+        if rows:
+            db.session.execute(insert(cls.__table__), rows)
 
-    def add(self):
+    def add(self, commit: bool = True):
         """
         Add Wine to database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
         db.session.add(self)
-        db.session.commit()
+        if commit:
+            commit_session()
 
-    def delete(self):
+    def delete(self, commit: bool = True):
         """
         Delete Wine from database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
         db.session.delete(self)
-        db.session.commit()
+        if commit:
+            commit_session()
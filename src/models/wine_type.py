@@ -2,9 +2,15 @@
 Module that provides database model for Wine type with
 methods to add or modify the data on database
 """
-from typing import List
+from itertools import chain
+from typing import Dict, List
 
-from src.database import db
+from sqlalchemy import insert
+from sqlalchemy.orm import subqueryload
+
+from src.database import commit_session, db
+from src.libs.fields import projection_options
+from src.models.wine import Wine
 
 
 class Wine_type(db.Model):
@@ -13,7 +19,7 @@ class Wine_type(db.Model):
     database model and methods.
     """
     id = db.Column(db.Integer, primary_key=True)
-    type = db.Column(db.String(50), nullable=False)
+    type = db.Column(db.String(50), nullable=False, unique=True, index=True)
 
     wines = db.relationship("Wine", back_populates="wine_type")
 
@@ -29,13 +35,33 @@ class Wine_type(db.Model):
         return doc
 
     @classmethod
-    def find_by_type(cls, type_):
+    def load_options(cls, fields=None):
+        """
+        Loader options matching the WineTypeSchema, wines are fetched
+        with one extra query together with their producer and grape.
+        With fields only the requested columns and relations are loaded.
+        :param fields: names of the requested WineTypeSchema fields, or None for all
+        :return: tuple of loader options
+        """
+        relations = {
+            "wines": (subqueryload(cls.wines).joinedload(Wine.producer),
+                      subqueryload(cls.wines).joinedload(Wine.grape)),
+        }
+        if fields is not None:
+            return projection_options(cls, fields, relations)
+        return tuple(chain.from_iterable(relations.values()))
+
+    @classmethod
+    def find_by_type(cls, type_, eager=False, fields=None):
         """
         Find the wine type from database by given type
         :param type_: string
+        :param eager: load the relations needed by the schema
+        :param fields: names of the requested schema fields when eager, or None for all
         :return: Wine type
         """
-        return cls.query.filter_by(type=type_).first()
+        query = cls.query.options(*cls.load_options(fields)) if eager else cls.query
+        return query.filter_by(type=type_).first()
 
     @classmethod
     def find_by_id(cls, id_):
@@ -52,18 +78,56 @@ class Wine_type(db.Model):
         Find all wine types from database
         :return: List of Wine types
         """
-        return cls.query.all()
+        return cls.query.options(*cls.load_options()).all()
+
+    @classmethod
+    def find_page(cls, limit, after_id=None, fields=None) -> List["Wine_type"]:
+        """
+        Find one page of Wine types ordered by id, starting after the given id
+        :param limit: int maximum number of rows
+        :param after_id: int id of the last row on the previous page
+        :param fields: names of the requested schema fields, or None for all
+        :return: List of Wine types
+        """
+        query = cls.query.options(*cls.load_options(fields)).order_by(cls.id)
+        if after_id is not None:
+            query = query.filter(cls.id > after_id)
+        return query.limit(limit).all()
     
-    def add(self):
+    @classmethod
+    def find_ids_by_types(cls, types) -> Dict[str, int]:
+        """
+        Find the ids of wine types by given types with one query
+        :param types: iterable of strings
+        :return: dict of type to id
+        """
+        return dict(db.session.query(cls.type, cls.id).filter(cls.type.in_(list(types))))
+
+    @classmethod
+    def insert_types(cls, types):
+        """
+        Insert wine types with given types in one statement, used by the
+        bulk import. The session is not committed.
+        :param types: iterable of strings
+        """
+        rows = [{"type": value} for value in types]
+        if rows:
+            db.session.execute(insert(cls.__table__), rows)
+
+    def add(self, commit: bool = True):
         """
         Add the Wine type to database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
         db.session.add(self)
-        db.session.commit()
+        if commit:
+            commit_session()
 
-    def delete(self):
+    def delete(self, commit: bool = True):
         """
         Delete the Wine type from database
+        :param commit: whether to commit, in a unit of work it is committed when the unit ends
         """
         db.session.delete(self)
-        db.session.commit()
+        if commit:
+            commit_session()
@@ -2,20 +2,27 @@
 Module for country resource. Provides the methods to get, post, patch and delete
 data related to country. Some methods are jwt restricted.
 """
-from sqlite3 import IntegrityError, InternalError
-
 from flask import request
 from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError, InternalError
 from werkzeug.exceptions import BadRequest
 
+from src.database import unit_of_work
+from src.libs.cache import cached
+from src.libs.etag import etagged, precondition
+from src.libs.fields import fields_arg
+from src.libs.pagination import page_args, paginate
+from src.libs.serializer import dumper
 from src.models.country import Country
 from src.schemas.schemas import CountrySchema
 from src.utils.constants import ALREADY_EXISTS, ERROR_DELETING, ERROR_INSERTING, NOT_JSON, NOT_FOUND, BAD_REQUEST
 
 country_schema = CountrySchema()
-country_list_schema = CountrySchema(many=True)
+
+# tables the country representation is built from
+COUNTRY_TABLES = ("country", "region", "producer", "grape", "wine", "wine_type")
 
 
 # noinspection DuplicatedCode
@@ -24,13 +31,23 @@ class CountryList(Resource):
     Class that provides the methods to get countries and post new countries.
     """
     @classmethod
+    @etagged(*COUNTRY_TABLES)
+    @cached(*COUNTRY_TABLES)
     def get(cls):
         """
-        Get a list of countries from database
+        Get a page of countries from database. Page size is given with
+        limit query parameter and the next page with cursor query parameter.
         :return: List of countries
         """
         try:
-            return {"countries": country_list_schema.dump(Country.find_all())}, 200
+            limit, after_id = page_args()
+            fields = fields_arg(CountrySchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        try:
+            countries = Country.find_page(limit + 1, after_id, fields)
+            return paginate("countries", countries, limit, dumper(CountrySchema, fields, many=True))
         except BadRequest:
             return {"[ERROR]": BAD_REQUEST}, 400
 
@@ -64,7 +81,8 @@ class CountryList(Resource):
             return {"[ERROR]": ALREADY_EXISTS}, 409
 
         try:
-            country.add()
+            with unit_of_work():
+                country.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
 
@@ -76,20 +94,28 @@ class CountryItem(Resource):
     Class that provides the methods to get, delete and patch country.
     """
     @classmethod
+    @etagged(*COUNTRY_TABLES)
+    @cached(*COUNTRY_TABLES)
     def get(cls, name):
         """
         Get one specific country from database with given name
         :param name: string name for country
         :return: Serialized Country object as a JSON
         """
-        db_country = Country.find_by_name(name)
+        try:
+            fields = fields_arg(CountrySchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        db_country = Country.find_by_name(name, eager=True, fields=fields)
         if db_country is not None:
-            return country_schema.dump(db_country), 200
+            return dumper(CountrySchema, fields)(db_country), 200
         else:
             return {"[INFO]": NOT_FOUND}, 404
 
     @classmethod
     @jwt_required()
+    @precondition(*COUNTRY_TABLES)
     def delete(cls, name):
         """
         Delete one specific country from database with given name
@@ -102,7 +128,8 @@ class CountryItem(Resource):
 
         if item:
             try:
-                item.delete()
+                with unit_of_work():
+                    item.delete()
                 return {"[INFO]": "{} deleted".format(item.name)}, 200
             except InternalError:
                 return {"[ERROR]": ERROR_DELETING}, 500
@@ -111,6 +138,7 @@ class CountryItem(Resource):
 
     @classmethod
     @jwt_required()
+    @precondition(*COUNTRY_TABLES)
     def patch(cls, name):
         """
         Update the existing country in the database by given name.
@@ -137,12 +165,16 @@ class CountryItem(Resource):
             except ValidationError as err:
                 return err.messages, 400
 
+            if country.name != item.name and Country.find_by_name(country.name):
+                return {"[ERROR]": ALREADY_EXISTS}, 409
+
             item.name = country.name
         else:
             return {"[ERROR]": "Country not found"}, 404
 
         try:
-            item.add()
+            with unit_of_work():
+                item.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
 
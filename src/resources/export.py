@@ -0,0 +1,42 @@
+"""
+Module for catalog export resource. Provides the method to stream
+the whole wine catalog as NDJSON or CSV. The method is jwt restricted.
+"""
+from flask import Response, current_app, request, stream_with_context
+from flask_jwt_extended import jwt_required
+from flask_restful import Resource
+
+from src.libs.export import EXPORT_FORMATS, export_catalog, gzipped
+from src.utils.constants import INVALID_EXPORT_FORMAT
+
+
+class CatalogExport(Resource):
+    """
+    Class that provides the method to export the wine catalog.
+    """
+    @classmethod
+    @jwt_required()
+    def get(cls):
+        """
+        Stream all wines with the names of their wine type, grape, producer,
+        and the region and country of the producer. The format is given with
+        format query parameter, ndjson or csv. The export is gzip compressed
+        when the client accepts gzip encoding.
+
+        Headers: Authorization: Bearer access token
+
+        :return: Streamed response of the catalog
+        """
+        export_format = request.args.get("format", "ndjson")
+        if export_format not in EXPORT_FORMATS:
+            return {"[ERROR]": INVALID_EXPORT_FORMAT.format(", ".join(EXPORT_FORMATS))}, 400
+
+        extension, mimetype = EXPORT_FORMATS[export_format]
+        chunks = export_catalog(export_format, current_app.config["EXPORT_BATCH_SIZE"])
+        headers = {"Content-Disposition": 'attachment; filename="catalog.{}"'.format(extension),
+                   "Vary": "Accept-Encoding"}
+        if request.accept_encodings["gzip"]:
+            chunks = gzipped(chunks)
+            headers["Content-Encoding"] = "gzip"
+
+        return Response(stream_with_context(chunks), mimetype=mimetype, headers=headers)
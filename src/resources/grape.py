@@ -2,21 +2,30 @@
 Module for grape resource. Provides the methods to get, post, patch and delete
 data related to grape. Some methods are jwt restricted.
 """
-from sqlite3 import IntegrityError, InternalError
-
 from flask import request
 from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError, InternalError
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.exceptions import BadRequest
 
+from src.database import unit_of_work
+from src.libs.cache import cached
+from src.libs.etag import etagged, precondition
+from src.libs.fields import fields_arg
+from src.libs.pagination import page_args, paginate
+from src.libs.references import reference_cache
+from src.libs.serializer import dumper
 from src.models.grape import Grape
 from src.models.region import Region
 from src.schemas.schemas import GrapeSchema
 from src.utils.constants import ALREADY_EXISTS, ERROR_DELETING, ERROR_INSERTING, NOT_JSON, NOT_FOUND, BAD_REQUEST
 
 grape_schema = GrapeSchema()
-grape_list_schema = GrapeSchema(many=True)
+
+# tables the grape representation is built from
+GRAPE_TABLES = ("grape", "region", "wine", "wine_type", "producer")
 
 
 # noinspection DuplicatedCode
@@ -25,13 +34,23 @@ class GrapeList(Resource):
        Class that provides the methods to get grapes and post new grape.
     """
     @classmethod
+    @etagged(*GRAPE_TABLES)
+    @cached(*GRAPE_TABLES)
     def get(cls):
         """
-        Get a list of grapes from database
+        Get a page of grapes from database. Page size is given with
+        limit query parameter and the next page with cursor query parameter.
         :return: List of grapes
         """
         try:
-            return {"grapes": grape_list_schema.dump(Grape.find_all())}, 200
+            limit, after_id = page_args()
+            fields = fields_arg(GrapeSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        try:
+            grapes = Grape.find_page(limit + 1, after_id, fields)
+            return paginate("grapes", grapes, limit, dumper(GrapeSchema, fields, many=True))
         except BadRequest:
             return {"[ERROR]": BAD_REQUEST}, 400
 
@@ -71,14 +90,16 @@ class GrapeList(Resource):
         # checking if the user included region
         if "region" in content:
 
-            region = Region.find_by_name(grape.region.name)
+            region_id = reference_cache.find_id(Region, grape.region.name)
 
-            if region:
-                grape.region = None
-                grape.region = region
+            # linking the existing row by id in place of the loaded object
+            if region_id:
+                set_committed_value(grape, "region", None)
+                grape.region_id = region_id
 
         try:
-            grape.add()
+            with unit_of_work():
+                grape.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
 
@@ -90,20 +111,28 @@ class GrapeItem(Resource):
     Class that provides the methods to get, delete and patch grape.
     """
     @classmethod
+    @etagged(*GRAPE_TABLES)
+    @cached(*GRAPE_TABLES)
     def get(cls, name):
         """
         Get one specific grape from database with given name
         :param name: string name for grape
         :return: Serialized Grape object as a JSON
         """
-        db_grape = Grape.find_by_name(name)
+        try:
+            fields = fields_arg(GrapeSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        db_grape = Grape.find_by_name(name, eager=True, fields=fields)
         if db_grape is not None:
-            return grape_schema.dump(db_grape), 200
+            return dumper(GrapeSchema, fields)(db_grape), 200
         else:
             return {"[INFO]": NOT_FOUND}, 404
 
     @classmethod
     @jwt_required()
+    @precondition(*GRAPE_TABLES)
     def delete(cls, name):
         """
         Delete one specific grape from database with given name
@@ -116,7 +145,8 @@ class GrapeItem(Resource):
 
         if item:
             try:
-                item.delete()
+                with unit_of_work():
+                    item.delete()
                 return {"[INFO]": "{} deleted".format(item.name)}, 200
             except InternalError:
                 return {"[ERROR]": ERROR_DELETING}, 500
@@ -125,6 +155,7 @@ class GrapeItem(Resource):
 
     @classmethod
     @jwt_required()
+    @precondition(*GRAPE_TABLES)
     def patch(cls, name):
         """
         Update the existing grape in the database by given name.
@@ -158,14 +189,16 @@ class GrapeItem(Resource):
             except ValidationError as err:
                 return err.messages, 400
 
+            if grape.name != item.name and Grape.find_by_name(grape.name):
+                return {"[ERROR]": ALREADY_EXISTS}, 409
+
             item.name = grape.name
 
             if grape.region:
-                try:
-                    region = Region.find_by_name(grape.region.name)
-                    item.region_id = region.id
-                except AttributeError:
+                region_id = reference_cache.find_id(Region, grape.region.name)
+                if region_id is None:
                     return {"[ERROR]": "Region not found"}, 404
+                item.region_id = region_id
 
             if grape.description:
                 item.description = grape.description
@@ -173,7 +206,8 @@ class GrapeItem(Resource):
             return {"[ERROR]": "Grape not found"}, 404
 
         try:
-            item.add()
+            with unit_of_work():
+                item.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
 
@@ -2,21 +2,30 @@
 Module for producer resource. Provides the methods to get, post, patch and delete
 data related to producer. Some methods are jwt restricted.
 """
-from sqlite3 import IntegrityError, InternalError
-
 from flask import request
 from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError, InternalError
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.exceptions import BadRequest
 
+from src.database import unit_of_work
+from src.libs.cache import cached
+from src.libs.etag import etagged, precondition
+from src.libs.fields import fields_arg
+from src.libs.pagination import page_args, paginate
+from src.libs.references import reference_cache
+from src.libs.serializer import dumper
 from src.models.producer import Producer
 from src.models.region import Region
 from src.schemas.schemas import ProducerSchema
 from src.utils.constants import ALREADY_EXISTS, ERROR_DELETING, ERROR_INSERTING, NOT_JSON, NOT_FOUND, BAD_REQUEST
 
 producer_schema = ProducerSchema()
-producer_list_schema = ProducerSchema(many=True)
+
+# tables the producer representation is built from
+PRODUCER_TABLES = ("producer", "region", "wine", "wine_type", "grape")
 
 
 # noinspection DuplicatedCode
@@ -25,13 +34,23 @@ class ProducerList(Resource):
        Class that provides the methods to get producers and post new producers.
     """
     @classmethod
+    @etagged(*PRODUCER_TABLES)
+    @cached(*PRODUCER_TABLES)
     def get(cls):
         """
-        Get a list of producers from database
+        Get a page of producers from database. Page size is given with
+        limit query parameter and the next page with cursor query parameter.
         :return: List of producers
         """
         try:
-            return {"producers": producer_list_schema.dump(Producer.find_all())}, 200
+            limit, after_id = page_args()
+            fields = fields_arg(ProducerSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        try:
+            producers = Producer.find_page(limit + 1, after_id, fields)
+            return paginate("producers", producers, limit, dumper(ProducerSchema, fields, many=True))
         except BadRequest:
             return {"[ERROR]": BAD_REQUEST}, 400
 
@@ -71,14 +90,16 @@ class ProducerList(Resource):
         # check if user included region
         if "region" in content:
 
-            region = Region.find_by_name(producer.region.name)
-        
-            if region:
-                producer.region = None
-                producer.region = region
+            region_id = reference_cache.find_id(Region, producer.region.name)
+
+            # linking the existing row by id in place of the loaded object
+            if region_id:
+                set_committed_value(producer, "region", None)
+                producer.region_id = region_id
 
         try:
-            producer.add()
+            with unit_of_work():
+                producer.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
 
@@ -91,20 +112,28 @@ class ProducerItem(Resource):
     Class that provides the methods to get, delete and patch producer.
     """
     @classmethod
+    @etagged(*PRODUCER_TABLES)
+    @cached(*PRODUCER_TABLES)
     def get(cls, name):
         """
         Get one specific producer from database with given name
         :param name: string name for producer
         :return: Serialized Producer object as a JSON
         """
-        db_producer = Producer.find_by_name(name)
+        try:
+            fields = fields_arg(ProducerSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        db_producer = Producer.find_by_name(name, eager=True, fields=fields)
         if db_producer is not None:
-            return producer_schema.dump(db_producer), 200
+            return dumper(ProducerSchema, fields)(db_producer), 200
         else:
             return {"[INFO]": NOT_FOUND}, 404
 
     @classmethod
     @jwt_required()
+    @precondition(*PRODUCER_TABLES)
     def delete(cls, name):
         """
         Delete one specific producer from database with given name
@@ -117,7 +146,8 @@ class ProducerItem(Resource):
 
         if item:
             try:
-                item.delete()
+                with unit_of_work():
+                    item.delete()
                 return {"[INFO]": "{} deleted".format(item.name)}, 200
             except InternalError:
                 return {"[ERROR]": ERROR_DELETING}, 500
@@ -126,6 +156,7 @@ class ProducerItem(Resource):
 
     @classmethod
     @jwt_required()
+    @precondition(*PRODUCER_TABLES)
     def patch(cls, name):
         """
         Update the existing producer in the database by given name.
@@ -159,14 +190,16 @@ class ProducerItem(Resource):
             except ValidationError as err:
                 return err.messages, 400
 
+            if producer.name != item.name and Producer.find_by_name(producer.name):
+                return {"[ERROR]": ALREADY_EXISTS}, 409
+
             item.name = producer.name
 
             if producer.region:
-                try:
-                    region = Region.find_by_name(producer.region.name)
-                    item.region_id = region.id
-                except AttributeError:
+                region_id = reference_cache.find_id(Region, producer.region.name)
+                if region_id is None:
                     return {"[ERROR]": "Region not found"}, 404
+                item.region_id = region_id
 
             if producer.description:
                 item.description = producer.description
@@ -175,12 +208,8 @@ class ProducerItem(Resource):
             return {"[ERROR]": "Producer {} not found".format(name)}, 404
 
         try:
-            item = producer_schema.load(content)
-        except ValidationError as err:
-            return err.messages, 400
-
-        try:
-            item.add()
+            with unit_of_work():
+                item.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
 
@@ -2,15 +2,23 @@
 Module for region resource. Provides the methods to get, post, patch and delete
 data related to region. Some methods are jwt restricted.
 """
-from sqlite3 import IntegrityError, InternalError
 from urllib import request
 
 from flask import request
 from flask_jwt_extended import jwt_required
 from flask_restful import Resource
 from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError, InternalError
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.exceptions import BadRequest
 
+from src.database import unit_of_work
+from src.libs.cache import cached
+from src.libs.etag import etagged, precondition
+from src.libs.fields import fields_arg
+from src.libs.pagination import page_args, paginate
+from src.libs.references import reference_cache
+from src.libs.serializer import dumper
 from src.models.region import Region
 from src.models.country import Country
 from src.schemas.schemas import CountrySchema, RegionSchema
@@ -18,7 +26,9 @@ from src.utils.constants import ALREADY_EXISTS, ERROR_DELETING, ERROR_INSERTING,
 
 country_schema = CountrySchema()
 region_schema = RegionSchema()
-region_list_schema = RegionSchema(many=True)
+
+# tables the region representation is built from
+REGION_TABLES = ("region", "country", "producer", "grape", "wine", "wine_type")
 
 
 # noinspection DuplicatedCode
@@ -27,13 +37,23 @@ class RegionList(Resource):
     Class that provides the methods to get regions and post new regions.
     """
     @classmethod
+    @etagged(*REGION_TABLES)
+    @cached(*REGION_TABLES)
     def get(cls):
         """
-        Get a list of regions from database
+        Get a page of regions from database. Page size is given with
+        limit query parameter and the next page with cursor query parameter.
         :return: List of regions
         """
         try:
-            return {"regions": region_list_schema.dump(Region.find_all())}, 200
+            limit, after_id = page_args()
+            fields = fields_arg(RegionSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        try:
+            regions = Region.find_page(limit + 1, after_id, fields)
+            return paginate("regions", regions, limit, dumper(RegionSchema, fields, many=True))
         except BadRequest:
             return {"[ERROR]": BAD_REQUEST}, 400
 
@@ -72,14 +92,16 @@ class RegionList(Resource):
         # check if user included country
         if "country" in content:
 
-            country = Country.find_by_name(region.country.name)
+            country_id = reference_cache.find_id(Country, region.country.name)
 
-            if country:
-                region.country = None
-                region.country = country
+            # linking the existing row by id in place of the loaded object
+            if country_id:
+                set_committed_value(region, "country", None)
+                region.country_id = country_id
 
         try:
-            region.add()
+            with unit_of_work():
+                region.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
 
@@ -91,20 +113,28 @@ class RegionItem(Resource):
     Class that provides the methods to get, delete and patch region.
     """
     @classmethod
+    @etagged(*REGION_TABLES)
+    @cached(*REGION_TABLES)
     def get(cls, name):
         """
         Get one specific region from database with given name
         :param name: string name for region
         :return: Serialized Region object as a JSON
         """
-        db_region = Region.find_by_name(name)
+        try:
+            fields = fields_arg(RegionSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        db_region = Region.find_by_name(name, eager=True, fields=fields)
         if db_region is not None:
-            return region_schema.dump(db_region), 200
+            return dumper(RegionSchema, fields)(db_region), 200
         else:
             return {"[INFO]": NOT_FOUND}, 404
 
     @classmethod
     @jwt_required()
+    @precondition(*REGION_TABLES)
     def delete(cls, name):
         """
         Delete one specific region from database with given name
@@ -117,7 +147,8 @@ class RegionItem(Resource):
 
         if item:
             try:
-                item.delete()
+                with unit_of_work():
+                    item.delete()
                 return {"[INFO]": "{} deleted".format(item.name)}, 200
             except InternalError:
                 return {"[ERROR]": ERROR_DELETING}, 500
@@ -126,6 +157,7 @@ class RegionItem(Resource):
 
     @classmethod
     @jwt_required()
+    @precondition(*REGION_TABLES)
     def patch(cls, name):
         """
         Update the existing region in the database by given name.
@@ -159,19 +191,22 @@ class RegionItem(Resource):
             except ValidationError as err:
                 return err.messages, 400
 
+            if region.name != item.name and Region.find_by_name(region.name):
+                return {"[ERROR]": ALREADY_EXISTS}, 409
+
             item.name = region.name
 
             if region.country:
-                try:
-                    country = Country.find_by_name(region.country.name)
-                    item.country_id = country.id
-                except AttributeError:
+                country_id = reference_cache.find_id(Country, region.country.name)
+                if country_id is None:
                     return {"[ERROR]": "Country not found"}, 404
+                item.country_id = country_id
         else:
             return {"[ERROR]": "Region not found"}, 404
 
         try:
-            item.add()
+            with unit_of_work():
+                item.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
         
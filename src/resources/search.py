@@ -0,0 +1,48 @@
+"""
+Module for search resource. Provides the method to search
+wines, producers and grapes with free text.
+"""
+from flask import request
+from flask_restful import Resource
+
+from src.libs.cache import cached
+from src.libs.etag import etagged
+from src.libs.pagination import paginate, page_args
+from src.libs.search import search, search_terms
+from src.utils.constants import EMPTY_SEARCH, INVALID_CURSOR
+
+# tables the search results are built from
+SEARCH_TABLES = ("wine", "producer", "grape")
+
+
+def _dump(results):
+    return [{"kind": result.kind, "name": result.name} for result in results]
+
+
+class Search(Resource):
+    """
+    Class that provides the method to search the catalog.
+    """
+    @classmethod
+    @etagged(*SEARCH_TABLES)
+    @cached(*SEARCH_TABLES)
+    def get(cls):
+        """
+        Search wines by name, description and style, and producers and grapes
+        by name and description. The words of q query parameter must all match.
+        Results are ranked best first and paginated like the collections.
+        :return: List of results with kind and name
+        """
+        terms = search_terms(request.args.get("q", ""))
+        if not terms:
+            return {"[ERROR]": EMPTY_SEARCH}, 400
+
+        try:
+            limit, after = page_args(with_value=True)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+        if after is not None and not isinstance(after[0], (int, float)):
+            return {"[ERROR]": INVALID_CURSOR}, 400
+
+        results = search(terms, limit + 1, after)
+        return paginate("results", results, limit, _dump, sort_key="score")
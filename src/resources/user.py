@@ -3,23 +3,33 @@ Module for user resource. Provides the methods to get, post and delete
 data related to user. Some methods are jwt restricted.
 """
 from flask import request, jsonify
-from flask_jwt_extended import create_access_token, \
+from flask_jwt_extended import get_jwt, \
     jwt_required, set_access_cookies, \
     unset_jwt_cookies
 from flask_restful import Resource
 from marshmallow import ValidationError
 from werkzeug.exceptions import BadRequest
-from werkzeug.security import check_password_hash, generate_password_hash
 
+from src.database import unit_of_work
+from src.libs.blocklist import token_blocklist
+from src.libs.cache import cached
+from src.libs.etag import etagged, precondition
+from src.libs.fields import fields_arg
+from src.libs.passwords import HashingBusy, password_hasher
+from src.libs.serializer import dumper
+from src.libs.tokens import issue_tokens, revoke_family, revoke_user, rotate_tokens
 from src.schemas.schemas import UserSchema
 from src.models.user import User
 from src.utils.constants import \
     INVALID_CREDENTIALS, USER_ALREADY_EXISTS, \
     CREATED_SUCCESSFULLY, USER_NOT_FOUND, \
-    USER_DELETED, USER_LOGGED_OUT, LOGIN_SUCCESSFUL, BAD_REQUEST
+    USER_DELETED, USER_LOGGED_OUT, LOGIN_SUCCESSFUL, BAD_REQUEST, HASHING_BUSY, TOKEN_REVOKED
 
 user_schema = UserSchema()
 
+# tables the user representation is built from
+USER_TABLES = ("user",)
+
 
 class UserRegister(Resource):
     """
@@ -52,8 +62,12 @@ class UserRegister(Resource):
         if User.find_by_name(user.username):
             return {"[ERROR]": USER_ALREADY_EXISTS}, 409
 
-        user.password = generate_password_hash(user.password)
-        user.add()
+        try:
+            user.password = password_hasher.hash(user.password)
+        except HashingBusy:
+            return {"[ERROR]": HASHING_BUSY}, 429, {"Retry-After": "1"}
+        with unit_of_work():
+            user.add()
 
         return {"[INFO]": CREATED_SUCCESSFULLY}, 201
 
@@ -63,20 +77,28 @@ class UserItem(Resource):
     Class that provides the methods to get user and delete user.
     """
     @classmethod
+    @etagged(*USER_TABLES)
+    @cached(*USER_TABLES)
     def get(cls, username: str):
         """
         Get a user by given username
         :param username: string
         :return: Serialized User object as a JSON
         """
+        try:
+            fields = fields_arg(UserSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
         user = User.find_by_name(username)
         if not user:
             return {"[ERROR]": USER_NOT_FOUND}, 404
 
-        return user_schema.dump(user), 200
+        return dumper(UserSchema, fields)(user), 200
 
     @classmethod
     @jwt_required()
+    @precondition(*USER_TABLES)
     def delete(cls, username: str):
         """
         Delete existing user by given username.
@@ -89,7 +111,9 @@ class UserItem(Resource):
         if not user:
             return {"[ERROR]": USER_NOT_FOUND}, 404
 
-        user.delete()
+        with unit_of_work():
+            revoke_user(user.username)
+            user.delete()
         return {"[INFO]": USER_DELETED}, 200
 
 
@@ -100,9 +124,9 @@ class UserLogin(Resource):
     @classmethod
     def post(cls):
         """
-        Login an existing user to get JWT access token
+        Login an existing user to get JWT access token. The response has
+        a refresh token in X-Refresh-Token header for the refresh method.
 
-        Headers: Authorization: Bearer access token
         Request content-type: Application/JSON
         Request body example, doesn't require all fields:
         {
@@ -121,11 +145,25 @@ class UserLogin(Resource):
         user = User.find_by_name(user_data.username)
 
         if user:
-            if user and check_password_hash(user.password, user_data.password):
+            try:
+                valid = password_hasher.check(user.password, user_data.password)
+            except HashingBusy:
+                return {"[ERROR]": HASHING_BUSY}, 429, {"Retry-After": "1"}
+            if valid:
+                # a hash of older method or cost is replaced while the password is known,
+                # when the pool is busy it is replaced on a later login
+                if password_hasher.needs_rehash(user.password):
+                    try:
+                        user.password = password_hasher.hash(user_data.password)
+                        with unit_of_work():
+                            user.add()
+                    except HashingBusy:
+                        pass
                 response = jsonify({"[INFO]": LOGIN_SUCCESSFUL})
-                access_token = create_access_token(identity=user.username)
+                with unit_of_work():
+                    access_token, refresh_token = issue_tokens(user.username)
                 set_access_cookies(response, access_token)
-                return 'Bearer ' + access_token, 200
+                return 'Bearer ' + access_token, 200, {"X-Refresh-Token": refresh_token}
 
             return {"[ERROR]": INVALID_CREDENTIALS}, 401
         else:
@@ -140,13 +178,42 @@ class UserLogout(Resource):
     @jwt_required()
     def post(cls):
         """
-        Log out the currently logged-in user
+        Log out the currently logged-in user, the access token
+        and the refresh tokens of the login are revoked.
         Headers: Authorization: Bearer access token
 
         :return: string info
         """
         try:
+            claims = get_jwt()
+            token_blocklist.revoke(claims["jti"], claims["exp"])
+            if "family" in claims:
+                with unit_of_work():
+                    revoke_family(claims["family"])
             unset_jwt_cookies(jsonify({"[INFO]": USER_LOGGED_OUT}))
             return {"[INFO]": USER_LOGGED_OUT}, 200
         except BadRequest:
             return {"[ERROR]": BAD_REQUEST}, 400
+
+
+class UserRefresh(Resource):
+    """
+    Class provides the post method to refresh the tokens.
+    """
+    @classmethod
+    @jwt_required(refresh=True)
+    def post(cls):
+        """
+        Get a new access token with a refresh token, without the password. The used
+        refresh token is revoked and a new one is in X-Refresh-Token header.
+        Headers: Authorization: Bearer refresh token
+
+        :return: Bearer access token
+        """
+        with unit_of_work():
+            tokens = rotate_tokens(get_jwt())
+        if tokens is None:
+            return {"[ERROR]": TOKEN_REVOKED}, 401
+
+        access_token, refresh_token = tokens
+        return 'Bearer ' + access_token, 200, {"X-Refresh-Token": refresh_token}
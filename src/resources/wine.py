@@ -2,28 +2,41 @@
 Module for wine resource. Provides the methods to get, post, patch and delete
 data related to wine. Some methods are jwt restricted.
 """
-import json
-from sqlite3 import IntegrityError, InternalError
 from flask_restful import Resource
 from flask_jwt_extended import jwt_required
-from flask import request
+from flask import current_app, request
 from marshmallow import ValidationError
+from sqlalchemy.exc import IntegrityError, InternalError
+from sqlalchemy.orm.attributes import set_committed_value
 from werkzeug.exceptions import BadRequest
 
+from src.database import unit_of_work
+from src.libs import codec
+from src.libs.bulk import import_wines, read_records
+from src.libs.cache import cached
+from src.libs.etag import etagged, precondition
+from src.libs.fields import fields_arg
 from src.libs.helpers import check_file_and_proper_naming, upload_file
+from src.libs.pagination import page_args, paginate
+from src.libs.references import reference_cache
+from src.libs.serializer import dumper
 from src.models.wine import Wine
 from src.models.grape import Grape
 from src.models.producer import Producer
 from src.models.wine_type import Wine_type
-from src.schemas.schemas import GrapeSchema, ProducerSchema, WineSchema
+from src.schemas.schemas import GrapeSchema, ProducerSchema, WineFilterSchema, WineSchema
 
 from src.utils.constants import \
-    ALREADY_EXISTS, NOT_JSON, ERROR_INSERTING, ERROR_DELETING, NOT_FOUND, BAD_REQUEST
+    ALREADY_EXISTS, NOT_JSON, ERROR_INSERTING, ERROR_DELETING, NOT_FOUND, BAD_REQUEST, UPLOAD_FAILED, \
+    INVALID_CURSOR
 
 grape_schema = GrapeSchema()
 producer_schema = ProducerSchema()
 wine_schema = WineSchema()
-wine_list_schema = WineSchema(many=True)
+wine_filter_schema = WineFilterSchema()
+
+# tables the wine representation is built from, region is used by the filters
+WINE_TABLES = ("wine", "wine_type", "producer", "grape", "region")
 
 
 class WineList(Resource):
@@ -31,13 +44,40 @@ class WineList(Resource):
     Class that provides the methods to get wines and post new wines.
     """
     @classmethod
+    @etagged(*WINE_TABLES)
+    @cached(*WINE_TABLES)
     def get(cls):
         """
-        Get a list of wines from database
+        Get a page of wines from database. Page size is given with
+        limit query parameter and the next page with cursor query parameter.
+        Wines are filtered with type, grape, producer, region, year_min, year_max,
+        abv_min and abv_max query parameters, and sorted with sort query parameter.
         :return: List of wines
         """
         try:
-            return {"wines": wine_list_schema.dump(Wine.find_all())}, 200
+            filters = wine_filter_schema.load(request.args)
+        except ValidationError as err:
+            return err.messages, 400
+
+        sort = filters.pop("sort", None)
+        try:
+            limit, after = page_args(with_value=sort is not None)
+            fields = fields_arg(WineSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        after_id, after_value = after, None
+        if sort is not None and after is not None:
+            after_value, after_id = after
+            python_type = getattr(Wine, sort.lstrip("-")).type.python_type
+            if after_value is not None and not isinstance(after_value, python_type) and \
+                    not (python_type is float and isinstance(after_value, int)):
+                return {"[ERROR]": INVALID_CURSOR}, 400
+
+        try:
+            wines = Wine.find_page(limit + 1, after_id, filters, sort, after_value, fields)
+            return paginate("wines", wines, limit, dumper(WineSchema, fields, many=True),
+                            sort_key=sort.lstrip("-") if sort else None)
         except BadRequest:
             return {"[ERROR]": BAD_REQUEST}, 400
 
@@ -76,14 +116,16 @@ class WineList(Resource):
         """
         file = request.files.get('file')
         try:
-            content = json.loads(request.form.get('data'))
+            content = codec.loads(request.form.get('data'))
         except BadRequest:
             return {"[ERROR]": NOT_JSON}, 415
 
         if file:
             if check_file_and_proper_naming(file):
-                file_url = upload_file(file)
-                content["picture"] = file_url
+                key = upload_file(file)
+                if key is None:
+                    return {"[ERROR]": UPLOAD_FAILED}, 500
+                content["picture"] = key
 
         try:
             wine = wine_schema.load(content)
@@ -93,39 +135,58 @@ class WineList(Resource):
         if Wine.find_by_name(content["name"]):
             return {"[INFO]": ALREADY_EXISTS}, 409
 
-        # checking if the user included wine_type
-        if "wine_type" in content:
+        # the existing rows are linked by id in place of the loaded objects, which are
+        # only inserted with the wine when their names do not exist yet
+        wine_type_id = reference_cache.find_id(Wine_type, wine.wine_type.type) if "wine_type" in content else None
+        grape_id = reference_cache.find_id(Grape, wine.grape.name) if "grape" in content else None
+        producer_id = reference_cache.find_id(Producer, wine.producer.name) if "producer" in content else None
+
+        if wine_type_id:
+            set_committed_value(wine, "wine_type", None)
+            wine.wine_type_id = wine_type_id
+        if grape_id:
+            set_committed_value(wine, "grape", None)
+            wine.grape_id = grape_id
+        if producer_id:
+            set_committed_value(wine, "producer", None)
+            wine.producer_id = producer_id
 
-            wine_type = Wine_type.find_by_type(wine.wine_type.type)
-
-            if wine_type:
-                wine.wine_type = None
-                wine.wine_type = wine_type
-
-        # checking if grape included
-        if "grape" in content:
-
-            grape = Grape.find_by_name(wine.grape.name)
+        try:
+            with unit_of_work():
+                wine.add()
+        except IntegrityError:
+            return {"[ERROR]": ERROR_INSERTING}, 500
 
-            if grape:
-                wine.grape = None
-                wine.grape = grape
+        return wine_schema.dump(wine), 201
 
-        # checking if producer included
-        if "producer" in content:
 
-            producer = Producer.find_by_name(wine.producer.name)
+class WineBulk(Resource):
+    """
+    Class that provides the method to import many wines at once.
+    """
+    @classmethod
+    @jwt_required()
+    def post(cls):
+        """
+        Import wines to database. Takes a JSON array or newline delimited
+        JSON of wines in the same format as the wine post data, without files.
+        Every record gets its own result, valid records are added even when
+        some of the others fail.
 
-            if producer:
-                wine.producer = None
-                wine.producer = producer
+        Headers: Authorization: Bearer access token
+        Request content-type: application/json or application/x-ndjson
 
+        :return: Counts of created and failed wines with the per record results
+        """
         try:
-            wine.add()
-        except IntegrityError:
-            return {"[ERROR]": ERROR_INSERTING}, 500
+            records = read_records()
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 415
 
-        return wine_schema.dump(wine), 201
+        results = import_wines(records, current_app.config["BULK_CHUNK_SIZE"])
+        failed = sum(1 for result in results if result["status"] != 201)
+        body = {"created": len(results) - failed, "failed": failed, "results": results}
+        return body, 207 if failed else 201
 
 
 class WineItem(Resource):
@@ -133,20 +194,28 @@ class WineItem(Resource):
     Class that provides the methods to get, delete and patch wine.
     """
     @classmethod
+    @etagged(*WINE_TABLES)
+    @cached(*WINE_TABLES)
     def get(cls, name):
         """
         Get one specific wine from database with given name
         :param name: string name for wine
         :return: Serialized Wine object as a JSON
         """
-        db_wine = Wine.find_by_name(name)
+        try:
+            fields = fields_arg(WineSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        db_wine = Wine.find_by_name(name, eager=True, fields=fields)
         if db_wine is not None:
-            return wine_schema.dump(db_wine), 200
+            return dumper(WineSchema, fields)(db_wine), 200
         else:
             return {"[INFO]": NOT_FOUND}, 404
 
     @classmethod
     @jwt_required()
+    @precondition(*WINE_TABLES)
     def delete(cls, name):
         """
         Delete one specific wine from database with given name
@@ -158,7 +227,8 @@ class WineItem(Resource):
         item = Wine.find_by_name(name)
         if item:
             try:
-                item.delete()
+                with unit_of_work():
+                    item.delete()
                 return {"[INFO]": "{} deleted".format(item.name)}, 200
             except InternalError:
                 return {"[ERROR]": ERROR_DELETING}, 500
@@ -167,6 +237,7 @@ class WineItem(Resource):
 
     @classmethod
     @jwt_required()
+    @precondition(*WINE_TABLES)
     def patch(cls, name):
         """
         Update the existing wine in the database by given name.
@@ -201,7 +272,7 @@ class WineItem(Resource):
         """
         file = request.files.get('file')
         try:
-            content = json.loads(request.form.get('data'))
+            content = codec.loads(request.form.get('data'))
         except BadRequest:
             return {"[ERROR]": NOT_JSON}, 400
 
@@ -215,14 +286,16 @@ class WineItem(Resource):
             except ValidationError as err:
                 return err.messages, 400
 
+            if wine.name != item.name and Wine.find_by_name(wine.name):
+                return {"[INFO]": ALREADY_EXISTS}, 409
+
             item.name = wine.name
 
             if wine.wine_type:
-                try:
-                    wine_type = Wine_type.find_by_type(wine.wine_type.type)
-                    item.wine_type_id = wine_type.id
-                except AttributeError:
-                    return{"[ERROR]": "Wine_type not found"}, 404
+                wine_type_id = reference_cache.find_id(Wine_type, wine.wine_type.type)
+                if wine_type_id is None:
+                    return {"[ERROR]": "Wine_type not found"}, 404
+                item.wine_type_id = wine_type_id
             
             if wine.style:
                 item.style = wine.style
@@ -231,18 +304,16 @@ class WineItem(Resource):
                 item.description = wine.description
 
             if wine.grape:
-                try:
-                    grape = Grape.find_by_name(wine.grape.name)
-                    item.grape_id = grape.id
-                except AttributeError:
+                grape_id = reference_cache.find_id(Grape, wine.grape.name)
+                if grape_id is None:
                     return {"[ERROR]": "Grape not found"}, 404
+                item.grape_id = grape_id
 
             if wine.producer:
-                try:
-                    producer = Producer.find_by_name(wine.producer.name)
-                    item.producer_id = producer.id
-                except AttributeError:
+                producer_id = reference_cache.find_id(Producer, wine.producer.name)
+                if producer_id is None:
                     return {"ERROR": "Producer not found"}, 404
+                item.producer_id = producer_id
                 
             if wine.year_produced:
                 item.year_produced = wine.year_produced
@@ -255,14 +326,17 @@ class WineItem(Resource):
             
             if file:
                 if check_file_and_proper_naming(file):
-                    file_url = upload_file(file)
-                    item.picture = file_url
+                    key = upload_file(file)
+                    if key is None:
+                        return {"[ERROR]": UPLOAD_FAILED}, 500
+                    item.picture = key
         
         else:
             return {"[ERROR]": "Wine not found"}, 404
             
         try:
-            item.add()
+            with unit_of_work():
+                item.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
 
@@ -2,20 +2,27 @@
 Module for wine type resource. Provides the methods to get, post, patch and delete
 data related to wine type. Some methods are jwt restricted.
 """
-from sqlite3 import IntegrityError, InternalError
-
 from flask_jwt_extended import jwt_required
 from marshmallow import ValidationError
 from flask_restful import Resource
 from flask import request
+from sqlalchemy.exc import IntegrityError, InternalError
 from werkzeug.exceptions import BadRequest
 
+from src.database import unit_of_work
+from src.libs.cache import cached
+from src.libs.etag import etagged, precondition
+from src.libs.fields import fields_arg
+from src.libs.pagination import page_args, paginate
+from src.libs.serializer import dumper
 from src.models.wine_type import Wine_type
 from src.schemas.schemas import WineTypeSchema
 from src.utils.constants import NOT_JSON, ERROR_INSERTING, NOT_FOUND, ERROR_DELETING, BAD_REQUEST
 
 wine_type_schema = WineTypeSchema()
-wine_type_list_schema = WineTypeSchema(many=True)
+
+# tables the wine type representation is built from
+WINE_TYPE_TABLES = ("wine_type", "wine", "producer", "grape")
 
 
 # noinspection DuplicatedCode
@@ -24,13 +31,23 @@ class Wine_typeList(Resource):
     Class that provides the methods to get wine types and post new wine types.
     """
     @classmethod
+    @etagged(*WINE_TYPE_TABLES)
+    @cached(*WINE_TYPE_TABLES)
     def get(cls):
         """
-        Get a list of wine types from database
+        Get a page of wine types from database. Page size is given with
+        limit query parameter and the next page with cursor query parameter.
         :return: List of wine types
         """
         try:
-            return {"wine_types": wine_type_list_schema.dump(Wine_type.find_all())}, 200
+            limit, after_id = page_args()
+            fields = fields_arg(WineTypeSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        try:
+            wine_types = Wine_type.find_page(limit + 1, after_id, fields)
+            return paginate("wine_types", wine_types, limit, dumper(WineTypeSchema, fields, many=True))
         except BadRequest:
             return {"[ERROR]": BAD_REQUEST}, 400
 
@@ -67,7 +84,8 @@ class Wine_typeList(Resource):
 
         # try to add new type to db
         try:
-            item.add()
+            with unit_of_work():
+                item.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
 
@@ -79,20 +97,28 @@ class Wine_typeItem(Resource):
     Class that provides the methods to get, delete and patch wine type.
     """
     @classmethod
+    @etagged(*WINE_TYPE_TABLES)
+    @cached(*WINE_TYPE_TABLES)
     def get(cls, name):
         """
         Get one specific wine type from database with given name
         :param name: string name for wine type
         :return: Serialized Wine_type object as a JSON
         """
-        db_wine_type = Wine_type.find_by_type(name)
+        try:
+            fields = fields_arg(WineTypeSchema)
+        except ValueError as err:
+            return {"[ERROR]": str(err)}, 400
+
+        db_wine_type = Wine_type.find_by_type(name, eager=True, fields=fields)
         if db_wine_type is not None:
-            return wine_type_schema.dump(db_wine_type), 200
+            return dumper(WineTypeSchema, fields)(db_wine_type), 200
         else:
             return {"[INFO]": NOT_FOUND}, 404
 
     @classmethod
     @jwt_required()
+    @precondition(*WINE_TYPE_TABLES)
     def delete(cls, name):
         """
         Delete one specific wine type from database with given name
@@ -105,7 +131,8 @@ class Wine_typeItem(Resource):
 
         if item:
             try:
-                item.delete()
+                with unit_of_work():
+                    item.delete()
                 return {"[INFO]": "{} deleted".format(item.type)}, 200
             except InternalError:
                 return {"[ERROR]": ERROR_DELETING}, 500
@@ -114,6 +141,7 @@ class Wine_typeItem(Resource):
 
     @classmethod
     @jwt_required()
+    @precondition(*WINE_TYPE_TABLES)
     def patch(cls, name):
         """
         Update the existing wine type in the database by given name.
@@ -140,12 +168,16 @@ class Wine_typeItem(Resource):
             except ValidationError as err:
                 return err.messages, 400
 
+            if wine_type.type != item.type and Wine_type.find_by_type(wine_type.type):
+                return {"[INFO]": "Wine type already exits"}, 409
+
             item.type = wine_type.type
         else:
             return {"[ERROR]": "Wine type not found"}, 404
 
         try:
-            item.add()
+            with unit_of_work():
+                item.add()
         except IntegrityError:
             return {"[ERROR]": ERROR_INSERTING}, 500
 
@@ -3,9 +3,10 @@ Module that contains the schemas for validating the data.
 """
 from datetime import date
 
-from marshmallow import fields, Schema, post_load
+from marshmallow import EXCLUDE, fields, Schema, post_load
 from marshmallow.validate import Regexp, Length, Range, OneOf
 
+from src.libs.timing import timed
 from src.models.country import Country
 from src.models.grape import Grape
 from src.models.producer import Producer
@@ -19,7 +20,35 @@ password_regex = Regexp(r'^(?=.*?[A-Z])(?=.*?[a-z])(?=.*?[0-9])(?=.*?[#?!@$%^&*-
 current_date = date.today()
 
 
-class UserSchema(Schema):
+class PictureUrl(fields.Str):
+    """
+    String field for the wine picture. Pictures are stored as S3 Bucket keys
+    and a presigned url is dumped for them, other values are dumped as they are.
+    """
+    def _serialize(self, value, attr, obj, **kwargs):
+        # imported here since the helpers read the config, which imports these schemas
+        from src.libs.helpers import get_file_url, is_file_key
+
+        if value is not None and is_file_key(value):
+            return get_file_url(value)
+        return super()._serialize(value, attr, obj, **kwargs)
+
+
+class TimedSchema(Schema):
+    """
+    Base schema which adds the time of dump and load to the request timings,
+    see src.libs.timing. Nested schemas are counted in the outer schema.
+    """
+    def dump(self, obj, *, many=None):
+        with timed("serialize"):
+            return super().dump(obj, many=many)
+
+    def load(self, data, *, many=None, partial=None, unknown=None):
+        with timed("serialize"):
+            return super().load(data, many=many, partial=partial, unknown=unknown)
+
+
+class UserSchema(TimedSchema):
     """
     User schema which validates the user fields. Contains some regex validation for
     email and password. Returns user object on load method. Password is load only,
@@ -42,7 +71,7 @@ class UserSchema(Schema):
         return User(**data)
 
 
-class WineSchema(Schema):
+class WineSchema(TimedSchema):
     """
     Wine schema which validates the wine fields. Uses nested schemas for
     producer, wine type and grape where it provides name or type only.
@@ -57,7 +86,7 @@ class WineSchema(Schema):
     year_produced = fields.Int(validate=Range(min=1867, max=current_date.year))
     alcohol_percentage = fields.Float(metadata={"precision": 2})
     volume = fields.Int(validate=Range(min=187, max=1500), load_default=750)
-    picture = fields.Str(validate=Length(max=500))
+    picture = PictureUrl(validate=Length(max=500))
     description = fields.Str(validate=Length(max=500))
     grape = fields.Nested(lambda: GrapeSchema(only=('name',)))
 
@@ -72,7 +101,43 @@ class WineSchema(Schema):
         return Wine(**data)
 
 
-class WineTypeSchema(Schema):
+class WineImportSchema(WineSchema):
+    """
+    Wine schema for the bulk import. Validates the same fields
+    as the wine schema but loads a dict instead of Wine object.
+    """
+    @post_load
+    def make_wine(self, data, **kwargs):
+        """
+        Keep the loaded data as a dict
+        :param data: input data
+        :param kwargs: not used but must be included
+        :return: dict of wine fields
+        """
+        return data
+
+
+class WineFilterSchema(TimedSchema):
+    """
+    Wine filter schema which validates the query parameters of the wine collection.
+    Sort keys are limited to the indexed columns, - prefix sorts in descending order.
+    Other query parameters, such as the page limit and cursor, are left out.
+    """
+    type = fields.Str(validate=Length(max=64))
+    grape = fields.Str(validate=Length(max=64))
+    producer = fields.Str(validate=Length(max=128))
+    region = fields.Str(validate=Length(max=128))
+    year_min = fields.Int()
+    year_max = fields.Int()
+    abv_min = fields.Float()
+    abv_max = fields.Float()
+    sort = fields.Str(validate=OneOf(Wine.SORT_KEYS + tuple("-" + key for key in Wine.SORT_KEYS)))
+
+    class Meta:
+        unknown = EXCLUDE
+
+
+class WineTypeSchema(TimedSchema):
     """
     Wine type schema which validates the wine type fields.
     Nested schema for wines excludes the wine_type to avoid loops.
@@ -92,7 +157,7 @@ class WineTypeSchema(Schema):
         return Wine_type(**data)
 
 
-class ProducerSchema(Schema):
+class ProducerSchema(TimedSchema):
     """
     Producer schema which validates the producer fields.
     Nested schema for region contains only name and
@@ -115,7 +180,7 @@ class ProducerSchema(Schema):
         return Producer(**data)
 
 
-class CountrySchema(Schema):
+class CountrySchema(TimedSchema):
     """
     Country schema which validates the country fields.
     Nested schema for regions excludes the country to avoid loops.
@@ -135,7 +200,7 @@ class CountrySchema(Schema):
         return Country(**data)
 
 
-class GrapeSchema(Schema):
+class GrapeSchema(TimedSchema):
     """
     Grape schema which validates the grape fields.
     Nested schema for region contains only name and
@@ -158,7 +223,7 @@ class GrapeSchema(Schema):
         return Grape(**data)
 
 
-class RegionSchema(Schema):
+class RegionSchema(TimedSchema):
     """
     Region schema which validates the region fields.
     Nested schema for country contains only name, and
@@ -6,6 +6,8 @@ USER_DELETED = "User deleted."
 INVALID_CREDENTIALS = "Invalid credentials, either username or password isn't correct!"
 USER_LOGGED_OUT = "Successfully logged out."
 LOGIN_SUCCESSFUL = "Login successful."
+TOKEN_REVOKED = "Refresh token has been revoked, log in again."
+HASHING_BUSY = "Too many logins at the moment, try again shortly."
 
 # Database related constants
 ERROR_INSERTING = "Could not add to database."
@@ -16,7 +18,15 @@ BAD_REQUEST = "Something went wrong"
 
 # Request related constants
 NOT_JSON = "Request must be JSON."
+INVALID_CURSOR = "Page cursor is not valid."
+INVALID_LIMIT = "Page limit must be an integer between 1 and {}."
+PRECONDITION_FAILED = "Item has been modified, fetch it again before modifying."
+INVALID_FIELDS = "Fields must be a comma separated list of: {}."
+INVALID_RECORD = "Record must be a JSON object."
+EMPTY_SEARCH = "Search query must contain at least one word."
+INVALID_EXPORT_FORMAT = "Export format must be one of {}."
 
 # Image related constants
 NO_FILE = "Not a file."
+UPLOAD_FAILED = "Picture could not be uploaded."
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
@@ -5,8 +5,11 @@ import pytest as pytest
 from flask import Flask
 from werkzeug.security import generate_password_hash
 
-from src.app import app
+from src.app import app, jwt
 from src.database import db
+from src.libs.blocklist import token_blocklist
+from src.libs.cache import response_cache
+from src.libs.references import reference_cache
 from src.models.country import Country
 from src.models.grape import Grape
 from src.models.producer import Producer
@@ -68,7 +71,7 @@ def _populate_db():
 
 
 @pytest.fixture
-def client():
+def client(tmp_path):
     """Configures the app for testing
 
     :return: App for testing
@@ -77,10 +80,15 @@ def client():
     app.config["TESTING"] = True
     app.config["DEBUG"] = False
     app.config["JWT_SECRET_KEY"] = "testing"
+    # revocations of other tests and runs are not shared through the blocklist file
+    app.config["JWT_BLOCKLIST_PATH"] = str(tmp_path / "blocklist.db")
+    token_blocklist.init_app(app, jwt)
     db_fd, db_fname = tempfile.mkstemp()
     app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///" + db_fname
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
     db.init_app(app)
+    response_cache.clear()
+    reference_cache.clear()
 
     db.create_all()
     _populate_db()
@@ -0,0 +1,60 @@
+"""
+Module for AWS S3 bucket testing.
+"""
+import pytest
+from botocore.exceptions import ClientError
+from botocore.stub import Stubber
+
+from src.libs.aws import AwsBucket
+
+
+@pytest.fixture
+def bucket():
+    bucket = AwsBucket(bucket_name="test-bucket")
+    with Stubber(bucket.s3) as stubber:
+        yield bucket, stubber
+
+
+def _listing(keys, next_token=None):
+    page = {"Contents": [{"Key": key} for key in keys], "KeyCount": len(keys),
+            "IsTruncated": next_token is not None}
+    if next_token is not None:
+        page["NextContinuationToken"] = next_token
+    return page
+
+
+def test_iter_file_urls_follows_continuation_tokens(bucket):
+    bucket, stubber = bucket
+    keys = ["picture-{}.png".format(i) for i in range(5)]
+    stubber.add_response("list_objects_v2", _listing(keys[:3], "token"),
+                         {"Bucket": "test-bucket", "MaxKeys": 3})
+    stubber.add_response("list_objects_v2", _listing(keys[3:]),
+                         {"Bucket": "test-bucket", "MaxKeys": 3, "ContinuationToken": "token"})
+
+    assert list(bucket.iter_file_keys(page_size=3)) == keys
+    stubber.assert_no_pending_responses()
+
+
+def test_iter_file_urls_signs_in_batches(bucket):
+    bucket, stubber = bucket
+    keys = ["picture-{}.png".format(i) for i in range(7)]
+    stubber.add_response("list_objects_v2", _listing(keys), {"Bucket": "test-bucket", "MaxKeys": 1000})
+
+    urls = list(bucket.iter_file_urls(batch_size=3, workers=2))
+    assert len(urls) == len(keys)
+    for key, url in zip(keys, urls):
+        assert key in url and "Signature" in url
+
+
+def test_get_file_urls_empty_and_failing_bucket(bucket):
+    bucket, stubber = bucket
+    stubber.add_response("list_objects_v2", {"KeyCount": 0, "IsTruncated": False},
+                         {"Bucket": "test-bucket", "MaxKeys": 1000})
+    stubber.add_client_error("list_objects_v2", "NoSuchBucket")
+
+    assert bucket.get_file_urls() == []
+    assert bucket.get_file_urls() is None
+
+    stubber.add_client_error("list_objects_v2", "NoSuchBucket")
+    with pytest.raises(ClientError):
+        list(bucket.iter_file_urls())
@@ -1,10 +1,44 @@
 """
 Module for API testing
 """
+import csv
+import gzip
 import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
 from copy import deepcopy
-
-from src.schemas.schemas import WineSchema
+from io import BytesIO
+
+import brotli
+import pytest
+import zstandard
+from botocore.exceptions import ClientError
+from flask_jwt_extended import JWTManager
+from marshmallow import post_dump
+from sqlalchemy import event
+
+from src.app import export_catalog_cmd, populate_database_cmd
+from src.database import db
+from src.libs import codec, compression, helpers
+from src.libs.blocklist import TokenBlocklist
+from src.libs.cache import response_cache
+from src.libs.passwords import password_hasher
+from src.libs.serializer import compile_dump, dumper
+from src.models.country import Country
+from src.models.grape import Grape
+from src.models.producer import Producer
+from src.models.region import Region
+from src.models.table_version import TableVersion
+from src.models.user import User
+from src.models.wine import Wine
+from src.models.wine_type import Wine_type
+from src.schemas.schemas import CountrySchema, GrapeSchema, ProducerSchema, RegionSchema, UserSchema, \
+    WineSchema, WineTypeSchema
 from test.conftest import client  # pylint: disable=unused-import
 
 wine_schema = WineSchema()
@@ -30,6 +64,45 @@ def _get_resource(client, resource_url):
     return json.loads(response.data)
 
 
+@contextmanager
+def _count_queries():
+    statements = []
+
+    def _before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, "before_cursor_execute", _before_cursor_execute)
+
+
+def _add_catalog_rows(count):
+    for i in range(count):
+        country = Country(name='extra country {}'.format(i))
+        region = Region(name='extra region {}'.format(i), country=country)
+        grape = Grape(name='extra grape {}'.format(i), description='extra', region=region)
+        producer = Producer(name='extra producer {}'.format(i), description='extra', region=region)
+        wine_type = Wine_type(type='extra type {}'.format(i))
+        for j in range(2):
+            db.session.add(Wine(name='extra wine {} {}'.format(i, j), wine_type=wine_type,
+                                producer=producer, grape=grape))
+    db.session.commit()
+
+
+def _add_related_rows(count):
+    # producers and grapes of one region with a wine each, more than the
+    # 500 keys a selectin loader sends in one IN list
+    region = Region.find_by_name("test region 1")
+    wine_type = Wine_type.find_by_type("test type 1")
+    for i in range(count):
+        grape = Grape(name='related grape {}'.format(i), description='related', region=region)
+        producer = Producer(name='related producer {}'.format(i), description='related', region=region)
+        db.session.add(Wine(name='related wine {}'.format(i), wine_type=wine_type, producer=producer, grape=grape))
+    db.session.commit()
+
+
 def test_homepage(client):
     response = client.get('/')
     homepage = response.data.decode()
@@ -59,6 +132,103 @@ class TestWineCollection(object):
             assert "style" in wine
             assert "alcohol_percentage" in wine
 
+    def test_get_paginated(self, client):
+        response = client.get(self.RESOURCE_URL + "?limit=2")
+        assert response.status_code == 200
+        body = json.loads(response.data)
+        assert [wine["name"] for wine in body["wines"]] == ["test wine 1", "test wine 2"]
+        assert 'rel="next"' in response.headers["Link"]
+
+        response = client.get(self.RESOURCE_URL + "?limit=2&cursor=" + body["next"])
+        assert response.status_code == 200
+        body = json.loads(response.data)
+        assert [wine["name"] for wine in body["wines"]] == ["test wine 3"]
+        assert "next" not in body
+        assert "Link" not in response.headers
+
+    def test_get_invalid_page(self, client):
+        response = client.get(self.RESOURCE_URL + "?cursor=not-a-cursor")
+        assert response.status_code == 400
+        response = client.get(self.RESOURCE_URL + "?limit=0")
+        assert response.status_code == 400
+
+    def test_get_filtered(self, client):
+        _add_catalog_rows(2)
+        for i, wine in enumerate(Wine.query.order_by(Wine.id)):
+            wine.year_produced = 2000 + i
+            wine.alcohol_percentage = 10 + i / 2
+        db.session.commit()
+
+        def names(query):
+            response = client.get(self.RESOURCE_URL + query)
+            assert response.status_code == 200
+            return [wine["name"] for wine in json.loads(response.data)["wines"]]
+
+        assert names("?type=test type 2") == ["test wine 2"]
+        assert names("?grape=extra grape 1") == ["extra wine 1 0", "extra wine 1 1"]
+        assert names("?producer=extra producer 0&year_min=2004") == ["extra wine 0 1"]
+        assert names("?region=test region 3") == ["test wine 3"]
+        assert names("?year_min=2001&year_max=2003") == ["test wine 2", "test wine 3", "extra wine 0 0"]
+        assert names("?abv_min=11.5&abv_max=12") == ["extra wine 0 0", "extra wine 0 1"]
+        assert names("?type=unknown") == []
+
+    def test_get_sorted(self, client):
+        _add_catalog_rows(2)
+        years = [2010, None, 2005, 2010, None, 2001, 2005]
+        for wine, year in zip(Wine.query.order_by(Wine.id), years):
+            wine.year_produced = year
+        db.session.commit()
+
+        def pages(query):
+            names, url = [], self.RESOURCE_URL + query
+            while url:
+                response = client.get(url)
+                assert response.status_code == 200
+                body = json.loads(response.data)
+                names.extend(wine["name"] for wine in body["wines"])
+                url = self.RESOURCE_URL + query + "&cursor=" + body["next"] if "next" in body else None
+            return names
+
+        ascending = ["test wine 2", "extra wine 0 1", "extra wine 1 0", "test wine 3",
+                     "extra wine 1 1", "test wine 1", "extra wine 0 0"]
+        assert pages("?sort=year_produced&limit=2") == ascending
+        assert pages("?sort=-year_produced&limit=2") == ascending[::-1]
+        assert pages("?sort=year_produced&limit=3") == ascending
+        assert pages("?sort=-year_produced&limit=3") == ascending[::-1]
+        assert pages("?sort=-name&limit=3") == sorted(ascending, reverse=True)
+        assert pages("?sort=alcohol_percentage&limit=3&year_min=2005") == \
+            ["extra wine 0 0", "extra wine 1 1", "test wine 1", "test wine 3"]
+
+    def test_get_invalid_filter(self, client):
+        response = client.get(self.RESOURCE_URL + "?sort=description")
+        assert response.status_code == 400
+        assert "sort" in json.loads(response.data)
+        response = client.get(self.RESOURCE_URL + "?year_min=old")
+        assert response.status_code == 400
+        cursor = json.loads(client.get(self.RESOURCE_URL + "?sort=name&limit=1").data)["next"]
+        response = client.get(self.RESOURCE_URL + "?sort=year_produced&cursor=" + cursor)
+        assert response.status_code == 400
+        response = client.get(self.RESOURCE_URL + "?sort=name&cursor=eyJpZCI6MX0")
+        assert response.status_code == 400
+
+    def test_get_fields(self, client):
+        with _count_queries() as statements:
+            response = client.get(self.RESOURCE_URL + "?fields=name,wine_type&sort=-year_produced")
+        assert response.status_code == 200
+        body = json.loads(response.data)
+        assert len(body["wines"]) == 3
+        for wine in body["wines"]:
+            assert set(wine) == {"name", "wine_type"}
+            assert "type" in wine["wine_type"]
+        selected = " ".join(s for s in statements if s.lstrip().upper().startswith("SELECT"))
+        assert "wine.description" not in selected
+        assert "producer" not in selected and "grape" not in selected
+
+        response = client.get(self.RESOURCE_URL + "?fields=name,password")
+        assert response.status_code == 400
+        response = client.get(self.RESOURCE_URL + "?fields=")
+        assert response.status_code == 400
+
     def test_post(self, client):
         request_data = {
             "name": "test",
@@ -98,6 +268,96 @@ class TestWineCollection(object):
         assert body["producer"]["name"] == request_data["producer"]["name"]
         assert body["grape"]["name"] == request_data["grape"]["name"]
 
+    def test_post_existing_relations(self, client):
+        request_data = {
+            "name": "wine of existing relations",
+            "wine_type": {"type": "test type 1"},
+            "producer": {"name": "test producer 2"},
+            "grape": {"name": "test grape 3"}
+        }
+        headers = _get_access_token_header(client)
+        response = client.post(self.RESOURCE_URL, data={'data': json.dumps(request_data)}, headers=headers)
+        assert response.status_code == 201
+        assert Grape.query.count() == 3
+        wine = Wine.find_by_name("wine of existing relations")
+        assert wine.grape.name == "test grape 3" and wine.producer.name == "test producer 2"
+
+    def test_post_picture_key(self, client, monkeypatch):
+        signed = []
+        sign = helpers.s3.s3.generate_presigned_url
+        monkeypatch.setattr(helpers.s3.s3, "generate_presigned_url",
+                            lambda *args, **kwargs: signed.append(args) or sign(*args, **kwargs))
+
+        headers = _get_access_token_header(client)
+        data = {
+            'data': json.dumps({"name": "picture wine", "picture": "picture-wine.png"}),
+            'file': None
+        }
+        response = client.post(self.RESOURCE_URL, data=data, headers=headers)
+        assert response.status_code == 201
+        picture = json.loads(response.data)["picture"]
+        assert picture.startswith("https://") and "picture-wine.png" in picture
+        assert Wine.find_by_name("picture wine").picture == "picture-wine.png"
+
+        wine = _get_resource(client, self.RESOURCE_URL + "/picture%20wine")
+        assert wine["picture"] == picture
+        assert len(signed) == 1
+
+    def test_post_file_upload(self, client, monkeypatch):
+        uploads = []
+        monkeypatch.setattr(helpers.s3.s3, "put_object", lambda **kwargs: uploads.append(kwargs))
+
+        headers = _get_access_token_header(client)
+        data = {
+            'data': json.dumps({"name": "upload wine"}),
+            'file': (BytesIO(b"picture bytes"), "upload wine.png", "image/png")
+        }
+        response = client.post(self.RESOURCE_URL, data=data, headers=headers)
+        assert response.status_code == 201
+        assert uploads[0]["Key"] == "upload_wine.png"
+        assert uploads[0]["Body"] == b"picture bytes"
+        assert uploads[0]["ContentType"] == "image/png"
+        assert Wine.find_by_name("upload wine").picture == "upload_wine.png"
+
+    def test_post_large_file_upload(self, client, monkeypatch):
+        uploads = []
+        monkeypatch.setitem(client.application.config, "UPLOAD_SPOOL_SIZE", 4)
+        monkeypatch.setattr(helpers.s3, "spool_size", 4)
+        monkeypatch.setattr(helpers.s3.s3, "upload_fileobj",
+                            lambda stream, bucket, key, **kwargs: uploads.append((key, stream.read())))
+
+        headers = _get_access_token_header(client)
+        data = {
+            'data': json.dumps({"name": "upload wine"}),
+            'file': (BytesIO(b"picture bytes"), "upload.png")
+        }
+        response = client.post(self.RESOURCE_URL, data=data, headers=headers)
+        assert response.status_code == 201
+        assert uploads == [("upload.png", b"picture bytes")]
+
+    def test_post_file_too_large(self, client, monkeypatch):
+        monkeypatch.setitem(client.application.config, "UPLOAD_MAX_SIZE", 1024)
+        headers = _get_access_token_header(client)
+        data = {
+            'data': json.dumps({"name": "upload wine"}),
+            'file': (BytesIO(b"x" * 2048), "upload.png")
+        }
+        response = client.post(self.RESOURCE_URL, data=data, headers=headers)
+        assert response.status_code == 413
+
+    def test_post_file_upload_failed(self, client, monkeypatch):
+        def put_object(**kwargs):
+            raise ClientError({"Error": {"Code": "500"}}, "PutObject")
+        monkeypatch.setattr(helpers.s3.s3, "put_object", put_object)
+
+        headers = _get_access_token_header(client)
+        data = {
+            'data': json.dumps({"name": "upload wine"}),
+            'file': (BytesIO(b"picture bytes"), "upload.png")
+        }
+        response = client.post(self.RESOURCE_URL, data=data, headers=headers)
+        assert response.status_code == 500
+
     def test_invalid_data_post(self, client):
         headers = _get_access_token_header(client)
         data = {
@@ -197,6 +457,13 @@ class TestWineItem(object):
         response = client.patch(self.FAKE_URL, data=self.data, headers=headers)
         assert response.status_code == 404
 
+    def test_patch_existing_name(self, client):
+        data = {"data": json.dumps({"name": "test wine 2"}), "file": None}
+        headers = _get_access_token_header(client)
+        response = client.patch(self.WINE_URL, data=data, headers=headers)
+        assert response.status_code == 409
+        assert _get_resource(client, self.WINE_URL)["name"] == "test wine 1"
+
     def test_patch_producer_not_found(self, client):
         request_data = {
             "producer": {
@@ -225,6 +492,116 @@ class TestWineItem(object):
         assert response.status_code == 401
 
 
+class TestWineBulk(object):
+
+    RESOURCE_URL = "/api/wines/bulk"
+
+    def test_post_json_array(self, client):
+        headers = _get_access_token_header(client)
+        records = [
+            {"name": "bulk wine 1", "wine_type": {"type": "test type 1"},
+             "grape": {"name": "new grape"}, "producer": {"name": "new producer"}},
+            {"name": "bulk wine 2", "grape": {"name": "new grape"}, "year_produced": 2015},
+        ]
+        response = client.post(self.RESOURCE_URL, json=records, headers=headers)
+        assert response.status_code == 201
+        body = json.loads(response.data)
+        assert body["created"] == 2
+        assert [result["status"] for result in body["results"]] == [201, 201]
+
+        wine = _get_resource(client, "/api/wines/bulk wine 1")
+        assert wine["grape"]["name"] == "new grape"
+        assert wine["producer"]["name"] == "new producer"
+        assert wine["wine_type"]["type"] == "test type 1"
+        assert wine["volume"] == 750
+        assert Grape.query.filter_by(name="new grape").count() == 1
+        assert _get_resource(client, "/api/wines/bulk wine 2")["year_produced"] == 2015
+
+    def test_post_over_upload_limit(self, client, monkeypatch):
+        monkeypatch.setitem(client.application.config, "UPLOAD_MAX_SIZE", 1024)
+        headers = _get_access_token_header(client)
+        records = [{"name": "large import wine {}".format(i), "description": "x" * 100} for i in range(20)]
+        response = client.post(self.RESOURCE_URL, json=records, headers=headers)
+        assert response.status_code == 201
+        assert json.loads(response.data)["created"] == 20
+
+    def test_post_ndjson_partial_failure(self, client):
+        headers = _get_access_token_header(client)
+        lines = [
+            json.dumps({"name": "bulk wine 1"}),
+            "{not json",
+            json.dumps({"name": "test wine 1"}),
+            json.dumps({"name": "bulk wine 1"}),
+            json.dumps({"name": "bulk wine 2", "volume": 5}),
+            "",
+            json.dumps({"name": "bulk wine 3", "producer": {"name": "test producer 2"}}),
+        ]
+        client.application.config["BULK_CHUNK_SIZE"] = 2
+        try:
+            response = client.post(self.RESOURCE_URL, data="\n".join(lines),
+                                   content_type="application/x-ndjson", headers=headers)
+        finally:
+            client.application.config["BULK_CHUNK_SIZE"] = 500
+        assert response.status_code == 207
+        body = json.loads(response.data)
+        assert body["created"] == 2
+        assert body["failed"] == 4
+        assert [result["status"] for result in body["results"]] == [201, 400, 409, 409, 400, 201]
+        assert [result["index"] for result in body["results"]] == list(range(6))
+        assert "volume" in body["results"][4]["errors"]
+        assert len(_get_resource(client, "/api/wines")["wines"]) == 5
+
+    def test_post_concurrent_duplicate(self, client, monkeypatch):
+        # a wine of the same name inserted by another request after the duplicate check
+        calls = []
+        find_existing_names = Wine.find_existing_names
+
+        def missed_duplicate_check(names):
+            calls.append(names)
+            return set() if len(calls) == 1 else find_existing_names(names)
+        monkeypatch.setattr(Wine, "find_existing_names", missed_duplicate_check)
+        headers = _get_access_token_header(client)
+        records = [{"name": "bulk wine 1"}, {"name": "test wine 1"}, {"name": "bulk wine 2"}]
+        response = client.post(self.RESOURCE_URL, json=records, headers=headers)
+        assert response.status_code == 207
+        body = json.loads(response.data)
+        assert body["created"] == 2
+        assert [result["status"] for result in body["results"]] == [201, 409, 201]
+        assert _get_resource(client, "/api/wines/bulk wine 2")["name"] == "bulk wine 2"
+
+    def test_post_is_batched(self, client):
+        headers = _get_access_token_header(client)
+        records = [{"name": "bulk wine {}".format(i), "grape": {"name": "bulk grape {}".format(i % 3)},
+                    "wine_type": {"type": "test type 2"}} for i in range(50)]
+        with _count_queries() as statements:
+            response = client.post(self.RESOURCE_URL, json=records, headers=headers)
+        assert response.status_code == 201
+        assert len([s for s in statements if s.lstrip().upper().startswith("INSERT INTO WINE ")]) == 1
+        assert len(statements) < 15
+
+    def test_post_invalidates_cache(self, client):
+        headers = _get_access_token_header(client)
+        assert len(_get_resource(client, "/api/wines")["wines"]) == 3
+        client.post(self.RESOURCE_URL, json=[{"name": "bulk wine"}], headers=headers)
+        assert len(_get_resource(client, "/api/wines")["wines"]) == 4
+
+    def test_invalid_data_post(self, client):
+        headers = _get_access_token_header(client)
+        response = client.post(self.RESOURCE_URL, json={"name": "bulk wine"}, headers=headers)
+        assert response.status_code == 415
+        response = client.post(self.RESOURCE_URL, data="name", headers=headers)
+        assert response.status_code == 415
+
+    def test_no_auth_post(self, client):
+        response = client.post(self.RESOURCE_URL, json=[{"name": "bulk wine"}])
+        assert response.status_code == 401
+
+    def test_wine_named_bulk(self, client):
+        db.session.add(Wine(name="bulk"))
+        db.session.commit()
+        assert client.get(self.RESOURCE_URL).status_code == 200
+
+
 class TestWine_typeCollection(object):
 
     RESOURCE_URL = "/api/wine_types"
@@ -321,6 +698,12 @@ class TestWine_typeItem(object):
         response = client.patch(self.FAKE_URL, json=self.request_data, headers=headers)
         assert response.status_code == 404
 
+    def test_patch_existing_type(self, client):
+        headers = _get_access_token_header(client)
+        response = client.patch(self.WINE_TYPE_URL, json={"type": "test type 2"}, headers=headers)
+        assert response.status_code == 409
+        assert _get_resource(client, self.WINE_TYPE_URL)["type"] == "test type 1"
+
     def test_patch_validation_error(self, client):
         request_data = {
             "description": "test validation fail"
@@ -413,6 +796,13 @@ class TestProducerItem(object):
         response = client.get(self.FAKE_URL)
         assert response.status_code == 404
 
+    def test_get_fields(self, client):
+        response = client.get(self.PRODUCER_URL + "?fields=name,region")
+        assert response.status_code == 200
+        assert set(json.loads(response.data)) == {"name", "region"}
+        response = client.get(self.PRODUCER_URL + "?fields=unknown")
+        assert response.status_code == 400
+
     def test_delete(self, client):
         headers = _get_access_token_header(client)
         response = client.delete(self.PRODUCER_URL, headers=headers)
@@ -441,6 +831,12 @@ class TestProducerItem(object):
         response = client.patch(self.FAKE_URL, json=self.request_data, headers=headers)
         assert response.status_code == 404
 
+    def test_patch_existing_name(self, client):
+        headers = _get_access_token_header(client)
+        response = client.patch(self.PRODUCER_URL, json={"name": "test producer 2"}, headers=headers)
+        assert response.status_code == 409
+        assert _get_resource(client, self.PRODUCER_URL)["name"] == "test producer 1"
+
     def test_patch_region_not_found(self, client):
         request_data = {
             "region": {
@@ -574,6 +970,12 @@ class TestGrapeItem(object):
         response = client.patch(self.FAKE_URL, json=self.request_data, headers=headers)
         assert response.status_code == 404
 
+    def test_patch_existing_name(self, client):
+        headers = _get_access_token_header(client)
+        response = client.patch(self.GRAPE_URL, json={"name": "test grape 2"}, headers=headers)
+        assert response.status_code == 409
+        assert _get_resource(client, self.GRAPE_URL)["name"] == "test grape 1"
+
     def test_patch_region_not_found(self, client):
         request_data = {
             "region": {
@@ -707,6 +1109,12 @@ class TestRegionItem(object):
         response = client.patch(self.FAKE_URL, json=self.request_data, headers=headers)
         assert response.status_code == 404
 
+    def test_patch_existing_name(self, client):
+        headers = _get_access_token_header(client)
+        response = client.patch(self.REGION_URL, json={"name": "test region 2"}, headers=headers)
+        assert response.status_code == 409
+        assert _get_resource(client, self.REGION_URL)["name"] == "test region 1"
+
     def test_patch_country_not_found(self, client):
         request_data = {
             "country": {
@@ -830,6 +1238,12 @@ class TestCountryItem(object):
         response = client.patch(self.FAKE_URL, json=self.request_data, headers=headers)
         assert response.status_code == 404
 
+    def test_patch_existing_name(self, client):
+        headers = _get_access_token_header(client)
+        response = client.patch(self.COUNTRY_URL, json={"name": "test country 2"}, headers=headers)
+        assert response.status_code == 409
+        assert _get_resource(client, self.COUNTRY_URL)["name"] == "test country 1"
+
     def test_patch_validation_error(self, client):
         request_data = {
             "description": "test validation fail"
@@ -897,6 +1311,8 @@ class TestUserItem(object):
         headers = _get_access_token_header(client)
         response = client.delete(self.USER_URL, headers=headers)
         assert response.status_code == 200
+        response = client.get(self.USER_URL)
+        assert response.status_code == 404
 
     def test_delete_not_found(self, client):
         headers = _get_access_token_header(client)
@@ -941,6 +1357,18 @@ class TestUserLogin(object):
         response = client.post(self.RESOURCE_URL, json=copy)
         assert response.status_code == 401
 
+    def test_post_busy(self, client, monkeypatch):
+        monkeypatch.setattr(password_hasher, "_slots", threading.Semaphore(0))
+        response = client.post(self.RESOURCE_URL, json=self.request_data)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+    def test_post_rehash(self, client, monkeypatch):
+        monkeypatch.setattr(password_hasher, "iterations", 1000)
+        assert client.post(self.RESOURCE_URL, json=self.request_data).status_code == 200
+        assert User.find_by_name("test user 2").password.startswith("pbkdf2:sha256:1000$")
+        assert client.post(self.RESOURCE_URL, json=self.request_data).status_code == 200
+
 
 class TestUserLogout(object):
 
@@ -954,3 +1382,540 @@ class TestUserLogout(object):
     def test_post_no_auth(self, client):
         response = client.post(self.RESOURCE_URL)
         assert response.status_code == 401
+
+
+class TestTokenBlocklist(object):
+
+    def test_logout_revokes(self, client):
+        headers = _get_access_token_header(client)
+        assert client.post("/api/logout", headers=headers).status_code == 200
+        response = client.get("/api/export", headers=headers)
+        assert response.status_code == 401
+
+    def test_shared_between_workers(self, tmp_path):
+        path = str(tmp_path / "blocklist.db")
+        worker, other = TokenBlocklist(path, sync_interval=0), TokenBlocklist(path, sync_interval=0)
+        worker.revoke("revoked", time.time() + 60)
+        worker.revoke("expiring", time.time() + 0.2)
+        assert other.is_revoked("revoked") and other.is_revoked("expiring")
+        assert not other.is_revoked("valid")
+        time.sleep(0.3)
+        assert not other.is_revoked("expiring") and len(other) == 1
+        assert TokenBlocklist(path).is_revoked("revoked")
+
+    def test_default_path_in_instance_folder(self, client):
+        blocklist = TokenBlocklist()
+        client.application.config["JWT_BLOCKLIST_PATH"] = None
+        blocklist.init_app(client.application, JWTManager())
+        assert blocklist.path == os.path.join(client.application.instance_path, "token-blocklist.db")
+
+
+class TestUserRefresh(object):
+
+    RESOURCE_URL = "/api/refresh"
+    login_data = {
+        "username": "test user 2",
+        "password": "Test-password1234"
+    }
+
+    def _refresh(self, client, token):
+        return client.post(self.RESOURCE_URL, headers={"Authorization": "Bearer " + token})
+
+    def test_post(self, client, monkeypatch):
+        token = client.post("/api/login", json=self.login_data).headers["X-Refresh-Token"]
+        monkeypatch.setattr(password_hasher, "check", None)
+        response = self._refresh(client, token)
+        assert response.status_code == 200
+        assert response.headers["X-Refresh-Token"] != token
+        headers = {"Authorization": json.loads(response.data)}
+        assert client.get("/api/export", headers=headers).status_code == 200
+
+    def test_post_not_versioned(self, client):
+        with _count_queries() as statements:
+            token = client.post("/api/login", json=self.login_data).headers["X-Refresh-Token"]
+            assert self._refresh(client, token).status_code == 200
+        assert not [statement for statement in statements if "table_version" in statement]
+        assert TableVersion.find_versions(["refresh_token"]) == {}
+
+    def test_post_reused(self, client):
+        token = client.post("/api/login", json=self.login_data).headers["X-Refresh-Token"]
+        rotated = self._refresh(client, token).headers["X-Refresh-Token"]
+        assert self._refresh(client, token).status_code == 401
+        assert self._refresh(client, rotated).status_code == 401
+
+    def test_post_after_logout(self, client):
+        response = client.post("/api/login", json=self.login_data)
+        client.post("/api/logout", headers={"Authorization": json.loads(response.data)})
+        assert self._refresh(client, response.headers["X-Refresh-Token"]).status_code == 401
+
+    def test_post_access_token(self, client):
+        headers = _get_access_token_header(client)
+        assert client.post(self.RESOURCE_URL, headers=headers).status_code == 422
+
+
+class TestRelationFields(object):
+
+    RELATIONS = [("/api/wines", "test%20wine%201", "wine_type"), ("/api/wines", "test%20wine%201", "producer"),
+                 ("/api/wines", "test%20wine%201", "grape"), ("/api/wine_types", "test%20type%201", "wines"),
+                 ("/api/grapes", "test%20grape%201", "region"), ("/api/grapes", "test%20grape%201", "wines"),
+                 ("/api/producers", "test%20producer%201", "region"),
+                 ("/api/producers", "test%20producer%201", "wines"),
+                 ("/api/regions", "test%20region%201", "country"),
+                 ("/api/regions", "test%20region%201", "producers"),
+                 ("/api/regions", "test%20region%201", "grapes"),
+                 ("/api/countries", "test%20country%201", "regions")]
+
+    @pytest.mark.parametrize("url, name, field", RELATIONS)
+    def test_get_relation_only(self, client, url, name, field):
+        response = client.get("{}?fields={}".format(url, field))
+        assert response.status_code == 200
+        items = next(iter(json.loads(response.data).values()))
+        assert len(items) == 3 and all(set(item) == {field} for item in items)
+        response = client.get("{}/{}?fields={}".format(url, name, field))
+        assert response.status_code == 200
+        assert set(json.loads(response.data)) == {field}
+
+
+class TestQueryCount(object):
+
+    URLS = ["/api/wines", "/api/wine_types", "/api/grapes", "/api/producers",
+            "/api/regions", "/api/countries", "/api/wines/test%20wine%201",
+            "/api/wine_types/test%20type%201", "/api/grapes/test%20grape%201",
+            "/api/producers/test%20producer%201", "/api/regions/test%20region%201",
+            "/api/countries/test%20country%201"]
+
+    @pytest.mark.parametrize("url", URLS)
+    def test_query_count_is_constant(self, client, url):
+        with _count_queries() as before:
+            assert client.get(url).status_code == 200
+        _add_catalog_rows(5)
+        _add_related_rows(600)
+        db.session.expunge_all()
+        with _count_queries() as after:
+            assert client.get(url).status_code == 200
+        assert len(after) == len(before)
+
+
+class TestJsonCodec(object):
+
+    def test_fallback_gives_same_responses(self, client, monkeypatch):
+        fast = client.get("/api/wines")
+        assert fast.content_type == "application/json"
+        monkeypatch.setattr(codec, "orjson", None)
+        response_cache.clear()
+        slow = client.get("/api/wines")
+        assert json.loads(fast.data) == json.loads(slow.data)
+
+    def test_invalid_body(self, client):
+        headers = _get_access_token_header(client)
+        response = client.post("/api/grapes", data='{"name": ', content_type="application/json",
+                               headers=headers)
+        assert response.status_code == 400
+
+
+class TestSerializer(object):
+
+    SCHEMAS = [(WineSchema, Wine, None), (WineSchema, Wine, ("name", "producer", "picture")),
+               (WineTypeSchema, Wine_type, None), (GrapeSchema, Grape, None),
+               (ProducerSchema, Producer, None), (ProducerSchema, Producer, ("region", "wines")),
+               (RegionSchema, Region, None), (CountrySchema, Country, None), (UserSchema, User, None)]
+
+    @pytest.mark.parametrize("schema_class, model, fields", SCHEMAS)
+    def test_same_as_schema_dump(self, client, schema_class, model, fields):
+        _add_catalog_rows(2)
+        Wine.find_by_name("extra wine 0 0").picture = "bottle.png"
+        db.session.commit()
+        items = model.query.all()
+        expected = schema_class(only=fields, many=True).dump(items)
+        assert json.dumps(dumper(schema_class, fields, many=True)(items)) == json.dumps(expected)
+        assert json.dumps(dumper(schema_class, fields)(items[0])) == json.dumps(expected[0])
+
+    def test_exclude_and_dump_hooks(self, client):
+        class WineNameSchema(WineSchema):
+            @post_dump
+            def upper(self, data, **kwargs):
+                data["name"] = data["name"].upper()
+                return data
+
+        wine = Wine.find_by_name("test wine 1")
+        schema = RegionSchema(exclude=("producers", "grapes"))
+        assert compile_dump(schema)(wine.producer.region) == schema.dump(wine.producer.region)
+        assert compile_dump(WineNameSchema())(wine)["name"] == "TEST WINE 1"
+
+
+class TestResponseCache(object):
+
+    WINE_URL = "/api/wines/test%20wine%201"
+    PRODUCER_URL = "/api/producers/test%20producer%201"
+
+    def test_get_served_from_cache(self, client):
+        first = client.get("/api/wines?limit=2")
+        with _count_queries() as statements:
+            second = client.get("/api/wines?limit=2")
+        assert len(statements) == 1 and "table_version" in statements[0]
+        assert second.data == first.data
+        assert second.headers["Link"] == first.headers["Link"]
+
+    def test_query_string_is_part_of_key(self, client):
+        client.get("/api/wines?limit=2")
+        body = _get_resource(client, "/api/wines?limit=1")
+        assert len(body["wines"]) == 1
+
+    def test_dependent_write_evicts(self, client):
+        assert _get_resource(client, self.WINE_URL)["producer"]["name"] == "test producer 1"
+        headers = _get_access_token_header(client)
+        response = client.patch(self.PRODUCER_URL, json={"name": "renamed producer"}, headers=headers)
+        assert response.status_code == 200
+        assert _get_resource(client, self.WINE_URL)["producer"]["name"] == "renamed producer"
+
+    def test_not_found_is_not_cached(self, client):
+        assert client.get("/api/wines/new%20wine").status_code == 404
+        headers = _get_access_token_header(client)
+        data = {'data': json.dumps({"name": "new wine"}), 'file': None}
+        assert client.post("/api/wines", data=data, headers=headers).status_code == 201
+        assert client.get("/api/wines/new%20wine").status_code == 200
+
+    def test_write_of_other_worker_is_not_served(self, client):
+        first = client.get(self.WINE_URL)
+        # a write which this process does not see, as one made by another worker
+        with db.engine.begin() as connection:
+            connection.execute(Wine.__table__.update().where(Wine.name == "test wine 1")
+                               .values(description="changed elsewhere"))
+            TableVersion.bump(connection, ["wine"])
+        response = client.get(self.WINE_URL, headers={"If-None-Match": first.headers["ETag"]})
+        assert response.status_code == 200
+        assert json.loads(response.data)["description"] == "changed elsewhere"
+        assert response.headers["ETag"] != first.headers["ETag"]
+
+
+class TestReferenceCache(object):
+
+    @staticmethod
+    def _post_wine(client, headers, name, producer):
+        data = {"name": name, "wine_type": {"type": "test type 1"}, "grape": {"name": "test grape 1"},
+                "producer": {"name": producer}}
+        return client.post("/api/wines", data={"data": json.dumps(data)}, headers=headers)
+
+    def test_write_reuses_ids(self, client):
+        headers = _get_access_token_header(client)
+        assert self._post_wine(client, headers, "cached 1", "test producer 1").status_code == 201
+        with _count_queries() as statements:
+            assert self._post_wine(client, headers, "cached 2", "test producer 1").status_code == 201
+        lookups = statements[:next(i for i, statement in enumerate(statements) if "INSERT INTO wine" in statement)]
+        assert not [statement for statement in lookups if "FROM wine_type" in statement or
+                    "FROM grape" in statement or "FROM producer" in statement]
+        assert Wine.find_by_name("cached 2").producer_id == Producer.find_by_name("test producer 1").id
+
+    def test_write_invalidates(self, client):
+        headers = _get_access_token_header(client)
+        assert self._post_wine(client, headers, "cached 1", "test producer 1").status_code == 201
+        response = client.patch("/api/producers/test%20producer%201", json={"name": "renamed producer"},
+                                headers=headers)
+        assert response.status_code == 200
+        assert self._post_wine(client, headers, "cached 2", "test producer 1").status_code == 201
+        assert self._post_wine(client, headers, "cached 3", "renamed producer").status_code == 201
+        assert Wine.find_by_name("cached 3").producer_id == Wine.find_by_name("cached 1").producer_id
+        assert Wine.find_by_name("cached 2").producer_id != Wine.find_by_name("cached 1").producer_id
+
+    def test_write_of_other_worker_is_seen(self, client):
+        headers = _get_access_token_header(client)
+        assert self._post_wine(client, headers, "cached 1", "test producer 1").status_code == 201
+        # the producer is recreated by another worker, which this process does not see
+        with db.engine.begin() as connection:
+            connection.execute(Producer.__table__.update().where(Producer.name == "test producer 1")
+                               .values(name="old producer"))
+            connection.execute(Producer.__table__.insert().values(name="test producer 1"))
+            TableVersion.bump(connection, ["producer"])
+        assert self._post_wine(client, headers, "cached 2", "test producer 1").status_code == 201
+        assert Wine.find_by_name("cached 2").producer_id == Producer.find_by_name("test producer 1").id
+        assert Wine.find_by_name("cached 1").producer_id == Producer.find_by_name("old producer").id
+
+
+class TestCompression(object):
+
+    HEADERS = {"Accept-Encoding": "gzip"}
+
+    def test_get_compressed(self, client, monkeypatch):
+        monkeypatch.setitem(client.application.config, "COMPRESSION_MIN_SIZE", 0)
+        plain = client.get("/api/wines")
+        assert "Content-Encoding" not in plain.headers
+        response = client.get("/api/wines", headers=self.HEADERS)
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["Vary"]
+        assert gzip.decompress(response.data) == plain.data
+        assert response.headers["ETag"] == plain.headers["ETag"][:-1] + '-gzip"'
+
+        response = client.get("/api/wines",
+                              headers=dict(self.HEADERS, **{"If-None-Match": response.headers["ETag"]}))
+        assert response.status_code == 304
+
+    @pytest.mark.parametrize("accept, encoding, decompress", [
+        ("gzip, br, zstd", "br", brotli.decompress),
+        ("gzip, zstd", "zstd", lambda data: zstandard.ZstdDecompressor().decompress(data)),
+        ("gzip;q=0.5, br;q=0.2, zstd", "zstd", lambda data: zstandard.ZstdDecompressor().decompress(data)),
+    ])
+    def test_get_negotiated(self, client, monkeypatch, accept, encoding, decompress):
+        monkeypatch.setitem(client.application.config, "COMPRESSION_MIN_SIZE", 0)
+        plain = client.get("/api/wines")
+        response = client.get("/api/wines", headers={"Accept-Encoding": accept})
+        assert response.headers["Content-Encoding"] == encoding
+        assert decompress(response.data) == plain.data
+        assert response.headers["ETag"] == plain.headers["ETag"][:-1] + '-{}"'.format(encoding)
+
+    def test_cached_response_is_compressed_once(self, client, monkeypatch):
+        monkeypatch.setitem(client.application.config, "COMPRESSION_MIN_SIZE", 0)
+        calls = []
+        original = compression.compress
+        monkeypatch.setattr(compression, "compress", lambda data, encoding: calls.append(encoding) or
+                            original(data, encoding))
+        first = client.get("/api/wines", headers=self.HEADERS)
+        second = client.get("/api/wines", headers=self.HEADERS)
+        assert second.data == first.data
+        assert calls == ["gzip"]
+
+    def test_small_response_not_compressed(self, client, monkeypatch):
+        monkeypatch.setitem(client.application.config, "COMPRESSION_MIN_SIZE", 100000)
+        response = client.get("/api/wines", headers=self.HEADERS)
+        assert "Content-Encoding" not in response.headers
+        response = client.get("/api/wines/unknown", headers=self.HEADERS)
+        assert "Content-Encoding" not in response.headers
+
+
+class TestTiming(object):
+
+    @staticmethod
+    def _metrics(response):
+        metrics = {}
+        for metric in response.headers["Server-Timing"].split(", "):
+            name, value = metric.split(";")
+            metrics[name] = float(value.split("=")[1].strip('"'))
+        return metrics
+
+    def test_server_timing(self, client, monkeypatch):
+        assert "Server-Timing" not in client.get("/api/wines").headers
+        monkeypatch.setitem(client.application.config, "TIMING_ENABLED", True)
+        response_cache.clear()
+        metrics = self._metrics(client.get("/api/wines"))
+        assert metrics["db-count"] >= 2
+        assert metrics["db"] > 0 and metrics["serialize"] > 0
+        assert metrics["total"] >= metrics["db"] + metrics["serialize"]
+
+        data = {"username": "test user 1", "password": "Test-password1234"}
+        assert self._metrics(client.post("/api/login", json=data))["hash"] > 0
+
+    def test_log_line(self, client, monkeypatch, caplog):
+        monkeypatch.setitem(client.application.config, "TIMING_LOG", True)
+        with caplog.at_level(logging.INFO, logger="src.libs.timing"):
+            response = client.get("/api/wines")
+        assert "Server-Timing" not in response.headers
+        record = json.loads(caplog.records[-1].getMessage())
+        assert record["path"] == "/api/wines" and record["status"] == 200
+        assert record["db_count"] >= 1
+
+
+class TestMetrics(object):
+
+    def test_metrics(self, client):
+        client.get("/api/wines")
+        client.get("/api/unknown")
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        text = response.get_data(as_text=True)
+        assert 'http_requests_total{method="GET",route="/api/wines",status="200"}' in text
+        assert 'http_requests_total{method="GET",route="unmatched",status="404"}' in text
+        assert 'http_request_duration_seconds_count{method="GET",route="/api/wines"}' in text
+        assert 'db_queries_total{route="/api/wines"}' in text
+        assert 'cache_lookups_total{cache="response",result="' in text
+        assert "db_pool_connections_checked_out" in text
+        assert 'route="/metrics"' not in text
+
+    def test_multiprocess(self, tmp_path):
+        # every process writes its own files, the collector adds them up
+        env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(tmp_path))
+        script = "from src.libs.metrics import REQUESTS; REQUESTS.labels('GET', '/api/wines', 200).inc()"
+        for _ in range(2):
+            subprocess.run([sys.executable, "-c", script], env=env, check=True)
+        script = "from prometheus_client import CollectorRegistry, generate_latest, multiprocess; " \
+                 "registry = CollectorRegistry(); multiprocess.MultiProcessCollector(registry); " \
+                 "print(generate_latest(registry).decode())"
+        output = subprocess.run([sys.executable, "-c", script], env=env, check=True,
+                                capture_output=True, text=True).stdout
+        assert 'http_requests_total{method="GET",route="/api/wines",status="200"} 2.0' in output
+
+
+class TestConditionalRequests(object):
+
+    WINE_URL = "/api/wines/test%20wine%201"
+    PRODUCER_URL = "/api/producers/test%20producer%201"
+    data = {
+        'data': json.dumps({"description": "patching"}),
+        'file': None
+    }
+
+    def test_get_not_modified(self, client):
+        response = client.get(self.WINE_URL)
+        etag = response.headers["ETag"]
+        with _count_queries() as statements:
+            response = client.get(self.WINE_URL, headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b""
+        assert len(statements) == 1
+
+    def test_get_modified(self, client):
+        etag = client.get("/api/wines").headers["ETag"]
+        headers = _get_access_token_header(client)
+        client.patch(self.PRODUCER_URL, json={"description": "patching"}, headers=headers)
+        response = client.get("/api/wines", headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+    def test_query_string_changes_etag(self, client):
+        etag = client.get("/api/wines").headers["ETag"]
+        assert client.get("/api/wines?limit=1").headers["ETag"] != etag
+
+    def test_patch_if_match(self, client):
+        etag = client.get(self.WINE_URL).headers["ETag"]
+        headers = _get_access_token_header(client)
+        response = client.patch(self.WINE_URL, data=self.data,
+                                headers=dict(headers, **{"If-Match": '"outdated"'}))
+        assert response.status_code == 412
+        response = client.patch(self.WINE_URL, data=self.data,
+                                headers=dict(headers, **{"If-Match": etag}))
+        assert response.status_code == 200
+        response = client.delete(self.WINE_URL, headers=dict(headers, **{"If-Match": etag}))
+        assert response.status_code == 412
+
+
+class TestCatalogExport(object):
+
+    RESOURCE_URL = "/api/export"
+
+    def test_get_ndjson(self, client):
+        headers = _get_access_token_header(client)
+        response = client.get(self.RESOURCE_URL, headers=headers)
+        assert response.status_code == 200
+        assert response.mimetype == "application/x-ndjson"
+        assert response.is_streamed
+        wines = [json.loads(line) for line in response.data.decode().splitlines()]
+        assert [wine["name"] for wine in wines] == ["test wine 1", "test wine 2", "test wine 3"]
+        assert wines[0]["producer"] == "test producer 1"
+        assert wines[0]["region"] == "test region 1"
+        assert wines[0]["country"] == "test country 1"
+        assert wines[0]["wine_type"] == "test type 1"
+
+    def test_get_csv_gzip(self, client):
+        headers = _get_access_token_header(client)
+        response = client.get(self.RESOURCE_URL + "?format=csv",
+                              headers=dict(headers, **{"Accept-Encoding": "gzip"}))
+        assert response.status_code == 200
+        assert response.headers["Content-Encoding"] == "gzip"
+        rows = list(csv.DictReader(gzip.decompress(response.data).decode().splitlines()))
+        assert len(rows) == 3
+        assert rows[2]["grape"] == "test grape 3"
+        assert rows[2]["volume"] == "750"
+
+    def test_get_in_batches(self, client):
+        _add_catalog_rows(5)
+        headers = _get_access_token_header(client)
+        client.application.config["EXPORT_BATCH_SIZE"] = 4
+        try:
+            response = client.get(self.RESOURCE_URL, headers=headers, buffered=False)
+            chunks = list(response.response)
+        finally:
+            client.application.config["EXPORT_BATCH_SIZE"] = 1000
+        assert [chunk.count(b"\n") for chunk in chunks] == [4, 4, 4, 1]
+
+    def test_get_invalid_format(self, client):
+        headers = _get_access_token_header(client)
+        response = client.get(self.RESOURCE_URL + "?format=xml", headers=headers)
+        assert response.status_code == 400
+
+    def test_get_no_auth(self, client):
+        response = client.get(self.RESOURCE_URL)
+        assert response.status_code == 401
+
+    def test_export_catalog_command(self, client, tmp_path):
+        output = tmp_path / "catalog.csv.gz"
+        runner = client.application.test_cli_runner()
+        result = runner.invoke(export_catalog_cmd, ["--format", "csv", "--gzip", "--output", str(output)])
+        assert result.exit_code == 0
+        rows = list(csv.reader(gzip.decompress(output.read_bytes()).decode().splitlines()))
+        assert rows[0][:2] == ["name", "wine_type"]
+        assert len(rows) == 4
+
+        result = runner.invoke(export_catalog_cmd)
+        assert result.exit_code == 0
+        assert len(result.output.splitlines()) == 3
+
+
+class TestPopulateDatabase(object):
+
+    def test_populate_generated_catalog(self, client):
+        runner = client.application.test_cli_runner()
+        result = runner.invoke(populate_database_cmd, ["--scale", "500", "--seed", "1"])
+        assert result.exit_code == 0
+        assert "500 wine" in result.output
+        assert Wine.query.count() == 503
+
+        response = client.get("/api/wines?limit=100")
+        assert response.status_code == 200
+        assert len(json.loads(response.data)["wines"]) == 100
+
+
+class TestSearch(object):
+
+    RESOURCE_URL = "/api/search"
+
+    def _search(self, client, query):
+        response = client.get(self.RESOURCE_URL, query_string={"q": query})
+        assert response.status_code == 200
+        return [(result["kind"], result["name"]) for result in json.loads(response.data)["results"]]
+
+    def test_get(self, client):
+        results = self._search(client, "wine")
+        assert sorted(results) == [("wine", "test wine {}".format(i)) for i in range(1, 4)]
+        assert len(self._search(client, "test description")) == 9
+        assert self._search(client, "unknown") == []
+
+    def test_get_ranked_and_stemmed(self, client):
+        db.session.add(Grape(name="Sangiovese", description="red grape of tuscany"))
+        db.session.add(Wine(name="Chianti", description="made of sangiovese grapes", style="dry"))
+        db.session.commit()
+        assert self._search(client, "sangiovese") == [("grape", "Sangiovese"), ("wine", "Chianti")]
+        assert self._search(client, "grapes sangiovese") == [("grape", "Sangiovese"), ("wine", "Chianti")]
+        assert self._search(client, "dry sangiovese") == [("wine", "Chianti")]
+
+    def test_get_paginated(self, client):
+        results = []
+        url = self.RESOURCE_URL + "?q=test&limit=4"
+        while url:
+            body = json.loads(client.get(url).data)
+            results.extend(body["results"])
+            url = self.RESOURCE_URL + "?q=test&limit=4&cursor=" + body["next"] if "next" in body else None
+        assert len(results) == 9
+        assert len({(result["kind"], result["name"]) for result in results}) == 9
+
+    def test_index_in_sync(self, client):
+        headers = _get_access_token_header(client)
+        client.post("/api/wines", data={"data": json.dumps({"name": "Barolo", "style": "tannic"})},
+                    headers=headers)
+        assert self._search(client, "tannic") == [("wine", "Barolo")]
+
+        client.patch("/api/wines/Barolo", data={"data": json.dumps({"style": "velvety"})}, headers=headers)
+        assert self._search(client, "tannic") == []
+        assert self._search(client, "velvety") == [("wine", "Barolo")]
+
+        client.delete("/api/wines/Barolo", headers=headers)
+        assert self._search(client, "velvety") == []
+
+        client.post("/api/wines/bulk", json=[{"name": "Amarone", "producer": {"name": "Valpolicella"}}],
+                    headers=headers)
+        assert self._search(client, "valpolicella") == [("producer", "Valpolicella")]
+
+    def test_get_invalid_query(self, client):
+        assert client.get(self.RESOURCE_URL).status_code == 400
+        assert client.get(self.RESOURCE_URL + "?q=%22()").status_code == 400
+        assert len(self._search(client, '"wine" (test* NEAR')) == 0
+        assert len(self._search(client, '"wine" (test*')) == 3
+        response = client.get(self.RESOURCE_URL + "?q=test&cursor=eyJpZCI6MX0")
+        assert response.status_code == 400
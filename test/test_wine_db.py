@@ -2,8 +2,12 @@
 Module for database testing.
 """
 import pytest
+from sqlalchemy import event, inspect
 from sqlalchemy.exc import IntegrityError
 
+from src.database import unit_of_work
+from src.libs.generator import generate_catalog
+from src.libs.search import search
 from src.models.country import Country
 from src.models.grape import Grape
 from src.models.producer import Producer
@@ -441,3 +445,151 @@ def test_user_required_columns(db_handle):
     db_handle.session.add(user)
     with pytest.raises(IntegrityError):
         db_handle.session.commit()
+
+
+def test_wine_unique_name(db_handle):
+    """
+    Tests that wine name is unique.
+    """
+
+    db_handle.session.add(_get_wine())
+    db_handle.session.add(_get_wine())
+    with pytest.raises(IntegrityError):
+        db_handle.session.commit()
+
+
+def test_user_unique_username(db_handle):
+    """
+    Tests that username is unique.
+    """
+
+    db_handle.session.add(_get_user())
+    db_handle.session.add(_get_user())
+    with pytest.raises(IntegrityError):
+        db_handle.session.commit()
+
+
+def test_name_lookups_use_index(db_handle):
+    """
+    Tests that lookups by name are index seeks instead of table scans.
+    """
+
+    lookups = [("wine", "name"), ("grape", "name"), ("producer", "name"), ("region", "name"),
+               ("country", "name"), ("wine_type", "type"), ("user", "username")]
+    for table, column in lookups:
+        plan = db_handle.session.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM "{}" WHERE {} = :value'.format(table, column),
+            {"value": "test"}
+        ).fetchall()
+        detail = " ".join(row[-1] for row in plan)
+        assert detail.startswith("SEARCH") and "ix_{}_{}".format(table, column) in detail
+
+
+def test_wine_filters_use_index(db_handle):
+    """
+    Tests that the common wine filters and sort keys are served by indexes.
+    """
+
+    cases = [
+        ({"type": "red", "year_min": 2000}, "year_produced", "ix_wine_wine_type_id_year_produced"),
+        ({"grape": "grape", "year_max": 2000}, "-year_produced", "ix_wine_grape_id_year_produced"),
+        ({"producer": "producer"}, "year_produced", "ix_wine_producer_id_year_produced"),
+        ({"abv_min": 12.5}, "alcohol_percentage", "ix_wine_alcohol_percentage_id"),
+        ({}, "-year_produced", "ix_wine_year_produced_id"),
+    ]
+    for filters, sort, index in cases:
+        query = Wine.query.filter(*Wine.filter_criteria(filters))
+        column = getattr(Wine, sort.lstrip("-"))
+        query = query.order_by(column.desc() if sort.startswith("-") else column, Wine.id)
+        statement = query.statement.compile(db_handle.engine, compile_kwargs={"literal_binds": True})
+        plan = db_handle.session.execute("EXPLAIN QUERY PLAN {}".format(statement)).fetchall()
+        detail = " ".join(row[-1] for row in plan)
+        assert "SEARCH wine USING INDEX {}".format(index) in detail or \
+               "SCAN wine USING INDEX {}".format(index) in detail
+
+
+def test_generate_catalog(db_handle):
+    """
+    Tests that the generated catalog is deterministic for a seed, and that the
+    indexes and search triggers dropped while inserting the wines are created again.
+    """
+
+    counts = generate_catalog(3000, seed=5)
+    assert counts == {"country": 30, "region": 30, "grape": 40, "producer": 150, "wine_type": 7, "wine": 3000}
+    assert Wine.query.count() == 3000
+    assert Wine.query.filter(Wine.producer_id.is_(None)).count() == 0
+    names = [wine.name for wine in Wine.query.order_by(Wine.id).limit(100)]
+
+    assert {index["name"] for index in inspect(db_handle.engine).get_indexes("wine")} == \
+        {index.name for index in Wine.__table__.indexes}
+    triggers = db_handle.session.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'wine'"
+    ).scalars().all()
+    assert len(triggers) == 3
+    assert search(names[0].split()[1:2], 10)
+
+    db_handle.session.remove()
+    db_handle.drop_all()
+    db_handle.create_all()
+    generate_catalog(3000, seed=5)
+    assert [wine.name for wine in Wine.query.order_by(Wine.id).limit(100)] == names
+
+
+def test_generate_catalog_again(db_handle):
+    """
+    Tests that a catalog can be generated into a database with a catalog, the
+    existing reference rows are reused and the new wines get new names.
+    """
+
+    generate_catalog(500, seed=1)
+    counts = generate_catalog(500, seed=2)
+    assert counts["wine"] == 500
+    assert Wine.query.count() == 1000
+    assert Country.query.count() == 30
+    assert Wine_type.query.count() == 7
+
+    assert {index["name"] for index in inspect(db_handle.engine).get_indexes("wine")} == \
+        {index.name for index in Wine.__table__.indexes}
+    triggers = db_handle.session.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'wine'"
+    ).scalars().all()
+    assert len(triggers) == 3
+    wine = Wine.query.order_by(Wine.id.desc()).first()
+    assert wine.name in [row["name"] for row in search(wine.name.split(), 10)]
+
+
+def test_unit_of_work(db_handle):
+    """
+    Tests that the model writes in a unit of work are committed once when it ends,
+    nested units join the outer one and everything is rolled back on an exception.
+    """
+
+    commits = []
+
+    def count(session):
+        commits.append(session)
+
+    event.listen(db_handle.session, "after_commit", count)
+    try:
+        with unit_of_work():
+            _get_country().add()
+            with unit_of_work():
+                _get_wine_type().add()
+            assert not commits
+            assert Country.query.count() == 1
+        assert len(commits) == 1
+
+        with pytest.raises(IntegrityError):
+            with unit_of_work():
+                _get_producer().add()
+                _get_country().add()
+                db_handle.session.flush()
+        assert len(commits) == 1
+        assert Producer.query.count() == 0
+
+        country = Country.query.first()
+        country.delete()
+        assert len(commits) == 2
+        assert Country.query.count() == 0
+    finally:
+        event.remove(db_handle.session, "after_commit", count)